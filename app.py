@@ -1,14 +1,30 @@
+import json
 import os
-from collections import Counter
+import random
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
 from pathlib import Path
-from typing import List, Set
+from typing import List, Optional, Set, Tuple
 
 import click
 import numpy as np
 from numpy import mat
 from tqdm import tqdm
 
-from make_dag import make_one_dag, guess_filename
+from batch_dag import make_dag_batch
+from corpus import CORPUS_INDEX, CorpusReader, CorpusWriter, DagMeta
+from latency import merge_latency_files
+from make_dag import (
+    build_dag,
+    data_file_size_of,
+    edge_density,
+    encode_dag,
+    guess_filename,
+    materialize,
+    write_dag,
+)
+from stats import StreamingStats
 
 
 def calc_func(x1, y1, x2, y2, y3):
@@ -24,12 +40,65 @@ def calc_func(x1, y1, x2, y2, y3):
     return a, b, c
 
 
+def make_layer_func(layernode: int, maxlayer: int):
+    # 计算节点数量函数
+    a, b, c = calc_func(0, 3, maxlayer, layernode / 2, layernode)
+    # func = lambda x: 1 if layernode == 1 else lambda x: round(a * x * x + b * x + c)
+    return lambda x: round(a * x * x + b * x + c)
+
+
+# 每个分片包含的DAG数量，即一个叶目录。分片是并行生成和随机种子的划分单位，
+# 与进程数无关，因此相同种子下串行和并行生成的结果逐字节一致
+SHARD_SIZE = 1000
+
+
+def dag_relative_path(index: int) -> str:
+    # 三级目录结构，第一级100，第二级1000，第三级1000
+    # 第三级存放具体的DAG文件，
+    # DAG文件包括：index.json
+    fl, sl = divmod(index // 1000, 1000)
+    if fl >= 100:
+        raise Exception("DAG数量超过上限")
+    return os.path.join(str(fl), str(sl))
+
+
 @click.group()
 def cli():
     pass
 
 
-def _gen_graphs(dest_dir: str):
+def _graph_node_count(dot_filename: str, corpus: Optional[CorpusReader]) -> int:
+    # 节点数来自同目录下的配置文件（files 格式），或语料索引（packed 格式）
+    stem = os.path.basename(dot_filename).split(".")[0]
+    config_filename = guess_filename(os.path.join(os.path.dirname(dot_filename), stem), "config", "")
+    if os.path.exists(config_filename):
+        with open(config_filename) as f:
+            return json.load(f)["node_count"]
+    if corpus is not None:
+        return corpus.meta(int(stem)).node_count
+    return 0
+
+
+def _render_graph(job) -> Tuple[str, int]:
+    src_filename, dst_filename = job
+    r = subprocess.run(
+        ["dot", "-Kdot", "-Tsvg", src_filename, "-o", dst_filename],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if r.returncode != 0:
+        print(f"绘制 {dst_filename} 失败: {r.stderr.decode(errors='replace').strip()}")
+    return dst_filename, r.returncode
+
+
+def _gen_graphs(
+    dest_dir: str,
+    jobs: int = 0,
+    sample: int = 0,
+    min_nodes: int = 0,
+    force: bool = False,
+    seed: Optional[int] = None,
+):
     if not os.path.exists(dest_dir):
         print(f"未找到指定目录: {dest_dir}")
         return
@@ -38,6 +107,12 @@ def _gen_graphs(dest_dir: str):
     if not os.path.exists(graph_dest_dir):
         os.mkdir(graph_dest_dir)
 
+    corpus = None
+    if os.path.exists(os.path.join(dest_dir, CORPUS_INDEX)):
+        corpus = CorpusReader(dest_dir)
+
+    # 收集所有 dot 文件及对应的 svg 文件
+    graphs = []
     for root, dirs, files in os.walk(dest_dir, False):
         dirs[:] = [d for d in dirs if not d.startswith(".")]
         files[:] = [
@@ -54,22 +129,242 @@ def _gen_graphs(dest_dir: str):
             continue
 
         dst_dir = os.path.join(graph_dest_dir, rel_path)
-        if not os.path.exists(dst_dir):
-            print("创建路径：{} of root {} rel {}".format(dst_dir, root, rel_path))
-            os.makedirs(dst_dir)
+        for f in sorted(files):
+            graphs.append(
+                (os.path.join(root, f), os.path.join(dst_dir, f.split(".")[0] + ".svg"))
+            )
 
-        # 调用dot命令画出来
-        for f in files:
-            src_filename = os.path.join(root, f)
-            dst_filename = os.path.join(dst_dir, f.split(".")[0])
-            os.system("dot -Kdot -Tsvg {0} -o {1}.svg".format(src_filename, dst_filename))
-            print("绘制 {}.svg".format(dst_filename))
+    # 只绘制节点数不小于 min_nodes 的图
+    if min_nodes > 0:
+        graphs = [g for g in graphs if _graph_node_count(g[0], corpus) >= min_nodes]
+
+    # 随机抽取 sample 个图
+    if 0 < sample < len(graphs):
+        graphs = sorted(random.Random(seed).sample(graphs, sample))
+
+    # 增量绘制：跳过 svg 比 dot 新的图
+    if not force:
+        graphs = [
+            (src, dst)
+            for src, dst in graphs
+            if not os.path.exists(dst) or os.path.getmtime(dst) < os.path.getmtime(src)
+        ]
+
+    for dst_dir in {os.path.dirname(dst) for _, dst in graphs}:
+        os.makedirs(dst_dir, exist_ok=True)
+
+    # 调用dot命令画出来，最多同时运行 jobs 个 dot 进程
+    failed = 0
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        for _, returncode in tqdm(executor.map(_render_graph, graphs), total=len(graphs)):
+            if returncode != 0:
+                failed += 1
+    print(f"绘制 {len(graphs) - failed} 个图，失败 {failed} 个，输出目录：{graph_dest_dir}")
 
 
 @click.command("graph")
+@click.option("--jobs", type=click.INT, default=0, help="同时运行的 dot 进程数，默认为CPU核数")
+@click.option("--sample", type=click.INT, default=0, help="随机抽取绘制的图数量，0 表示全部绘制")
+@click.option("--min_nodes", type=click.INT, default=0, help="只绘制节点数不小于此值的图")
+@click.option("--force", type=click.BOOL, default=False, help="重新绘制所有图，默认跳过 svg 比 dot 新的图")
+@click.option("--seed", type=click.INT, default=None, help="抽样的随机种子")
 @click.argument("dest_dir", type=click.STRING)
-def gen_graphs(dest_dir: str):
-    _gen_graphs(dest_dir)
+def gen_graphs(
+    dest_dir: str, jobs: int, sample: int, min_nodes: int, force: bool, seed: Optional[int]
+):
+    _gen_graphs(dest_dir, jobs, sample, min_nodes, force, seed)
+
+
+# 逐DAG统计的指标：名称 -> (说明，单位，列式统计文件中的类型)
+# 取值范围小的整数指标，按取值精确计数
+_EXACT_GEN_METRICS = ("layer_num", "layer_width", "node_num")
+
+_GEN_METRICS = {
+    "layer_num": ("深度", "", np.uint32),
+    "layer_width": ("宽度", "", np.uint32),
+    "node_num": ("节点数", "", np.uint32),
+    "edge_density": ("边密度", "", np.float32),
+    "df_size": ("数据文件(DataFile)长度", " Bytes", np.uint32),
+}
+
+
+def _new_gen_stats(with_columns: bool = False) -> dict:
+    stats = {
+        "count": 0,
+        "customization_wf_count": 0,
+        # 每个指标一个流式统计量，内存占用与DAG数量无关
+        "metrics": {
+            m: StreamingStats(exact=m in _EXACT_GEN_METRICS) for m in _GEN_METRICS
+        },
+    }
+    if with_columns:
+        # 逐DAG的列式统计（仅在需要输出统计文件时保存）
+        stats["columns"] = {m: [] for m in _GEN_METRICS}
+        stats["columns"]["customization"] = []
+    return stats
+
+
+def _add_gen_stats(stats: dict, customization: bool, **values):
+    stats["count"] += 1
+    if customization:
+        stats["customization_wf_count"] += 1
+    for m, v in values.items():
+        stats["metrics"][m].add(v)
+    if "columns" in stats:
+        for m, v in values.items():
+            stats["columns"][m].append(v)
+        stats["columns"]["customization"].append(customization)
+
+
+def _merge_gen_stats(total: dict, part: dict):
+    total["count"] += part["count"]
+    total["customization_wf_count"] += part["customization_wf_count"]
+    for m, st in part["metrics"].items():
+        total["metrics"][m].merge(st)
+    if "columns" in total:
+        for m, col in part["columns"].items():
+            dtype = _GEN_METRICS[m][2] if m in _GEN_METRICS else np.bool_
+            total["columns"][m].append(np.array(col, dtype=dtype))
+
+
+def _print_gen_stats(stats: dict):
+    print("========= 统计信息 =========")
+    print("共生成 {} 个DAG，其中：".format(stats["count"]))
+    print("\t定制工作流数量：{} 个".format(stats["customization_wf_count"]))
+    for m, (desc, unit, dtype) in _GEN_METRICS.items():
+        st: StreamingStats = stats["metrics"][m]
+        if st.count == 0:
+            continue
+        # 整数指标的近似分位数和众数取整到最近的整数
+        digits = None if np.issubdtype(dtype, np.integer) and not st.exact else 4
+        print(f"{desc}统计：")
+        print(f"\t最大值：{st.max}{unit}")
+        print(f"\t最小值：{st.min}{unit}")
+        print(f"\t标准差：{round(st.std, 4)}{unit}")
+        print(f"\t均值：{round(st.mean, 4)}{unit}")
+        print(f"\t中位数：{round(st.quantile(0.5), digits)}{unit}")
+        print(f"\tP90：{round(st.quantile(0.9), digits)}{unit}")
+        print(f"\tP99：{round(st.quantile(0.99), digits)}{unit}")
+        if st.exact:
+            print(f"\t众数：{st.mode()}{unit}")
+        else:
+            # 近似指标的分位数和众数来自对数分桶直方图，相对误差不超过 1%
+            print(f"\t众数(近似)：{round(st.mode(), digits)}{unit}")
+
+
+def _gen_shard(task) -> tuple:
+    """
+    生成一个分片内的全部DAG（可在子进程中执行）
+    files 格式直接写入文件；packed 格式返回编码后的数据，由主进程按顺序追加到语料中
+    @return files.txt 中的行（packed 格式为 [(数据, 元信息)]），分片统计信息
+    """
+    (
+        shard_idx,
+        index_from,
+        index_to,
+        seed,
+        engine,
+        corpus_format,
+        with_columns,
+        dest_dir,
+        layernode,
+        dag_kwargs,
+    ) = task
+    k = dag_kwargs
+
+    func = make_layer_func(layernode, k["maxlayer"])
+
+    # 每个分片使用独立且确定的随机种子
+    if engine == "numpy":
+        # 整个分片一次批量生成，再逐个输出
+        dags = make_dag_batch(
+            np.random.default_rng([seed % 2 ** 64, shard_idx]),
+            [str(i) for i in range(index_from, index_to)],
+            k["maxlayer"],
+            k["skiplayer"],
+            k["singlein"],
+            k["singleout"],
+            k["density"],
+            k["duration_ranges"],
+            k["custom_wf_rate"],
+            k["task_mem"],
+            func,
+        )
+    else:
+        random.seed(f"{seed}:{shard_idx}")
+
+        def __python_dags():
+            for i in range(index_from, index_to):
+                dag, node_num_per_layer = build_dag(
+                    str(i),
+                    k["maxlayer"],
+                    k["skiplayer"],
+                    k["singlein"],
+                    k["singleout"],
+                    k["density"],
+                    func,
+                )
+                materialize(dag, k["duration_ranges"], k["custom_wf_rate"], k["task_mem"])
+                yield dag, node_num_per_layer
+
+        dags = __python_dags()
+
+    records = []
+    stats = _new_gen_stats(with_columns)
+    for i, (dag, node_num_per_layer) in zip(range(index_from, index_to), dags):
+        relative_path = dag_relative_path(i)
+        filename = os.path.join(dest_dir, relative_path, str(i))
+        if corpus_format == "files" or k["enable_graph"]:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        if corpus_format == "packed":
+            if k["enable_graph"]:
+                with open(f"{filename}.dot", "w") as f:
+                    f.write(dag.to_dot())
+            payloads = encode_dag(
+                dag, k["image"], k["outtypes"], k["compress"], k["task_cpu"], k["task_mem"]
+            )
+            df_size = data_file_size_of(payloads)
+            records.append(
+                (
+                    payloads,
+                    DagMeta(
+                        len(node_num_per_layer),
+                        sum(node_num_per_layer),
+                        dag.edge_count,
+                        dag.customization,
+                        dag.custom_id,
+                        dag.critical_path(),
+                    ),
+                )
+            )
+        else:
+            df_size = write_dag(
+                filename,
+                dag,
+                node_num_per_layer,
+                k["image"],
+                k["outtypes"],
+                k["compress"],
+                k["enable_graph"],
+                k["task_cpu"],
+                k["task_mem"],
+            )
+            for data_type in k["outtypes"]:
+                records.append(
+                    f"{data_type}:{guess_filename(os.path.join(relative_path, str(i)), data_type, k['compress'])}\n"
+                )
+
+        _add_gen_stats(
+            stats,
+            dag.customization,
+            layer_num=len(node_num_per_layer),
+            layer_width=max(node_num_per_layer),
+            node_num=sum(node_num_per_layer),
+            edge_density=edge_density(dag, node_num_per_layer),
+            df_size=df_size,
+        )
+    return records, stats
 
 
 def _gen_dags(
@@ -88,7 +383,12 @@ def _gen_dags(
     enable_graph: bool,
     custom_wf_rate: float,
     task_cpu: int,
-    task_mem: int
+    task_mem: int,
+    workers: int = 1,
+    seed: Optional[int] = None,
+    engine: str = "python",
+    corpus_format: str = "files",
+    stats_file: Optional[str] = None,
 ):
     outtypes = [c.strip() for c in outtype.split(",")]
     duration_ranges = tuple([int(c.strip()) for c in duration_range.split(",")])
@@ -98,86 +398,80 @@ def _gen_dags(
     if not os.path.exists(dest_dir):
         os.mkdir(dest_dir)
 
-    # 计算节点数量函数
-    a, b, c = calc_func(0, 3, maxlayer, layernode / 2, layernode)
-    # func = lambda x: 1 if layernode == 1 else lambda x: round(a * x * x + b * x + c)
-    func = lambda x: round(a * x * x + b * x + c)
-
-    max_layer_num = 0
-    min_layer_num = maxlayer
-    max_layer_width = 0
-    max_node_num = 0
-    edge_densitys = []
-    df_sizes = []
-    fl, sl, tl = 0, 0, 0
-    customization_wf_count = 0
-    with open(os.path.join(dest_dir, "files.txt"), "w") as list_file:
-        for i in tqdm(range(count)):
-            # 三级目录结构，第一级100，第二级1000，第三级1000
-            # 第三级存放具体的DAG文件，
-            # DAG文件包括：index.json
-            if tl == 1000:
-                sl += 1
-                tl = 0
-            if sl == 1000:
-                fl += 1
-                sl = 0
-            if fl == 100:
-                raise Exception("DAG数量超过上限")
-
-            relative_path = os.path.join(str(fl), str(sl))
-            file_path = os.path.join(dest_dir, relative_path)
-            if not os.path.exists(file_path):
-                os.makedirs(file_path)
-
-            layer_num, node_num_per_layer, ed, df_size, customization = make_one_dag(
-                os.path.join(file_path, str(i)),
-                str(i),
-                maxlayer,
-                skiplayer,
-                singlein,
-                singleout,
-                density,
-                image,
-                outtypes,
-                compress,
-                duration_ranges,
-                enable_graph,
-                custom_wf_rate,
-                func,
-                task_cpu=task_cpu,
-                task_mem=task_mem
-            )
+    # 未指定种子时随机选取一个，并打印出来以便复现
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(63)
+    print(f"随机种子: {seed}")
 
-            max_layer_num = max(max_layer_num, layer_num)
-            min_layer_num = min(min_layer_num, layer_num)
-            max_layer_width = max(max_layer_width, max(node_num_per_layer))
-            max_node_num = max(max_node_num, sum(node_num_per_layer))
-            edge_densitys.append(round(ed, 4))
-            df_sizes.append(df_size)
-            if customization:
-                customization_wf_count += 1
-
-            for data_type in outtypes:
-                list_file.write(
-                    f"{data_type}:{guess_filename(os.path.join(relative_path, str(i)), data_type, compress )}\n"
-                )
+    dag_kwargs = dict(
+        maxlayer=maxlayer,
+        skiplayer=skiplayer,
+        singlein=singlein,
+        singleout=singleout,
+        density=density,
+        image=image,
+        outtypes=outtypes,
+        compress=compress,
+        duration_ranges=duration_ranges,
+        enable_graph=enable_graph,
+        custom_wf_rate=custom_wf_rate,
+        task_cpu=task_cpu,
+        task_mem=task_mem,
+    )
+    tasks = [
+        (
+            shard_idx,
+            index_from,
+            min(index_from + SHARD_SIZE, count),
+            seed,
+            engine,
+            corpus_format,
+            stats_file is not None,
+            dest_dir,
+            layernode,
+            dag_kwargs,
+        )
+        for shard_idx, index_from in enumerate(range(0, count, SHARD_SIZE))
+    ]
 
-    print("========= 统计信息 =========")
-    print("共生成 {} 个DAG，其中：".format(count))
-    print("\t最大深度: {}".format(max_layer_num))
-    print("\t最小深度: {}".format(min_layer_num))
-    print("\t最大宽度: {}".format(max_layer_width))
-    print("\t单DAG最大节点数: {}".format(max_node_num))
-    print("\t定制工作流数量：{} 个".format(customization_wf_count))
-    # print("边密度分布: {}".format(Counter(edge_densitys)))
-    print("输出数据文件(DataFile)统计：")
-    print("\t长度最大值：{} Bytes".format(max(df_sizes)))
-    print("\t长度最小值：{} Bytes".format(min(df_sizes)))
-    print("\t长度值标准差：{} Bytes".format(round(np.std(df_sizes), 2)))
-    print("\t长度均值：{} Bytes".format(np.mean(df_sizes)))
-    print("\t长度中位数：{} Bytes".format(np.median(df_sizes)))
-    print("\t长度众数：{} Bytes".format(np.argmax(np.bincount(df_sizes))))
+    stats = _new_gen_stats(stats_file is not None)
+    if corpus_format == "packed":
+        # 打包格式：所有DAG追加到每种类型一个的数据文件中，并写入定长索引
+        output = CorpusWriter(dest_dir, outtypes)
+    else:
+        output = open(os.path.join(dest_dir, "files.txt"), "w")
+    with output, tqdm(total=count) as pbar:
+
+        def __collect(records, part):
+            if corpus_format == "packed":
+                for payloads, meta in records:
+                    output.append(payloads, meta)
+            else:
+                output.writelines(records)
+            _merge_gen_stats(stats, part)
+            pbar.update(part["count"])
+
+        if workers > 1 and len(tasks) > 1:
+            # 多进程按分片生成，imap 保证按分片顺序合并 files.txt
+            with Pool(min(workers, len(tasks))) as pool:
+                for lines, part in pool.imap(_gen_shard, tasks):
+                    __collect(lines, part)
+        else:
+            for task in tasks:
+                __collect(*_gen_shard(task))
+
+    _print_gen_stats(stats)
+
+    if stats_file is not None:
+        # 逐DAG的列式统计，第 i 行对应编号为 i 的DAG
+        np.savez(
+            stats_file,
+            **{
+                m: np.concatenate(cols) if cols else np.array([])
+                for m, cols in stats["columns"].items()
+            },
+        )
+        print(f"逐DAG统计已写入: {stats_file}")
 
 
 @click.command("dag")
@@ -235,6 +529,36 @@ def _gen_dags(
     default=0,
     help="任务内存占用量，单位：MB",
 )
+@click.option(
+    "--workers",
+    type=click.INT,
+    default=1,
+    help="并行生成的进程数。大于1时按分片使用多进程生成，结果与相同种子的串行生成一致",
+)
+@click.option(
+    "--seed",
+    type=click.INT,
+    default=None,
+    help="随机种子。不指定则随机选取并打印，可用于复现",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["python", "numpy"]),
+    default="python",
+    help="生成引擎：python 逐个生成；numpy 按分片批量向量化生成，速度更快（相同种子下结果与 python 引擎不同）",
+)
+@click.option(
+    "--corpus_format",
+    type=click.Choice(["files", "packed"]),
+    default="files",
+    help="输出格式：files 每个DAG输出独立文件并写入 files.txt；packed 每种类型输出一个数据文件和一个定长索引文件",
+)
+@click.option(
+    "--stats_file",
+    type=click.STRING,
+    default=None,
+    help="逐DAG的列式统计输出文件（.npz），包含深度、宽度、节点数、边密度、数据长度、是否定制。不指定则不输出",
+)
 @click.argument("dest_path", type=click.STRING)
 def gen_dags(
     count: int,
@@ -252,7 +576,12 @@ def gen_dags(
     enable_graph: bool,
     custom_wf_rate: float,
     task_cpu: int,
-    task_mem: int
+    task_mem: int,
+    workers: int,
+    seed: Optional[int],
+    engine: str,
+    corpus_format: str,
+    stats_file: Optional[str],
 ):
     _gen_dags(
         count,
@@ -270,12 +599,114 @@ def gen_dags(
         enable_graph,
         custom_wf_rate,
         task_cpu,
-        task_mem
+        task_mem,
+        workers,
+        seed,
+        engine,
+        corpus_format,
+        stats_file,
     )
 
 
+@click.command("latency")
+@click.option("--output", type=click.STRING, default=None, help="合并后的延迟直方图输出文件，不指定则只打印")
+@click.argument("files", type=click.STRING, nargs=-1, required=True)
+def merge_latency(output: Optional[str], files: Tuple[str]):
+    """
+    合并多次运行输出的延迟直方图（latency.json），打印各目标、批大小的分位数
+    """
+    merged = merge_latency_files(list(files))
+    merged.print_summary()
+    if output:
+        with open(output, "w") as f:
+            json.dump(merged.to_dict(), f)
+
+
+@click.command("mock")
+@click.option("--address", type=click.STRING, default="0.0.0.0:6060", help="监听地址")
+@click.option(
+    "--service_time",
+    type=click.STRING,
+    default="0",
+    help="每个 RPC 的服务时间分布（秒）：const:0.005、uniform:0.001,0.01、exp:0.005（均值）、lognormal:0.005,0.5（中位数，对数标准差）",
+)
+@click.option("--per_workflow", type=click.FLOAT, default=0, help="InputWorkflow 中每个工作流增加的服务时间（秒）")
+@click.option("--accept_ratio", type=click.FLOAT, default=1.0, help="每个工作流被接受的概率")
+@click.option("--workers", type=click.INT, default=0, help="同时处理的 InputWorkflow 请求数，0 表示不限制")
+@click.option(
+    "--queue_limit", type=click.INT, default=0, help="排队的 InputWorkflow 请求超过此数时返回 RESOURCE_EXHAUSTED，0 表示不限制"
+)
+@click.option("--decode", type=click.BOOL, default=True, help="解压并解析工作流（snappy/gzip），按 custom_id 保存")
+@click.option("--visible_delay", type=click.FLOAT, default=0, help="工作流接受后出现在 FetchWorkflowIDList 中的延迟（秒）")
+@click.option("--start_delay", type=click.FLOAT, default=0, help="工作流可见后进入 Running 的延迟（秒）")
+@click.option("--time_scale", type=click.FLOAT, default=0.001, help="工作流运行时间 = 关键路径长度 × time_scale（秒）")
+@click.option("--wait_secs", type=click.INT, default=1, help="KeepAlive 返回的 wait_secs")
+@click.option("--duration", type=click.FLOAT, default=0, help="运行时长（秒），0 表示一直运行")
+@click.option("--report_secs", type=click.FLOAT, default=0, help="定期打印统计的间隔（秒），0 表示只在结束时打印")
+@click.option(
+    "--k8s_address",
+    type=click.STRING,
+    default="",
+    help="同时启动模拟的 Kubernetes API（接受 Argo Workflow 创建请求）的监听地址，例如 127.0.0.1:6443，为空表示不启动",
+)
+@click.option("--k8s_service_time", type=click.STRING, default="0", help="模拟 Kubernetes API 的服务时间分布（秒），格式同 --service_time")
+@click.option("--seed", type=click.INT, default=None, help="随机种子")
+def mock_controller(
+    address: str,
+    service_time: str,
+    per_workflow: float,
+    accept_ratio: float,
+    workers: int,
+    queue_limit: int,
+    decode: bool,
+    visible_delay: float,
+    start_delay: float,
+    time_scale: float,
+    wait_secs: int,
+    duration: float,
+    report_secs: float,
+    k8s_address: str,
+    k8s_service_time: str,
+    seed: Optional[int],
+):
+    """
+    启动本地模拟的调度器控制器，用于在没有集群时测量注入器
+    """
+    import asyncio
+
+    from mock_sc import MockKubernetesAPI, MockSchedulerController, serve
+
+    async def __run():
+        servicer = MockSchedulerController(
+            service_time,
+            per_workflow,
+            accept_ratio,
+            workers,
+            queue_limit,
+            decode,
+            visible_delay,
+            start_delay,
+            time_scale,
+            wait_secs,
+            seed,
+        )
+        await serve(servicer, address, duration, report_secs)
+
+    k8s = None
+    if k8s_address:
+        k8s = MockKubernetesAPI(k8s_address, k8s_service_time, seed)
+        k8s.start()
+    try:
+        asyncio.run(__run())
+    finally:
+        if k8s is not None:
+            k8s.stop()
+
+
 cli.add_command(gen_dags)
 cli.add_command(gen_graphs)
+cli.add_command(merge_latency)
+cli.add_command(mock_controller)
 
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,198 @@
+import uuid
+from array import array
+from typing import List, Tuple
+
+import numpy as np
+
+from dag_model import CompactDag
+
+# 定制工作流的 cost_grade 及其可选的 time_grade
+_GRADES = np.array(["A", "B", "C", "D"])
+_TIME_GRADES = np.array([["C", "D"], ["C", "D"], ["A", "B"], ["A", "B"]])
+
+
+def _to_array(typecode: str, values: np.ndarray) -> array:
+    r = array(typecode)
+    r.frombytes(values.astype(np.uint32 if typecode == "I" else np.uint64).tobytes())
+    return r
+
+
+def make_dag_batch(
+    rng: np.random.Generator,
+    names: List[str],
+    maxlayer: int,
+    skiplayer: int,
+    singlein: bool,
+    singleout: bool,
+    density: bool,
+    duration_ranges: Tuple[int, int],
+    custom_wf_rate: float,
+    task_mem: int,
+    func,
+) -> List[Tuple[CompactDag, List[int]]]:
+    """
+    批量生成DAG，规则与 make_dag.build_dag + materialize 相同。
+
+    批内所有DAG的层、节点和边放在同一组全局编号的数组中，层宽、连边端点、节点属性
+    均由 rng 一次性向量化抽取；连通性修复按层深度逐层传播可达性，
+    循环次数只与最大层数有关，与批大小无关。
+    @return [(已生成属性的DAG，每层节点数（不含单出口补充的节点）)]
+    """
+    dag_num = len(names)
+    maxlayer = max(3, maxlayer)
+    # 每个深度的层允许的最大节点数
+    caps = np.array([max(1, func(lyr)) for lyr in range(maxlayer)], dtype=np.int64)
+
+    # ---- 层 ----
+    layer_counts = rng.integers(3, maxlayer, size=dag_num, endpoint=True)
+    layer_dag = np.repeat(np.arange(dag_num), layer_counts)
+    layer_depth = np.arange(layer_counts.sum()) - np.repeat(
+        np.cumsum(layer_counts) - layer_counts, layer_counts
+    )
+    widths = rng.integers(1, caps[layer_depth], endpoint=True)
+    if singlein:
+        widths[layer_depth == 0] = 1
+    node_num_per_layer = np.split(widths, np.cumsum(layer_counts)[:-1])
+
+    # 单出口：在最后一层之后插入只有一个节点的层
+    last_layer = np.cumsum(layer_counts) - 1
+    extra_dags = np.flatnonzero(widths[last_layer] > 1) if singleout else np.array([], dtype=np.int64)
+    ins_pos = last_layer[extra_dags] + 1
+    widths = np.insert(widths, ins_pos, 1)
+    layer_depth = np.insert(layer_depth, ins_pos, layer_counts[extra_dags])
+    layer_dag = np.insert(layer_dag, ins_pos, extra_dags)
+    layer_extra = np.insert(np.zeros(len(layer_depth) - len(ins_pos), dtype=bool), ins_pos, True)
+    layer_last = (layer_depth == layer_counts[layer_dag] - 1) & ~layer_extra
+
+    layer_start = np.cumsum(widths) - widths
+    dag_first_layer = np.searchsorted(layer_dag, np.arange(dag_num))
+    dag_node_base = layer_start[dag_first_layer]
+    node_num = int(widths.sum())
+    node_layer = np.repeat(np.arange(len(widths)), widths)
+    node_depth = layer_depth[node_layer]
+
+    def __pick(lyrs: np.ndarray) -> np.ndarray:
+        # 在每个给定层内随机选取一个节点
+        return rng.integers(layer_start[lyrs], layer_start[lyrs] + widths[lyrs])
+
+    srcs, dsts = [], []
+
+    # ---- 边 ----
+    # 前一层的每个node都向下层随机连接
+    chain_src = np.flatnonzero(~layer_last[node_layer] & ~layer_extra[node_layer])
+    srcs.append(chain_src)
+    dsts.append(__pick(node_layer[chain_src] + 1))
+
+    # 超过四层且skiplayer大于1的图，随机选择1~skiplayer层（可重复取样）做深层连接
+    # 在选中的层内，30%的概率不做任何操作，以50%的概率向下探两层，20%的概率向下探三层
+    if skiplayer > 1:
+        deep_dags = np.flatnonzero(layer_counts >= 4)
+        deep_dags = np.repeat(
+            deep_dags, rng.integers(1, skiplayer, size=len(deep_dags), endpoint=True)
+        )
+        c_layer = dag_first_layer[deep_dags] + rng.integers(0, layer_counts[deep_dags] - 3)
+        deep_count = rng.choice([0, 2, 3], size=len(deep_dags), p=[0.3, 0.5, 0.2])
+        c_layer, deep_count = c_layer[deep_count > 0], deep_count[deep_count > 0]
+        srcs.append(__pick(c_layer))
+        dsts.append(__pick(c_layer + deep_count))
+
+    def __fix_no_predecessor(node_mask: np.ndarray):
+        in_degree = np.bincount(np.concatenate(dsts), minlength=node_num)
+        nodes = np.flatnonzero(node_mask & (in_degree == 0))
+        srcs.append(__pick(node_layer[nodes] - 1))
+        dsts.append(nodes)
+
+    # 处理最后一层，防止出现孤点
+    __fix_no_predecessor(layer_last[node_layer])
+
+    is_extra = layer_extra[node_layer]
+    if density:
+        # 密度图：除第一层外，每个节点至少有一个前导
+        __fix_no_predecessor((node_depth > 0) & ~layer_last[node_layer] & ~is_extra)
+    else:
+        # 非密度图可能会存在不连通子图，需要纠正（规则同 make_dag.build_dag）
+        # 节点编号按层递增，边总是从浅层指向深层，因此按源/终点深度分组逐层传播可达性
+        src = np.concatenate(srcs)
+        dst = np.concatenate(dsts)
+        fwd = np.argsort(node_depth[src], kind="stable")
+        fwd_groups = np.split(fwd, np.flatnonzero(np.diff(node_depth[src][fwd])) + 1)
+        bwd = np.argsort(-node_depth[dst], kind="stable")
+        bwd_groups = np.split(bwd, np.flatnonzero(np.diff(node_depth[dst][bwd])) + 1)
+
+        def __forward(mask: np.ndarray) -> np.ndarray:
+            reach = mask.copy()
+            for g in fwd_groups:
+                reach[dst[g][reach[src[g]]]] = True
+            return reach
+
+        def __backward(mask: np.ndarray) -> np.ndarray:
+            reach = mask.copy()
+            for g in bwd_groups:
+                reach[src[g][reach[dst[g]]]] = True
+            return reach
+
+        no_pred = (np.bincount(dst, minlength=node_num) == 0) & ~is_extra
+        sinks = (np.bincount(src, minlength=node_num) == 0) & ~is_extra
+        terminal_node = sinks & __forward(node_depth == 0)
+        top_nodes = __backward(terminal_node) & no_pred
+        orphan_point = sinks & ~terminal_node & ~__forward(top_nodes)
+        orphan_node = np.flatnonzero(__backward(orphan_point) & no_pred & (node_depth > 0))
+        srcs.append(__pick(node_layer[orphan_node] - 1))
+        dsts.append(orphan_node)
+
+    # 单出口
+    to_extra = np.flatnonzero(layer_last[node_layer] & np.append(layer_extra, False)[node_layer + 1])
+    srcs.append(to_extra)
+    dsts.append(layer_start[node_layer[to_extra] + 1])
+
+    src = np.concatenate(srcs)
+    dst = np.concatenate(dsts)
+    edge_order = np.argsort(layer_dag[node_layer[src]], kind="stable")
+    src, dst = src[edge_order], dst[edge_order]
+
+    # ---- 节点属性 ----
+    # 随机重排每层节点的输出顺序
+    node_order = np.lexsort((rng.random(node_num), node_layer))
+    durations = rng.integers(duration_ranges[0], duration_ranges[1], size=node_num, endpoint=True)
+    mems = rng.integers(
+        task_mem * 1024 * 1024, 2 * task_mem * 1024 * 1024, size=node_num, endpoint=True
+    )
+    customization = rng.random(dag_num) < custom_wf_rate
+    cost_idx = rng.integers(0, 4, size=dag_num)
+    time_grades = _TIME_GRADES[cost_idx, rng.integers(0, 2, size=dag_num)]
+    custom_ids = rng.bytes(16 * dag_num)
+
+    # 转换为每个DAG内从0开始的局部编号，整体转换为 array 后按DAG切片
+    node_base = dag_node_base[layer_dag[node_layer]]
+    local_order = _to_array("I", node_order - node_base[node_order])
+    local_src = _to_array("I", src - node_base[src])
+    local_dst = _to_array("I", dst - node_base[dst])
+    durations = _to_array("I", durations)
+    mems = _to_array("Q", mems)
+    layer_bounds = np.append(layer_start, node_num).tolist()
+    dag_layer_bounds = np.append(dag_first_layer, len(widths)).tolist()
+    edge_bounds = [0] + np.cumsum(np.bincount(layer_dag[node_layer[src]], minlength=dag_num)).tolist()
+
+    result = []
+    for b in range(dag_num):
+        first_layer, end_layer = dag_layer_bounds[b], dag_layer_bounds[b + 1]
+        node_from, node_to = layer_bounds[first_layer], layer_bounds[end_layer]
+        dag = CompactDag.from_arrays(
+            names[b],
+            [
+                local_order[layer_bounds[lyr] : layer_bounds[lyr + 1]]
+                for lyr in range(first_layer, end_layer)
+            ],
+            local_src[edge_bounds[b] : edge_bounds[b + 1]],
+            local_dst[edge_bounds[b] : edge_bounds[b + 1]],
+        )
+        dag.durations = durations[node_from:node_to]
+        dag.cpus = array("I", [1]) * dag.node_count
+        dag.mems = mems[node_from:node_to]
+        dag.custom_id = str(uuid.UUID(bytes=custom_ids[16 * b : 16 * b + 16], version=4))
+        if customization[b]:
+            dag.customization = True
+            dag.cost_grade = str(_GRADES[cost_idx[b]])
+            dag.time_grade = str(time_grades[b])
+        result.append((dag, node_num_per_layer[b].tolist()))
+    return result
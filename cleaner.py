@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import grpc
+
+from latency import latency_summary
+from load import arrival_offsets, run_open_loop
+from sc_client import AsyncChannelPool
+from sc_pb2 import DeleteWorkflowRequest
+from stats import LogHistogram
+from tracker import BackgroundPoller
+
+
+class WorkflowCleaner(BackgroundPoller):
+    """
+    通过 DeleteWorkflow 批量删除已注入的工作流
+
+    发送路径调用 track 登记已被控制器接受的工作流。后台每隔 poll_interval 秒删除一轮：
+    delay_secs 大于等于 0 时，接受超过 delay_secs 秒的工作流到期删除（持续跟在注入之后清理）；
+    flush 删除全部已登记的工作流并等待完成（在两轮测试之间清理）。
+    同时在途的删除请求不超过 concurrency 个，rate 大于 0 时删除请求按固定间隔发出，
+    每秒不超过 rate 个
+    """
+
+    def __init__(
+        self,
+        address: str,
+        options: list,
+        id_of: Callable[[int], str],
+        concurrency: int = 16,
+        rate: float = 0,
+        delay_secs: float = -1,
+        poll_interval: float = 1.0,
+    ):
+        """
+        @param id_of 由语料下标返回 custom_id
+        @param delay_secs 小于 0 表示只在 flush/stop 时删除
+        """
+        super().__init__(address, options, poll_interval, "workflow-cleaner")
+        self.id_of = id_of
+        self.concurrency = concurrency
+        self.rate = rate
+        self.delay_secs = delay_secs
+
+        self._new: List[Tuple[int, int]] = []
+        self._lock = threading.Lock()
+        # 待删除的工作流 -> 接受时刻，按接受先后排列
+        self._pending: Dict[str, int] = {}
+        self._sem: Optional[asyncio.Semaphore] = None
+        # flush 请求与完成的序号：轮询开始时已请求的 flush，在该轮结束且没有待删除的工作流时完成
+        self._flush_requested = 0
+        self._flushed = 0
+        self._flushed_cond = threading.Condition()
+
+        # 单位：ns
+        self.latency = LogHistogram()
+        self.deleted = 0
+        self.errors: Dict[str, int] = {}
+        # 删除请求占用的总时长（各轮从开始删除到全部完成），用于计算吞吐量，单位：ns
+        self.busy_time = 0
+
+    # ---- 发送路径 ----
+    def track(self, indices: List[int], accepted_at: int):
+        """
+        @param accepted_at InputWorkflow 返回的时刻，time.monotonic_ns()
+        """
+        with self._lock:
+            self._new.extend((i, accepted_at) for i in indices)
+
+    def flush(self, timeout: Optional[float] = None) -> dict:
+        """
+        删除目前已登记的全部工作流，阻塞直到完成或超时
+        @return 本次删除的个数、耗时（秒）和吞吐量（个/秒）
+        """
+        deleted, a1 = self.deleted, time.monotonic()
+        with self._flushed_cond:
+            self._flush_requested += 1
+            target = self._flush_requested
+            done = self._flushed_cond.wait_for(lambda: self._flushed >= target, timeout)
+        elapsed = time.monotonic() - a1
+        result = {
+            "deleted": self.deleted - deleted,
+            "seconds": elapsed,
+            "rate": (self.deleted - deleted) / elapsed if elapsed > 0 else 0.0,
+            "pending": len(self._pending),
+        }
+        if not done:
+            print(f"cleanup timed out with {result['pending']} workflows left")
+        return result
+
+    # ---- 后台删除 ----
+    def _admit(self):
+        with self._lock:
+            new, self._new = self._new, []
+        for i, accepted_at in new:
+            # 同一工作流重复发送时只删除一次
+            self._pending.setdefault(self.id_of(i), accepted_at)
+
+    def _idle(self) -> bool:
+        return not self._pending
+
+    def _due(self, flush: bool) -> List[str]:
+        if flush or self._stop_at is not None:
+            return list(self._pending)
+        if self.delay_secs < 0:
+            return []
+        # 待删除的工作流按接受先后排列，只需从头检查
+        deadline = time.monotonic_ns() - self.delay_secs * 1e9
+        due = []
+        for custom_id, accepted_at in self._pending.items():
+            if accepted_at > deadline:
+                break
+            due.append(custom_id)
+        return due
+
+    async def _delete(self, pool: AsyncChannelPool, custom_id: str):
+        async with self._sem:
+            a1 = time.monotonic_ns()
+            try:
+                await pool.stub().DeleteWorkflow(
+                    DeleteWorkflowRequest(custom_id=custom_id), timeout=30
+                )
+                self.latency.add(time.monotonic_ns() - a1)
+                self.deleted += 1
+            except grpc.aio.AioRpcError as e:
+                # 删除失败不重试，避免清理阻塞后续测试
+                code = e.code().name
+                self.errors[code] = self.errors.get(code, 0) + 1
+
+    async def _round(self, pool: AsyncChannelPool):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        # _admit 在本方法之前调用，此时已请求的 flush 包含其之前登记的全部工作流
+        flush = self._flush_requested
+        due = self._due(flush > self._flushed)
+        for custom_id in due:
+            del self._pending[custom_id]
+        if due:
+            if self.rate > 0:
+                offsets = arrival_offsets(self.rate, len(due))
+            else:
+                offsets = [0] * len(due)
+            a1 = time.monotonic_ns()
+            await run_open_loop(offsets, lambda i, _: self._delete(pool, due[i]))
+            self.busy_time += time.monotonic_ns() - a1
+        if not self._pending:
+            with self._flushed_cond:
+                self._flushed = flush
+                self._flushed_cond.notify_all()
+
+    # ---- 输出 ----
+    def to_dict(self) -> dict:
+        return {
+            "unit": "ns",
+            "deleted": self.deleted,
+            "pending": len(self._pending),
+            "errors": self.errors,
+            "throughput": self.deleted / (self.busy_time / 1e9) if self.busy_time > 0 else 0.0,
+            "latency": {**latency_summary(self.latency), "histogram": self.latency.to_dict()},
+        }
+
+    def print_summary(self):
+        d = self.to_dict()
+        s = d["latency"]
+        values = ", ".join(
+            f"{k} {s[k] / 1e6:.3f}ms" for k in ("p50", "p90", "p99", "max") if s[k] is not None
+        )
+        print(
+            f"deleted {self.deleted} workflows ({d['throughput']:.2f}/s), "
+            f"{len(self._pending)} pending, errors {self.errors}"
+        )
+        print(f"delete_latency: count {s['count']}, {values}")
@@ -0,0 +1,174 @@
+import mmap
+import os
+import struct
+import uuid
+from typing import Dict, List, NamedTuple, Sequence
+
+# 打包格式的工作流语料：
+#   corpus.idx          定长二进制索引。文件头 + 每个DAG一条定长记录
+#   corpus.<type>.dat   每种输出类型一个只追加的数据文件，每条记录为 4 字节小端长度 + 数据
+# 索引记录中保存每种类型的数据偏移（指向长度前缀之后）和长度，以及DAG元信息
+CORPUS_INDEX = "corpus.idx"
+CORPUS_MAGIC = b"DAGIDX01"
+
+# 文件头：magic，版本，输出类型数量，随后是每种类型的名称（16字节，\0 填充）
+_HEADER = struct.Struct("<8sHH")
+_TYPE_NAME = struct.Struct("<16s")
+_LENGTH = struct.Struct("<I")
+# DAG元信息：层数，节点数，边数，标志位（bit0: 定制工作流），custom_id（uuid 16字节），
+# 关键路径长度（秒，版本 2 起）
+_META = {1: struct.Struct("<IIII16s"), 2: struct.Struct("<IIII16sI")}
+_LOCATION = struct.Struct("<QI")
+_VERSION = 2
+
+
+def corpus_data_filename(data_type: str) -> str:
+    return f"corpus.{data_type}.dat"
+
+
+def _record_struct(type_count: int, version: int = _VERSION) -> struct.Struct:
+    return struct.Struct("<" + "QI" * type_count + _META[version].format[1:])
+
+
+class DagMeta(NamedTuple):
+    layer_count: int
+    node_count: int
+    edge_count: int
+    customization: bool
+    custom_id: str
+    # 关键路径长度，单位：秒。版本 1 的索引中为 0
+    critical_path: int = 0
+
+
+class CorpusWriter:
+    """
+    顺序写入打包语料。数据文件只追加，索引记录定长
+    """
+
+    def __init__(self, dag_dir: str, outtypes: List[str]):
+        self.outtypes = list(outtypes)
+        self.count = 0
+        self._record = _record_struct(len(self.outtypes))
+        self._data_files = {
+            t: open(os.path.join(dag_dir, corpus_data_filename(t)), "wb")
+            for t in self.outtypes
+        }
+        self._offsets = {t: 0 for t in self.outtypes}
+        self._index_file = open(os.path.join(dag_dir, CORPUS_INDEX), "wb")
+        self._index_file.write(_HEADER.pack(CORPUS_MAGIC, _VERSION, len(self.outtypes)))
+        for t in self.outtypes:
+            self._index_file.write(_TYPE_NAME.pack(t.encode()))
+
+    def append(self, payloads: Dict[str, bytes], meta: DagMeta):
+        locations = []
+        for t in self.outtypes:
+            d = payloads[t]
+            f = self._data_files[t]
+            f.write(_LENGTH.pack(len(d)))
+            f.write(d)
+            offset = self._offsets[t] + _LENGTH.size
+            self._offsets[t] = offset + len(d)
+            locations.extend((offset, len(d)))
+        self._index_file.write(
+            self._record.pack(
+                *locations,
+                meta.layer_count,
+                meta.node_count,
+                meta.edge_count,
+                int(meta.customization),
+                uuid.UUID(meta.custom_id).bytes,
+                meta.critical_path,
+            )
+        )
+        self.count += 1
+
+    def close(self):
+        for f in self._data_files.values():
+            f.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _PayloadView(Sequence):
+    """
+    某一输出类型的全部数据，按下标返回 mmap 上的 memoryview 切片（零拷贝）
+    """
+
+    def __init__(self, reader: "CorpusReader", data_type: str):
+        self._reader = reader
+        self._data_type = data_type
+
+    def __len__(self) -> int:
+        return len(self._reader)
+
+    def __getitem__(self, i: int) -> memoryview:
+        return self._reader.payload(i, self._data_type)
+
+
+class CorpusReader:
+    """
+    通过 mmap 读取打包语料
+    """
+
+    def __init__(self, dag_dir: str):
+        with open(os.path.join(dag_dir, CORPUS_INDEX), "rb") as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, type_count = _HEADER.unpack_from(self._index, 0)
+        if magic != CORPUS_MAGIC or version not in _META:
+            raise Exception(f"不支持的语料索引格式: {magic} v{version}")
+        self.outtypes = [
+            _TYPE_NAME.unpack_from(self._index, _HEADER.size + i * _TYPE_NAME.size)[0]
+            .rstrip(b"\0")
+            .decode()
+            for i in range(type_count)
+        ]
+        self._records_from = _HEADER.size + type_count * _TYPE_NAME.size
+        self._record = _record_struct(type_count, version)
+        self._count = (len(self._index) - self._records_from) // self._record.size
+
+        self._data: Dict[str, memoryview] = {}
+        for t in self.outtypes:
+            with open(os.path.join(dag_dir, corpus_data_filename(t)), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    self._data[t] = memoryview(b"")
+                else:
+                    self._data[t] = memoryview(
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    )
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _unpack(self, i: int) -> tuple:
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return self._record.unpack_from(self._index, self._records_from + i * self._record.size)
+
+    def payload(self, i: int, data_type: str) -> memoryview:
+        k = self.outtypes.index(data_type)
+        r = self._unpack(i)
+        offset, length = r[2 * k], r[2 * k + 1]
+        return self._data[data_type][offset : offset + length]
+
+    def payloads(self, data_type: str) -> Sequence[memoryview]:
+        if data_type not in self.outtypes:
+            return []
+        return _PayloadView(self, data_type)
+
+    def meta(self, i: int) -> DagMeta:
+        # 每种类型的 (偏移，长度) 之后为元信息
+        r = self._unpack(i)[2 * len(self.outtypes) :]
+        layer_count, node_count, edge_count, flags, custom_id, *rest = r
+        return DagMeta(
+            layer_count,
+            node_count,
+            edge_count,
+            bool(flags & 1),
+            str(uuid.UUID(bytes=custom_id)),
+            *rest,
+        )
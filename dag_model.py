@@ -0,0 +1,141 @@
+from array import array
+from typing import List, Optional, Tuple
+
+
+def _build_csr(node_count: int, keys: array, values: array) -> Tuple[array, array]:
+    # 计数排序构建 CSR（偏移+目标），同一节点的目标保持边的建立顺序
+    offsets = array("I", bytes(4 * (node_count + 1)))
+    for k in keys:
+        offsets[k + 1] += 1
+    for i in range(node_count):
+        offsets[i + 1] += offsets[i]
+    targets = array("I", bytes(4 * len(keys)))
+    cursor = offsets[:-1]
+    for k, v in zip(keys, values):
+        targets[cursor[k]] = v
+        cursor[k] += 1
+    return offsets, targets
+
+
+class CompactDag:
+    """
+    紧凑的分层DAG表示
+
+    节点编号为从0开始的连续整数，每层节点、边的起点和终点均保存在 array('I') 中。
+    后继/前导邻接关系在首次查询时构建为 CSR 结构，新增边后自动失效重建。
+    DOT 文本仅在调用 to_dot 时生成
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.layers: List[array] = []
+        self.node_count = 0
+        self._src = array("I")
+        self._dst = array("I")
+        self._in_degree = array("I")
+        self._out_degree = array("I")
+        self._succ: Optional[Tuple[array, array]] = None
+        self._pred: Optional[Tuple[array, array]] = None
+
+        # 节点属性，按节点编号索引。由 make_dag.materialize 一次性生成，
+        # 所有输出格式（json/protobuf）共享同一份取值
+        self.durations = array("I")
+        self.cpus = array("I")
+        self.mems = array("Q")
+        # 工作流属性
+        self.custom_id = ""
+        self.customization = False
+        self.time_grade = ""
+        self.cost_grade = ""
+
+    @classmethod
+    def from_arrays(
+        cls, name: str, layers: List[array], src: array, dst: array
+    ) -> "CompactDag":
+        """
+        由已生成的各层节点和边构建DAG（供批量生成使用）
+        """
+        dag = cls(name)
+        dag.layers.extend(layers)
+        dag.node_count = sum(len(layer) for layer in layers)
+        dag._in_degree = array("I", bytes(4 * dag.node_count))
+        dag._out_degree = array("I", bytes(4 * dag.node_count))
+        dag._src = src
+        dag._dst = dst
+        for s in src:
+            dag._out_degree[s] += 1
+        for d in dst:
+            dag._in_degree[d] += 1
+        return dag
+
+    def new_layer(self, count: int) -> array:
+        """
+        追加一层，包含 count 个新节点
+        @return 本层节点编号（可原地重排）
+        """
+        layer = array("I", range(self.node_count, self.node_count + count))
+        self.node_count += count
+        self._in_degree.extend(array("I", bytes(4 * count)))
+        self._out_degree.extend(array("I", bytes(4 * count)))
+        self.layers.append(layer)
+        self._succ = self._pred = None
+        return layer
+
+    def add_edge(self, src: int, dst: int):
+        self._src.append(src)
+        self._dst.append(dst)
+        self._out_degree[src] += 1
+        self._in_degree[dst] += 1
+        self._succ = self._pred = None
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._src)
+
+    def has_predecessor(self, node: int) -> bool:
+        return self._in_degree[node] > 0
+
+    def has_successor(self, node: int) -> bool:
+        return self._out_degree[node] > 0
+
+    def successors(self, node: int) -> memoryview:
+        if self._succ is None:
+            self._succ = _build_csr(self.node_count, self._src, self._dst)
+        offsets, targets = self._succ
+        return memoryview(targets)[offsets[node] : offsets[node + 1]]
+
+    def predecessors(self, node: int) -> memoryview:
+        if self._pred is None:
+            self._pred = _build_csr(self.node_count, self._dst, self._src)
+        offsets, targets = self._pred
+        return memoryview(targets)[offsets[node] : offsets[node + 1]]
+
+    def edges(self):
+        return zip(self._src, self._dst)
+
+    def critical_path(self) -> int:
+        """
+        关键路径长度：所有路径中节点 duration 之和的最大值（单位与 duration 相同），
+        即资源充足时工作流的最短完成时间。节点编号按层递增，按编号顺序即为拓扑序
+        """
+        finish = array("Q", bytes(8 * self.node_count))
+        for n in range(self.node_count):
+            start = 0
+            for p in self.predecessors(n):
+                if finish[p] > start:
+                    start = finish[p]
+            finish[n] = start + self.durations[n]
+        return max(finish, default=0)
+
+    def to_dot(self) -> str:
+        from graphviz import Digraph
+
+        dot = Digraph(comment=f"DAG {self.name}")
+        dot.attr(rankdir="TB")
+        dot.attr("node", shape="circle")
+        for layer in self.layers:
+            for n in layer:
+                dot.node(f"t{n}")
+        for src, dst in self.edges():
+            dot.edge(f"t{src}", f"t{dst}")
+        return dot.source
@@ -1,27 +1,70 @@
+import asyncio
+import concurrent.futures
+import functools
+import http.client
+import itertools
 import json
 import os
+import random
+import signal
 import subprocess
+import tempfile
 import time
 from random import choices, uniform
-import csv
-from typing import Optional
+from typing import List, Optional, Tuple
 
+import grpc
 import yaml
-from grpc import insecure_channel
 from shutil import copyfile
 
+from argo_client import ArgoClient, KubeConfig, load_kubeconfig
+from cleaner import WorkflowCleaner
+from corpus import CORPUS_INDEX, CorpusReader
+from keepalive import KeepAliveFleet
+from latency import LatencyRecorder, latency_summary
+from load import arrival_offsets, find_capacity, parse_profile, run_open_loop
+from metrics_sink import METRICS_FORMATS, MetricsSink
+from object_store import MultipartUploader
+from prom import InjectorMetrics
+from reads import ReadWorkload, parse_read_mix
+from sc_client import AsyncChannelPool, ChannelPool, channel_options
 from sc_pb2 import InputWorkflowReply, InputWorkflowRequest
-from sc_pb2_grpc import SchedulerControllerStub
-import boto3
-from botocore.exceptions import ClientError
+from stats import LogHistogram
+from tracker import CompletionTracker, LagMonitor
 import math
 
 workflows_protobuf = []
 workflows_json = []
-csv_writer: Optional[csv.DictWriter] = None
-csv_file = None
+# 预先生成的 argo 提交内容，与 workflows_json 一一对应：cli 方式为 YAML，api 方式为 JSON
+argo_manifests: List[bytes] = []
+# 打包格式的语料；files 格式下为 None，元信息从各工作流的 config.json 读取
+corpus: Optional[CorpusReader] = None
+protobuf_file_paths: List[str] = []
+metrics_sink: Optional[MetricsSink] = None
+metrics_uploader: Optional[MultipartUploader] = None
+sc_pool: Optional[ChannelPool] = None
+latency_recorder: Optional[LatencyRecorder] = None
+completion_tracker: Optional[CompletionTracker] = None
+lag_monitor: Optional[LagMonitor] = None
+workflow_cleaner: Optional[WorkflowCleaner] = None
+keepalive_fleet: Optional[KeepAliveFleet] = None
+read_workload: Optional[ReadWorkload] = None
+argo_client: Optional[ArgoClient] = None
+# 部分工作流被拒绝、未交给跟踪器的批次数和其中的工作流数
+partially_rejected_batches = 0
+partially_rejected_workflows = 0
+# 实时指标，METRICS_PORT 大于 0 时通过 /metrics 提供
+live_metrics = InjectorMetrics()
 
 MAKE_WORKFLOW_NUM = int(os.environ.get("MAKE_WORKFLOW_NUM", "10000"))
+# 生成工作流使用的进程数
+MAKE_WORKFLOW_WORKERS = int(os.environ.get("MAKE_WORKFLOW_WORKERS", "1"))
+# 生成工作流的随机种子，为空表示随机选取
+MAKE_WORKFLOW_SEED = os.environ.get("MAKE_WORKFLOW_SEED", "")
+# 生成工作流的引擎：python 或 numpy（批量向量化生成）
+MAKE_WORKFLOW_ENGINE = os.environ.get("MAKE_WORKFLOW_ENGINE", "python")
+# 工作流语料格式：files 每个工作流独立文件；packed 打包为数据文件+定长索引
+CORPUS_FORMAT = os.environ.get("CORPUS_FORMAT", "files")
 TEST_WITH_ARGO = os.environ.get("TEST_WITH_ARGO", False) in (
     True,
     "True",
@@ -61,11 +104,138 @@ METRIC_FILE_SOS = (
 )
 if METRIC_FILE_SOS:  # 如果要写入sos存储，必须先写入文件
     WRITE_METRICS_TO_FILE = True
+# SOS存储中对象名的前缀
+METRIC_FILE_SOS_PREFIX = os.environ.get("METRIC_FILE_SOS_PREFIX", "")
+# 分片上传每片的大小，单位：MB，不小于 5
+METRIC_FILE_SOS_PART_MB = int(os.environ.get("METRIC_FILE_SOS_PART_MB", "8"))
+# 指标文件格式：csv；arrow（Arrow IPC 流，每批一个 record batch）；parquet（每批一个 row group）
+METRICS_FORMAT = os.environ.get("METRICS_FORMAT", "csv")
 
 SLEEP_SECS = int(os.environ.get("SLEEP_SECS", "1"))  # 发送等待间隔，秒
 BATCH_SIZE = int(os.environ.get("BATCH_SIZE", "1000"))  # 每次发送的工作流个数
 NEW_CORE_ADDRESS = os.environ.get("NEW_CORE_ADDRESS", "scheduler-controller-service:6060")
+# 与控制器之间保持的长连接 gRPC 通道数，发送时轮询使用
+SC_CHANNEL_POOL_SIZE = int(os.environ.get("SC_CHANNEL_POOL_SIZE", "1"))
+# gRPC keepalive 探测间隔与超时，单位：毫秒
+SC_KEEPALIVE_MS = int(os.environ.get("SC_KEEPALIVE_MS", "30000"))
+SC_KEEPALIVE_TIMEOUT_MS = int(os.environ.get("SC_KEEPALIVE_TIMEOUT_MS", "10000"))
+# gRPC 最大消息长度，单位：MB
+SC_MAX_MESSAGE_MB = int(os.environ.get("SC_MAX_MESSAGE_MB", "64"))
+# HTTP/2 初始流窗口大小，单位：字节。0 表示使用 gRPC 默认值
+SC_HTTP2_WINDOW_BYTES = int(os.environ.get("SC_HTTP2_WINDOW_BYTES", "0"))
+# 建立连接超时，单位：秒
+SC_CONNECT_TIMEOUT_SECS = float(os.environ.get("SC_CONNECT_TIMEOUT_SECS", "30"))
+# 连接建立后在每个通道上发送空请求预热的轮数，0 表示只等待连接就绪。空请求会到达控制器
+SC_WARMUP_ROUNDS = int(os.environ.get("SC_WARMUP_ROUNDS", "0"))
+# 同时在途的 InputWorkflow 请求数。1 表示原有的串行发送（发送、等待回复、休眠）；
+# 大于 1 时使用 grpc.aio 并发发送，每个并发发送者各自发送后休眠 SLEEP_SECS
+SC_CONCURRENCY = int(os.environ.get("SC_CONCURRENCY", "1"))
 TEST_NUM = int(os.environ.get("TEST_NUM", "100"))  # 总测试轮数
+# 发送方式：sleep 表示每轮发送后休眠 SLEEP_SECS（闭环）；
+# constant/poisson 表示按预先计算的时间线开环发送，固定间隔或泊松到达
+ARRIVAL_MODE = os.environ.get("ARRIVAL_MODE", "sleep")
+# 开环发送速率，单位：工作流/秒，可以是小数。为空表示 BATCH_SIZE / SLEEP_SECS
+SC_RATE = os.environ.get("SC_RATE", "")
+ARGO_RATE = os.environ.get("ARGO_RATE", "")
+# 泊松到达的随机种子，为空表示随机选取
+ARRIVAL_SEED = os.environ.get("ARRIVAL_SEED", "")
+# 指标文件 fsync 间隔，单位：秒。指标由后台线程批量写入，只对指标文件本身 fsync
+METRICS_FLUSH_SECS = float(os.environ.get("METRICS_FLUSH_SECS", "1"))
+# 指标文件按大小分段，单位：MB。0 表示不分段
+METRICS_ROTATE_MB = float(os.environ.get("METRICS_ROTATE_MB", "0"))
+# 指标文件按时间分段，单位：秒。0 表示不分段
+METRICS_ROTATE_SECS = float(os.environ.get("METRICS_ROTATE_SECS", "0"))
+# 实时指标 HTTP 端口（OpenMetrics 格式，路径 /metrics）。0 表示不启动
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+# 请求延迟直方图的时间窗口，单位：秒
+LATENCY_WINDOW_SECS = float(os.environ.get("LATENCY_WINDOW_SECS", "60"))
+# 运行模式：inject 按上述配置注入工作流；capacity 搜索控制器可持续的最大吞吐量；
+# fanin 不注入工作流，搜索控制器能承载的最大模拟调度器数（保活扇入能力）
+INJECT_MODE = os.environ.get("INJECT_MODE", "inject")
+# 饱和点搜索：p99 InputWorkflow 延迟上限，单位：毫秒
+CAPACITY_SLO_P99_MS = float(os.environ.get("CAPACITY_SLO_P99_MS", "1000"))
+# 饱和点搜索的起始速率，单位：工作流/秒。为空表示 BATCH_SIZE / SLEEP_SECS
+CAPACITY_START_RATE = os.environ.get("CAPACITY_START_RATE", "")
+# 饱和点搜索的速率上限，单位：工作流/秒。0 表示不限制
+CAPACITY_MAX_RATE = float(os.environ.get("CAPACITY_MAX_RATE", "0"))
+# 每一级施压的时长，单位：秒
+CAPACITY_STEP_SECS = float(os.environ.get("CAPACITY_STEP_SECS", "10"))
+# 逐级提速的倍数
+CAPACITY_GROWTH = float(os.environ.get("CAPACITY_GROWTH", "2"))
+# 二分结束时区间的相对宽度
+CAPACITY_PRECISION = float(os.environ.get("CAPACITY_PRECISION", "0.05"))
+# 负载曲线：JSON 描述、JSON 文件路径或 (timestamp, rate) CSV 文件路径。
+# 不为空时控制器和 argo 均按负载曲线开环发送，忽略 TEST_NUM 和 SC_RATE/ARGO_RATE
+LOAD_PROFILE = os.environ.get("LOAD_PROFILE", "")
+if LOAD_PROFILE and ARRIVAL_MODE == "sleep":
+    ARRIVAL_MODE = "constant"
+# 跟踪发送到控制器的工作流直到完成，记录开始运行/完成耗时并与关键路径长度比较
+TRACK_COMPLETION = os.environ.get("TRACK_COMPLETION", False) in (
+    True,
+    "True",
+    "true",
+    "yes",
+)
+# 状态轮询间隔，单位：秒。完成时刻的精度受此间隔限制
+TRACK_POLL_INTERVAL_SECS = float(os.environ.get("TRACK_POLL_INTERVAL_SECS", "1"))
+# 每轮最多轮询的工作流数
+TRACK_POLL_BUDGET = int(os.environ.get("TRACK_POLL_BUDGET", "1000"))
+# 同时在途的 GetWorkflowPhaseByCustomID 请求数
+TRACK_POLL_CONCURRENCY = int(os.environ.get("TRACK_POLL_CONCURRENCY", "32"))
+# 发送后超过此时间仍未完成的工作流计为超时，单位：秒
+TRACK_TIMEOUT_SECS = float(os.environ.get("TRACK_TIMEOUT_SECS", "3600"))
+# 发送结束后等待已跟踪工作流完成的最长时间，单位：秒
+TRACK_DRAIN_SECS = float(os.environ.get("TRACK_DRAIN_SECS", "600"))
+# 视为开始运行/已完成的工作流状态，逗号分隔
+TRACK_RUNNING_PHASES = os.environ.get("TRACK_RUNNING_PHASES", "Running")
+TRACK_DONE_PHASES = os.environ.get("TRACK_DONE_PHASES", "Succeeded,Failed,Error")
+# 监测控制器接受工作流到工作流出现在 FetchWorkflowIDList 中的延迟，以及积压随时间的变化
+TRACK_VISIBILITY = os.environ.get("TRACK_VISIBILITY", False) in (
+    True,
+    "True",
+    "true",
+    "yes",
+)
+# FetchWorkflowIDList 调用间隔，单位：秒
+VISIBILITY_POLL_INTERVAL_SECS = float(os.environ.get("VISIBILITY_POLL_INTERVAL_SECS", "1"))
+# 接受后超过此时间仍不可见的工作流计为丢失，单位：秒
+VISIBILITY_TIMEOUT_SECS = float(os.environ.get("VISIBILITY_TIMEOUT_SECS", "600"))
+# 通过 DeleteWorkflow 清理已注入的工作流：off 不清理；round 在每轮测试之间删除已注入的全部工作流；
+# continuous 持续删除接受超过 CLEAN_DELAY_SECS 秒的工作流。两种方式在结束时均删除剩余的工作流
+CLEAN_MODE = os.environ.get("CLEAN_MODE", "off")
+# 同时在途的 DeleteWorkflow 请求数
+CLEAN_CONCURRENCY = int(os.environ.get("CLEAN_CONCURRENCY", "16"))
+# 删除速率上限，单位：个/秒。0 表示不限制
+CLEAN_RATE = float(os.environ.get("CLEAN_RATE", "0"))
+# continuous 方式下工作流被接受后等待多久再删除，单位：秒
+CLEAN_DELAY_SECS = float(os.environ.get("CLEAN_DELAY_SECS", "60"))
+# 每次清理等待完成的最长时间，单位：秒
+CLEAN_TIMEOUT_SECS = float(os.environ.get("CLEAN_TIMEOUT_SECS", "600"))
+# 模拟的调度器个数。大于 0 时在注入的同时持续发送 KeepAlive（fanin 模式下为搜索的起始个数）
+KEEPALIVE_SCHEDULERS = int(os.environ.get("KEEPALIVE_SCHEDULERS", "0"))
+# 模拟的资源分配器个数，开始时通过 RegisterResourceAllocator 注册
+KEEPALIVE_ALLOCATORS = int(os.environ.get("KEEPALIVE_ALLOCATORS", "0"))
+# 模拟的集群数，调度器和资源分配器依次分配到各集群
+KEEPALIVE_CLUSTERS = int(os.environ.get("KEEPALIVE_CLUSTERS", "1"))
+# 各调度器第一次保活的随机错开时间，单位：秒。0 表示同时发送（保活风暴）
+KEEPALIVE_STAGGER_SECS = float(os.environ.get("KEEPALIVE_STAGGER_SECS", "1"))
+# 模拟调度器压力为 0 时的承载力，单位：个
+KEEPALIVE_MAX_CAPACITY = int(os.environ.get("KEEPALIVE_MAX_CAPACITY", "100"))
+# 模拟调度器使用的 gRPC 通道数
+KEEPALIVE_CHANNELS = int(os.environ.get("KEEPALIVE_CHANNELS", "1"))
+# fanin 模式：p99 KeepAlive 延迟上限，单位：毫秒
+KEEPALIVE_SLO_P99_MS = float(os.environ.get("KEEPALIVE_SLO_P99_MS", "100"))
+# fanin 模式：模拟调度器个数上限。0 表示不限制
+KEEPALIVE_MAX_SCHEDULERS = int(os.environ.get("KEEPALIVE_MAX_SCHEDULERS", "0"))
+# 与注入同时发送的读请求速率，单位：请求/秒。0 表示不发送读请求
+READ_RATE = float(os.environ.get("READ_RATE", "0"))
+# 读请求类型及比例：fetch_ids（FetchWorkflowIDList）、get_workflow（GetWorkflowByID）、
+# get_phase（GetWorkflowPhaseByCustomID），格式为 <类型>:<权重>,...
+READ_MIX = os.environ.get("READ_MIX", "fetch_ids:1,get_workflow:4,get_phase:5")
+# 注入结束后继续只发送读请求的时间，单位：秒，用于对比没有写入时的读延迟
+READ_TAIL_SECS = float(os.environ.get("READ_TAIL_SECS", "0"))
+# 同时在途的读请求上限，超过时跳过
+READ_MAX_IN_FLIGHT = int(os.environ.get("READ_MAX_IN_FLIGHT", "1000"))
 ACTION_ON_FINISH = os.environ.get(
     "ACTION_ON_FINISH", "exit"
 )  # 结束后的行为，“exit” 执行 TEST_NUM 轮测试后，退出；"sleep" 执行结束后休眠
@@ -82,6 +252,19 @@ SC_TIME_FACTOR_END = float(os.environ.get("SC_TIME_FACTOR_END", "0"))
 # argo 时间因子，单位：秒。
 # 向argo发送单一工作流时，需要延时多少时间
 ARGO_TIME_FACTOR = float(os.environ.get("ARGO_TIME_FACTOR", "0"))
+# 向 argo 提交工作流的方式：cli 每个工作流执行一次 argo submit；
+# api 通过 Kubernetes API 直接创建 Workflow 对象，复用 keep-alive 连接
+ARGO_SUBMIT_MODE = os.environ.get("ARGO_SUBMIT_MODE", "cli")
+# api 方式使用的 kubeconfig，为空表示 $KUBECONFIG 或 ~/.kube/config
+ARGO_KUBECONFIG = os.environ.get("ARGO_KUBECONFIG", "")
+# api 方式的 Kubernetes API 地址，为空表示使用 kubeconfig 中的地址。
+# 可指定为 http://host:port 的本地模拟服务
+ARGO_API_SERVER = os.environ.get("ARGO_API_SERVER", "")
+ARGO_NAMESPACE = os.environ.get("ARGO_NAMESPACE", "argo")
+# api 方式的连接池大小，也是同时在途的提交数上限
+ARGO_API_CONCURRENCY = int(os.environ.get("ARGO_API_CONCURRENCY", "8"))
+# 开环发送时同时运行的 argo submit 进程数上限
+ARGO_CLI_CONCURRENCY = int(os.environ.get("ARGO_CLI_CONCURRENCY", "8"))
 ENABLE_DRAW_GRAPH = os.environ.get("ENABLE_DRAW_GRAPH", False) in (
     True,
     "True",
@@ -94,21 +277,6 @@ TASK_CPU_C = int(os.environ.get("TASK_CPU_C", "100"))
 TASK_MEM_C = int(os.environ.get("TASK_MEM_C", "64"))
 
 
-def upload_file(file_name, bucket, object_name="metrics.csv"):
-    try:
-        s3 = boto3.resource(
-            "s3",
-            aws_access_key_id=METRIC_FILE_SOS_AK,
-            aws_secret_access_key=METRIC_FILE_SOS_SK,
-            endpoint_url=METRIC_FILE_SOS_URL,
-        )
-        bucket = s3.Bucket(bucket)
-        bucket.upload_file(Filename=file_name, Key=object_name)
-    except ClientError as e:
-        return False
-    return True
-
-
 def make_dags():
     import app
 
@@ -134,6 +302,10 @@ def make_dags():
         custom_wf_rate=CUSTOM_WF_RATE,
         task_cpu=TASK_CPU_C,
         task_mem=TASK_MEM_C,
+        workers=MAKE_WORKFLOW_WORKERS,
+        seed=int(MAKE_WORKFLOW_SEED) if MAKE_WORKFLOW_SEED else None,
+        engine=MAKE_WORKFLOW_ENGINE,
+        corpus_format=CORPUS_FORMAT,
     )
 
     if ENABLE_DRAW_GRAPH:
@@ -144,7 +316,8 @@ def make_dags():
         f.write("gen locked")
 
 
-def json_to_argo_workflow_yaml(json_str) -> str:
+def argo_workflow_manifest(json_str) -> dict:
+    # 由工作流 json 生成 Argo Workflow 对象
     dag = json.loads(json_str)
     tasks = []
     for typl in dag["topology"]:
@@ -155,7 +328,7 @@ def json_to_argo_workflow_yaml(json_str) -> str:
                 "dependencies": typl["dependencies"],
             }
         )
-    yaml_data_struct = {
+    return {
         "apiVersion": "argoproj.io/v1alpha1",
         "kind": "Workflow",
         "metadata": {"generateName": "argo-test-wf-"},
@@ -179,16 +352,45 @@ def json_to_argo_workflow_yaml(json_str) -> str:
             ],
         },
     }
-    return yaml.dump(yaml_data_struct)
+
+
+def json_to_argo_workflow_yaml(json_str) -> str:
+    return yaml.dump(argo_workflow_manifest(json_str))
+
+
+def compile_argo_manifests():
+    # 读入语料后一次性生成全部 argo 提交内容，发送路径上不再做 json 解析和 YAML 生成
+    global argo_manifests
+    a1 = time.monotonic()
+    if ARGO_SUBMIT_MODE == "api":
+        argo_manifests = [
+            json.dumps(argo_workflow_manifest(bytes(w)), separators=(",", ":")).encode()
+            for w in workflows_json
+        ]
+    else:
+        argo_manifests = [json_to_argo_workflow_yaml(bytes(w)).encode() for w in workflows_json]
+    print(
+        f"compiled {len(argo_manifests)} argo manifests in {time.monotonic() - a1:.3f} secs"
+    )
 
 
 def read_dags():
-    global workflows_protobuf, workflows_json
+    global workflows_protobuf, workflows_json, corpus
 
     # 读入 dag json 文件，循环发送到控制器
     dag_path = "/tmp/dag"
+    a1 = time.monotonic()
+
+    # 打包格式：通过 mmap 读取，每个工作流都是数据文件上零拷贝的 memoryview
+    if os.path.exists(os.path.join(dag_path, CORPUS_INDEX)):
+        corpus = CorpusReader(dag_path)
+        workflows_json = corpus.payloads("json")
+        workflows_protobuf = corpus.payloads("protobuf")
+        live_metrics.corpus_load_seconds = time.monotonic() - a1
+        live_metrics.corpus_size = len(corpus)
+        return
+
     json_file_paths = []
-    protobuf_file_paths = []
     with open(os.path.join(dag_path, "files.txt"), "r") as f:
         files = f.read()  # 每个文件：[type]:path 都是 json
         for fl in files.splitlines():
@@ -208,53 +410,453 @@ def read_dags():
             ct = f.read()
             workflows_protobuf.append(ct)
 
+    live_metrics.corpus_load_seconds = time.monotonic() - a1
+    live_metrics.corpus_size = max(len(workflows_json), len(workflows_protobuf))
 
-def send_to_argo(workflow) -> int:
-    a1 = time.time_ns()
-    with open("/tmp/123.yaml", "w") as f:
-        f.write(json_to_argo_workflow_yaml(workflow))
-    subprocess.run(["/bin/argo", "submit", "-n", "argo", "/tmp/123.yaml"])
-    return time.time_ns() - a1
 
+@functools.lru_cache(maxsize=None)
+def workflow_meta(i: int) -> tuple:
+    """
+    @return 第 i 个工作流的 (custom_id，关键路径长度（秒）)
+    """
+    if corpus is not None:
+        meta = corpus.meta(i)
+        return meta.custom_id, meta.critical_path
+    pth = protobuf_file_paths[i]
+    # 与 protobuf 数据文件同名的 <name>.config.json
+    with open(os.path.join("/tmp/dag", pth[: pth.rindex(".data")] + ".config.json"), "r") as f:
+        c = json.load(f)
+    return c["custom_id"], c.get("critical_path", 0)
+
+
+def pick_workflows(num: int) -> tuple:
+    # 随机选取 num 个工作流，返回 (语料下标，protobuf 数据)
+    indices = choices(range(len(workflows_protobuf)), k=num)
+    return indices, [workflows_protobuf[i] for i in indices]
+
+
+def track_injected(indices: List[int], sent: int, accept: int):
+    # sent：发送时刻，time.monotonic_ns()。在 InputWorkflow 返回后调用，accept 为 InputWorkflowReply.accept。
+    # 回复中没有被接受的工作流是哪些，部分被拒绝的批次不交给跟踪器，只计数
+    global partially_rejected_batches, partially_rejected_workflows
+    if accept < len(indices):
+        partially_rejected_batches += 1
+        partially_rejected_workflows += len(indices)
+        return
+    if completion_tracker is not None:
+        completion_tracker.track(indices, sent)
+    if read_workload is not None:
+        read_workload.track(indices)
+    if lag_monitor is not None or workflow_cleaner is not None:
+        accepted = time.monotonic_ns()
+        if lag_monitor is not None:
+            lag_monitor.track(indices, accepted)
+        if workflow_cleaner is not None:
+            workflow_cleaner.track(indices, accepted)
+
+
+def start_completion_tracker():
+    global completion_tracker
+    completion_tracker = CompletionTracker(
+        NEW_CORE_ADDRESS,
+        sc_channel_options(),
+        workflow_meta,
+        TRACK_POLL_INTERVAL_SECS,
+        TRACK_POLL_BUDGET,
+        TRACK_POLL_CONCURRENCY,
+        TRACK_TIMEOUT_SECS,
+        TRACK_RUNNING_PHASES.split(","),
+        TRACK_DONE_PHASES.split(","),
+    )
+    completion_tracker.start()
+
+
+def start_lag_monitor():
+    global lag_monitor
+    lag_monitor = LagMonitor(
+        NEW_CORE_ADDRESS,
+        sc_channel_options(),
+        lambda i: workflow_meta(i)[0],
+        VISIBILITY_POLL_INTERVAL_SECS,
+        VISIBILITY_TIMEOUT_SECS,
+    )
+    live_metrics.ingest_backlog = lambda: lag_monitor.backlog
+    lag_monitor.start()
+
+
+def save_visibility():
+    if lag_monitor is None:
+        return
+    print(f"waiting up to {VISIBILITY_TIMEOUT_SECS} secs for accepted workflows to be listed...")
+    lag_monitor.stop(VISIBILITY_TIMEOUT_SECS)
+    lag_monitor.print_summary()
+    if WRITE_METRICS_TO_FILE:
+        with open("/usr/local/dag/visibility.json", "w") as f:
+            json.dump(lag_monitor.to_dict(), f)
+        print("Save visibility lag to: /usr/local/dag/visibility.json")
+
+
+def start_workflow_cleaner():
+    global workflow_cleaner
+    if CLEAN_MODE not in ("round", "continuous"):
+        raise Exception(f"不支持的清理方式: {CLEAN_MODE}")
+    workflow_cleaner = WorkflowCleaner(
+        NEW_CORE_ADDRESS,
+        sc_channel_options(),
+        lambda i: workflow_meta(i)[0],
+        CLEAN_CONCURRENCY,
+        CLEAN_RATE,
+        CLEAN_DELAY_SECS if CLEAN_MODE == "continuous" else -1,
+    )
+    workflow_cleaner.start()
+
+
+def clean_round() -> Optional[dict]:
+    # round 方式：删除目前已注入的全部工作流，使下一轮从相同的控制器状态开始
+    if workflow_cleaner is None or CLEAN_MODE != "round":
+        return None
+    r = workflow_cleaner.flush(CLEAN_TIMEOUT_SECS)
+    print(f"cleanup: deleted {r['deleted']} workflows in {r['seconds']:.3f} secs ({r['rate']:.2f}/s)")
+    return r
+
+
+def save_cleanup():
+    if workflow_cleaner is None:
+        return
+    print(f"deleting remaining workflows (up to {CLEAN_TIMEOUT_SECS} secs)...")
+    workflow_cleaner.stop(CLEAN_TIMEOUT_SECS)
+    workflow_cleaner.print_summary()
+    if WRITE_METRICS_TO_FILE:
+        with open("/usr/local/dag/cleanup.json", "w") as f:
+            json.dump(workflow_cleaner.to_dict(), f)
+        print("Save cleanup result to: /usr/local/dag/cleanup.json")
+
+
+def new_keepalive_fleet() -> KeepAliveFleet:
+    return KeepAliveFleet(
+        NEW_CORE_ADDRESS,
+        sc_channel_options(),
+        KEEPALIVE_CHANNELS,
+        KEEPALIVE_CLUSTERS,
+        KEEPALIVE_MAX_CAPACITY,
+        KEEPALIVE_STAGGER_SECS,
+        ARRIVAL_SEED or None,
+    )
+
+
+def start_keepalive_fleet():
+    # 与注入同时运行的模拟调度器
+    global keepalive_fleet
+    keepalive_fleet = new_keepalive_fleet()
+    keepalive_fleet.start(KEEPALIVE_SCHEDULERS, KEEPALIVE_ALLOCATORS)
+    print(f"simulating {KEEPALIVE_SCHEDULERS} schedulers, {KEEPALIVE_ALLOCATORS} resource allocators")
+
+
+def save_keepalive():
+    if keepalive_fleet is None:
+        return
+    result = keepalive_fleet.stop()
+    if result is None:
+        return
+    keepalive_fleet.print_result(result)
+    if WRITE_METRICS_TO_FILE:
+        with open("/usr/local/dag/keepalive.json", "w") as f:
+            json.dump(result, f)
+        print("Save keepalive result to: /usr/local/dag/keepalive.json")
+
+
+async def find_fanin_capacity():
+    """
+    搜索控制器的保活扇入能力：每一级以一定个数的模拟调度器发送 CAPACITY_STEP_SECS 秒保活，
+    p99 KeepAlive 延迟超过 KEEPALIVE_SLO_P99_MS 或有请求失败时视为饱和
+    """
+    fleet = new_keepalive_fleet()
+    await fleet.connect()
+
+    async def __probe(count: int) -> dict:
+        result = await fleet.run(count, CAPACITY_STEP_SECS)
+        fleet.print_result(result)
+        result["ok"] = (
+            result["p99_ms"] is not None
+            and result["p99_ms"] <= KEEPALIVE_SLO_P99_MS
+            and result["errors"] == 0
+        )
+        return result
 
-def send_to_sc(workflows) -> int:
-    a1 = time.time_ns()
-    channel = insecure_channel(NEW_CORE_ADDRESS)
     try:
-        controller_grpc_client = SchedulerControllerStub(channel)
-        reply: InputWorkflowReply = controller_grpc_client.InputWorkflow(
-            InputWorkflowRequest(workflow=workflows)
+        await fleet.register_allocators(KEEPALIVE_ALLOCATORS)
+        capacity, curve = await find_capacity(
+            __probe,
+            max(1, KEEPALIVE_SCHEDULERS),
+            KEEPALIVE_MAX_SCHEDULERS,
+            CAPACITY_GROWTH,
+            CAPACITY_PRECISION,
+            "schedulers",
+            integer=True,
         )
-        print(f"send {len(workflows)} workflows to scheduler controller")
     finally:
-        channel.close()
-    return time.time_ns() - a1
+        await fleet.close()
 
+    def __ms(v: Optional[float]) -> str:
+        # 没有发出保活的一级没有延迟，留空
+        return "" if v is None else f"{v:.3f}"
 
-def send_dags_x_per_y_seconds_to_sc(
-    index_from: int, batch_idx: int, num: int, sleep_secs: int
-) -> int:
-    # 仅向控制器传送工作流
-    data_set = choices(workflows_protobuf, k=num)
-    elp_time = send_to_sc(data_set)
+    print(f"max sustainable schedulers: {capacity}")
+    print("schedulers,rate,offered_rate,p50_ms,p99_ms,errors,loop_lag_p99_ms,ok")
+    for r in sorted(curve, key=lambda r: r["schedulers"]):
+        print(
+            f"{r['schedulers']},{r['rate']:.2f},{r['offered_rate']:.2f},{__ms(r['p50_ms'])},"
+            f"{__ms(r['p99_ms'])},{r['errors']},{__ms(r['loop_lag_p99_ms'])},{r['ok']}"
+        )
+    if WRITE_METRICS_TO_FILE:
+        with open("/usr/local/dag/fanin.json", "w") as f:
+            json.dump(
+                {
+                    "max_schedulers": capacity,
+                    "slo_p99_ms": KEEPALIVE_SLO_P99_MS,
+                    "step_secs": CAPACITY_STEP_SECS,
+                    "allocators": KEEPALIVE_ALLOCATORS,
+                    "register_latency": latency_summary(fleet.register_latency),
+                    "curve": [{k: v for k, v in r.items() if k != "latency"} for r in curve],
+                },
+                f,
+                indent=2,
+            )
+        print("Save fan-in result to: /usr/local/dag/fanin.json")
+
+
+def start_read_workload():
+    global read_workload
+    read_workload = ReadWorkload(
+        NEW_CORE_ADDRESS,
+        sc_channel_options(),
+        lambda i: workflow_meta(i)[0],
+        lambda kind, raw_time: record_latency(kind, 1, raw_time),
+        READ_RATE,
+        parse_read_mix(READ_MIX),
+        ARRIVAL_MODE if ARRIVAL_MODE == "poisson" else "constant",
+        READ_MAX_IN_FLIGHT,
+        ARRIVAL_SEED or None,
+    )
+    read_workload.start()
+
+
+def save_reads():
+    if read_workload is None:
+        return
+    if READ_TAIL_SECS > 0:
+        print(f"sending reads only for {READ_TAIL_SECS} secs...")
+    read_workload.stop(READ_TAIL_SECS)
+    read_workload.print_summary()
+    if WRITE_METRICS_TO_FILE:
+        with open("/usr/local/dag/reads.json", "w") as f:
+            json.dump(read_workload.to_dict(), f)
+
+
+def save_completion():
+    if completion_tracker is None:
+        return
+    print(f"waiting up to {TRACK_DRAIN_SECS} secs for tracked workflows to complete...")
+    completion_tracker.stop(TRACK_DRAIN_SECS)
+    completion_tracker.print_summary()
+    if WRITE_METRICS_TO_FILE:
+        with open("/usr/local/dag/completion.json", "w") as f:
+            json.dump(completion_tracker.to_dict(), f)
+        print("Save completion latency to: /usr/local/dag/completion.json")
+
+
+def get_argo_client() -> ArgoClient:
+    # 首次使用时读取 kubeconfig，建立 Kubernetes API 连接池
+    global argo_client
+    if argo_client is None:
+        path = ARGO_KUBECONFIG or None
+        if ARGO_API_SERVER and not os.path.exists(
+            path or os.environ.get("KUBECONFIG") or os.path.expanduser("~/.kube/config")
+        ):
+            # 本地模拟服务不需要凭据
+            config = KubeConfig(ARGO_API_SERVER)
+        else:
+            config = load_kubeconfig(path)
+            if ARGO_API_SERVER:
+                config.server = ARGO_API_SERVER.rstrip("/")
+        argo_client = ArgoClient(config, ARGO_NAMESPACE, ARGO_API_CONCURRENCY)
+        print(f"submitting workflows to {argo_client.config.server}{argo_client.path}")
+    return argo_client
+
+
+def argo_api_submit(manifest: bytes) -> Tuple[int, int]:
+    """
+    @return (HTTP 状态码，请求耗时 ns)。连接失败时状态码为 0，耗时为到失败为止的时间
+    """
+    a1 = time.monotonic_ns()
+    try:
+        return get_argo_client().submit(manifest)
+    except (http.client.HTTPException, OSError) as e:
+        print(f"argo api request failed: {e}")
+        return 0, time.monotonic_ns() - a1
+
+
+def argo_api_result(status: int):
+    live_metrics.add_sent("argo", 1)
+    if 200 <= status < 300:
+        live_metrics.add_accepted("argo", 1)
+    elif status != 0:
+        print(f"argo api returned {status}")
+
+
+def send_to_argo(manifest: bytes) -> int:
+    # manifest：compile_argo_manifests 生成的提交内容
+    if ARGO_SUBMIT_MODE == "api":
+        live_metrics.begin("argo")
+        try:
+            status, elapsed = argo_api_submit(manifest)
+        finally:
+            live_metrics.end("argo")
+        argo_api_result(status)
+        # 只计量 API 请求本身，与控制器的 RPC 耗时可比
+        return elapsed
+
+    with tempfile.NamedTemporaryFile("wb", suffix=".yaml") as f:
+        f.write(manifest)
+        f.flush()
+        a1 = time.time_ns()
+        live_metrics.begin("argo")
+        try:
+            r = subprocess.run(["/bin/argo", "submit", "-n", ARGO_NAMESPACE, f.name])
+        finally:
+            live_metrics.end("argo")
+        elapsed = time.time_ns() - a1
+    live_metrics.add_sent("argo", 1)
+    if r.returncode == 0:
+        live_metrics.add_accepted("argo", 1)
+    return elapsed
+
+
+def sc_channel_options() -> list:
+    return channel_options(
+        SC_KEEPALIVE_MS,
+        SC_KEEPALIVE_TIMEOUT_MS,
+        SC_MAX_MESSAGE_MB * 1024 * 1024,
+        SC_HTTP2_WINDOW_BYTES,
+    )
+
+
+def report_sc_connect(pool):
+    # 连接和预热耗时单独打印和记录，不计入发送耗时
+    print(
+        f"connected {pool.size} channels to {NEW_CORE_ADDRESS}: "
+        f"connect {pool.connect_time} ns, warm-up {pool.warmup_time} ns"
+    )
+    if WRITE_METRICS_TO_FILE and metrics_sink is not None:
+        for typ, elapsed in (
+            ("core_connect", pool.connect_time),
+            ("core_warmup", pool.warmup_time),
+        ):
+            metrics_sink.writerow(
+                {"type": typ, "index": 0, "batch_idx": -1, "elapsed_time": elapsed}
+            )
+
+
+def get_sc_pool() -> ChannelPool:
+    # 首次使用时建立到控制器的长连接通道池
+    global sc_pool
+    if sc_pool is None:
+        sc_pool = ChannelPool(
+            NEW_CORE_ADDRESS, SC_CHANNEL_POOL_SIZE, sc_channel_options()
+        ).connect(SC_CONNECT_TIMEOUT_SECS, SC_WARMUP_ROUNDS)
+        report_sc_connect(sc_pool)
+    return sc_pool
+
+
+async def connect_sc_async() -> AsyncChannelPool:
+    # 建立 grpc.aio 通道池，必须在事件循环内调用
+    pool = await AsyncChannelPool(
+        NEW_CORE_ADDRESS, SC_CHANNEL_POOL_SIZE, sc_channel_options()
+    ).connect(SC_CONNECT_TIMEOUT_SECS, SC_WARMUP_ROUNDS)
+    report_sc_connect(pool)
+    return pool
+
+
+def send_to_sc(workflows) -> Tuple[int, int]:
+    # 打包格式读入的工作流为 memoryview，bytes 对象则不会复制。返回 (耗时 ns，接受的工作流数)
+    request = InputWorkflowRequest(workflow=[bytes(w) for w in workflows])
+    controller_grpc_client = get_sc_pool().stub()
+    # 只计量 RPC 本身，连接已在通道池中建立
+    a1 = time.time_ns()
+    live_metrics.begin("core")
+    try:
+        reply: InputWorkflowReply = controller_grpc_client.InputWorkflow(request)
+    finally:
+        live_metrics.end("core")
+    elapsed = time.time_ns() - a1
+    live_metrics.add_sent("core", len(workflows))
+    live_metrics.add_accepted("core", reply.accept)
+    print(f"send {len(workflows)} workflows to scheduler controller")
+    return elapsed, reply.accept
+
+
+async def send_to_sc_async(
+    pool: AsyncChannelPool, request: InputWorkflowRequest, timeout: Optional[float] = None
+) -> InputWorkflowReply:
+    live_metrics.begin("core")
+    try:
+        reply: InputWorkflowReply = await pool.stub().InputWorkflow(request, timeout=timeout)
+    finally:
+        live_metrics.end("core")
+        live_metrics.add_sent("core", len(request.workflow))
+    live_metrics.add_accepted("core", reply.accept)
+    return reply
+
+
+def sc_time_factor() -> int:
+    # 控制器时间因子，单位：ns
     factor = (
         uniform(SC_TIME_FACTOR, SC_TIME_FACTOR_END)
         if SC_TIME_FACTOR_END != 0
         else SC_TIME_FACTOR
     )
-    avg_time = math.ceil(float(elp_time) / float(num) + factor * 1000000000)
+    return math.ceil(factor * 1000000000)
+
+
+def record_latency(target: str, batch_size: int, raw_time: int):
+    # 每个请求的实测耗时（不含时间因子）计入延迟直方图
+    if latency_recorder is not None:
+        latency_recorder.record(target, batch_size, raw_time)
+
+
+def save_latency():
+    if latency_recorder is None:
+        return
+    latency_recorder.print_summary()
+    if WRITE_METRICS_TO_FILE:
+        with open("/usr/local/dag/latency.json", "w") as f:
+            json.dump(latency_recorder.to_dict(), f)
+        print("Save latency histograms to: /usr/local/dag/latency.json")
+
+
+def send_dags_x_per_y_seconds_to_sc(
+    index_from: int, batch_idx: int, num: int, sleep_secs: int
+) -> int:
+    # 仅向控制器传送工作流
+    indices, data_set = pick_workflows(num)
+    sent = time.monotonic_ns()
+    elp_time, accept = send_to_sc(data_set)
+    track_injected(indices, sent, accept)
+    record_latency("core", num, elp_time)
+    factor = sc_time_factor()
+    avg_time = math.ceil(float(elp_time) / float(num) + factor)
 
     if WRITE_METRICS_TO_FILE:
-        csv_writer.writerow(
+        metrics_sink.writerow(
             {
                 "type": "core",
                 "index": index_from,
                 "batch_idx": batch_idx,
                 "elapsed_time": avg_time,
+                "raw_time": elp_time,
+                "time_factor": factor,
             }
         )
-        csv_file.flush()
-        os.sync()
         print(f"core,{index_from},{batch_idx},{avg_time}")
 
     print(f"send to <Controller> and wait {sleep_secs} secs...")
@@ -262,28 +864,357 @@ def send_dags_x_per_y_seconds_to_sc(
     return index_from + num
 
 
+def open_loop_rate(rate: str) -> float:
+    # 未指定时与 send-then-sleep 的名义速率相同：每 SLEEP_SECS 秒 BATCH_SIZE 个工作流
+    return float(rate) if rate else BATCH_SIZE / max(SLEEP_SECS, 1)
+
+
+async def send_to_argo_async(manifest: bytes) -> bool:
+    # 返回是否提交成功
+    if ARGO_SUBMIT_MODE == "api":
+        live_metrics.begin("argo")
+        try:
+            status, _ = await asyncio.get_running_loop().run_in_executor(
+                get_argo_client().executor, argo_api_submit, manifest
+            )
+        finally:
+            live_metrics.end("argo")
+        argo_api_result(status)
+        return 200 <= status < 300
+
+    # 每次提交使用独立的临时文件，允许多个提交同时进行
+    with tempfile.NamedTemporaryFile("wb", suffix=".yaml") as f:
+        f.write(manifest)
+        f.flush()
+        live_metrics.begin("argo")
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "/bin/argo", "submit", "-n", ARGO_NAMESPACE, f.name
+            )
+            await proc.wait()
+        finally:
+            live_metrics.end("argo")
+        live_metrics.add_sent("argo", 1)
+        if proc.returncode == 0:
+            live_metrics.add_accepted("argo", 1)
+        return proc.returncode == 0
+
+
+async def send_dags_open_loop():
+    """
+    开环发送：控制器每个请求发送 BATCH_SIZE 个工作流，argo 每次提交一个工作流。
+    未指定负载曲线时按 SC_RATE/ARGO_RATE 固定速率发送，控制器共 TEST_NUM 个请求，
+    argo 共 TEST_NUM * BATCH_SIZE 个；指定 LOAD_PROFILE 时按曲线速率发送到曲线结束。
+    请求按 ARRIVAL_MODE 预先计算的时间线发出，不等待之前的请求完成。
+    elapsed_time 从计划发送时刻开始计量，指标中同时记录计划发送时刻（intended_time）
+    和实际发送时刻（send_time），均为相对开始时刻的 ns。
+    失败的请求同样计入延迟，指标中的 type 为 core_error/argo_error
+    """
+    rng = random.Random(ARRIVAL_SEED) if ARRIVAL_SEED else None
+    profile = parse_profile(LOAD_PROFILE) if LOAD_PROFILE else None
+    runs = []
+    # 目标 -> {错误码: 次数}
+    errors = {}
+
+    def __error(target: str, code: str):
+        errors.setdefault(target, {})
+        errors[target][code] = errors[target].get(code, 0) + 1
+
+    def __offsets(rate: str, unit: int, count: int) -> List[int]:
+        # unit：每个请求包含的工作流数
+        if profile is not None:
+            return profile.offsets(unit, ARRIVAL_MODE, rng)
+        return arrival_offsets(open_loop_rate(rate) / unit, count, ARRIVAL_MODE, rng)
+
+    def __write_metric(typ, index, batch_idx, num, raw_time, factor, intended, sent):
+        record_latency(typ, num, raw_time)
+        if not WRITE_METRICS_TO_FILE:
+            return
+        elapsed = math.ceil(float(raw_time) / float(num) + factor)
+        metrics_sink.writerow(
+            {
+                "type": typ,
+                "index": index,
+                "batch_idx": batch_idx,
+                "elapsed_time": elapsed,
+                "raw_time": raw_time,
+                "time_factor": factor,
+                "intended_time": intended - start,
+                "send_time": sent - start,
+            }
+        )
+        print(f"{typ},{index},{batch_idx},{elapsed},{intended - start},{sent - start}")
+
+    pool = None
+    if TEST_WITH_SC:
+        pool = await connect_sc_async()
+
+        async def __send_sc(batch_idx: int, intended: int):
+            indices, data_set = pick_workflows(BATCH_SIZE)
+            request = InputWorkflowRequest(workflow=[bytes(w) for w in data_set])
+            sent = time.monotonic_ns()
+            typ = "core"
+            try:
+                reply = await send_to_sc_async(pool, request)
+                track_injected(indices, sent, reply.accept)
+            except grpc.aio.AioRpcError as e:
+                # 过载时的 UNAVAILABLE/DEADLINE_EXCEEDED 正是开环发送要测量的，记录后继续
+                typ = "core_error"
+                __error("core", e.code().name)
+            raw_time = time.monotonic_ns() - intended
+            __write_metric(
+                typ,
+                batch_idx * BATCH_SIZE,
+                batch_idx,
+                BATCH_SIZE,
+                raw_time,
+                sc_time_factor(),
+                intended,
+                sent,
+            )
+
+        runs.append((__offsets(SC_RATE, BATCH_SIZE, TEST_NUM), __send_sc))
+
+    if TEST_WITH_ARGO:
+        # 限制同时进行的提交数，等待的时间计入延迟
+        argo_sem = asyncio.Semaphore(
+            ARGO_API_CONCURRENCY if ARGO_SUBMIT_MODE == "api" else ARGO_CLI_CONCURRENCY
+        )
+
+        async def __send_argo(index: int, intended: int):
+            async with argo_sem:
+                sent = time.monotonic_ns()
+                ok = await send_to_argo_async(choices(argo_manifests)[0])
+            if not ok:
+                __error("argo", "submit_failed")
+            raw_time = time.monotonic_ns() - intended
+            __write_metric(
+                "argo" if ok else "argo_error",
+                index,
+                index // BATCH_SIZE,
+                1,
+                raw_time,
+                math.ceil(ARGO_TIME_FACTOR * 1000000000),
+                intended,
+                sent,
+            )
+
+        runs.append((__offsets(ARGO_RATE, 1, TEST_NUM * BATCH_SIZE), __send_argo))
+
+    if profile is not None:
+        print(f"load profile: {profile.duration} secs")
+    print(f"open-loop sending ({ARRIVAL_MODE}): {[len(offsets) for offsets, _ in runs]} requests")
+    start = time.monotonic_ns()
+    for target, rate, enabled in (
+        ("core", SC_RATE, TEST_WITH_SC),
+        ("argo", ARGO_RATE, TEST_WITH_ARGO),
+    ):
+        if not enabled:
+            continue
+        if profile is not None:
+            live_metrics.set_target_rate(
+                target, lambda: profile.rate((time.monotonic_ns() - start) / 1e9)
+            )
+        else:
+            live_metrics.set_target_rate(target, open_loop_rate(rate))
+    try:
+        await asyncio.gather(
+            *(run_open_loop(offsets, send, start) for offsets, send in runs)
+        )
+    finally:
+        if pool is not None:
+            await pool.close()
+        if errors:
+            print(f"open-loop errors: {errors}")
+
+
+async def find_sc_capacity():
+    """
+    搜索控制器可持续的最大吞吐量。每一级以固定速率开环发送 CAPACITY_STEP_SECS 秒，
+    p99 延迟（从计划发送时刻到收到回复）超过 CAPACITY_SLO_P99_MS，
+    或 InputWorkflowReply.accept 之和少于发送的工作流数时视为饱和
+    """
+    pool = await connect_sc_async()
+    # 单个请求的超时，超时的请求视为未被接受
+    timeout = max(10.0, 10 * CAPACITY_SLO_P99_MS / 1000)
+
+    async def __probe(rate: float) -> dict:
+        live_metrics.set_target_rate("core", rate)
+        count = max(1, round(rate * CAPACITY_STEP_SECS / BATCH_SIZE))
+        offsets = arrival_offsets(rate / BATCH_SIZE, count)
+        latency = LogHistogram()
+        result = {"rate": rate, "sent": 0, "accepted": 0, "errors": 0}
+
+        async def __send(i: int, intended: int):
+            indices, data_set = pick_workflows(BATCH_SIZE)
+            request = InputWorkflowRequest(workflow=[bytes(w) for w in data_set])
+            sent = time.monotonic_ns()
+            try:
+                reply = await send_to_sc_async(pool, request, timeout)
+                result["accepted"] += reply.accept
+                track_injected(indices, sent, reply.accept)
+            except grpc.aio.AioRpcError as e:
+                result["errors"] += 1
+                print(f"InputWorkflow failed: {e.code()}")
+            raw_time = time.monotonic_ns() - intended
+            latency.add(raw_time)
+            record_latency("core", BATCH_SIZE, raw_time)
+            result["sent"] += BATCH_SIZE
+
+        a1 = time.monotonic_ns()
+        await run_open_loop(offsets, __send)
+        elapsed = (time.monotonic_ns() - a1) / 1e9
+        result["achieved_rate"] = result["sent"] / elapsed
+        for q in (0.5, 0.9, 0.99):
+            result[f"p{round(q * 100)}_ms"] = latency.quantile(q) / 1e6
+        result["ok"] = (
+            result["p99_ms"] <= CAPACITY_SLO_P99_MS
+            and result["accepted"] >= result["sent"]
+        )
+        # 每一级施压之后清理，下一级从相同的控制器状态开始
+        cleanup = await asyncio.get_running_loop().run_in_executor(None, clean_round)
+        if cleanup is not None:
+            result["cleanup"] = cleanup
+        return result
+
+    try:
+        capacity, curve = await find_capacity(
+            __probe,
+            open_loop_rate(CAPACITY_START_RATE),
+            CAPACITY_MAX_RATE,
+            CAPACITY_GROWTH,
+            CAPACITY_PRECISION,
+        )
+    finally:
+        await pool.close()
+
+    print(f"max sustainable throughput: {capacity:.2f} workflows/s")
+    print("rate,achieved_rate,p50_ms,p90_ms,p99_ms,sent,accepted,errors,ok")
+    for r in sorted(curve, key=lambda r: r["rate"]):
+        print(
+            f"{r['rate']:.2f},{r['achieved_rate']:.2f},{r['p50_ms']:.3f},"
+            f"{r['p90_ms']:.3f},{r['p99_ms']:.3f},{r['sent']},{r['accepted']},"
+            f"{r['errors']},{r['ok']}"
+        )
+    if WRITE_METRICS_TO_FILE:
+        with open("/usr/local/dag/capacity.json", "w") as f:
+            json.dump(
+                {
+                    "max_rate": capacity,
+                    "slo_p99_ms": CAPACITY_SLO_P99_MS,
+                    "step_secs": CAPACITY_STEP_SECS,
+                    "batch_size": BATCH_SIZE,
+                    "curve": curve,
+                },
+                f,
+                indent=2,
+            )
+        print("Save capacity result to: /usr/local/dag/capacity.json")
+
+
+async def send_dags_concurrently_to_sc(
+    batch_num: int, num: int, sleep_secs: int, concurrency: int
+):
+    """
+    使用 grpc.aio 向控制器并发发送，同时保持 concurrency 个 InputWorkflow 请求在途。
+    每个发送者循环领取批次：发送 num 个工作流，等待回复，休眠 sleep_secs。
+    每次调用的耗时按批次单独记录，格式与串行发送相同。
+    失败的调用同样计入延迟，指标中的 type 为 core_error，发送者继续领取下一批次
+    """
+    pool = await connect_sc_async()
+    batches = itertools.count()
+    # 错误码 -> 次数
+    errors = {}
+    # 名义速率：所有发送者均不等待回复时的速率
+    live_metrics.set_target_rate("core", concurrency * open_loop_rate(""))
+
+    async def __sender():
+        while True:
+            batch_idx = next(batches)
+            if batch_idx >= batch_num:
+                return
+            index_from = batch_idx * num
+            indices, data_set = pick_workflows(num)
+            request = InputWorkflowRequest(workflow=[bytes(w) for w in data_set])
+            sent = time.monotonic_ns()
+            a1 = time.time_ns()
+            typ = "core"
+            try:
+                reply = await send_to_sc_async(pool, request)
+                track_injected(indices, sent, reply.accept)
+                print(f"send {num} workflows to scheduler controller")
+            except grpc.aio.AioRpcError as e:
+                typ = "core_error"
+                errors[e.code().name] = errors.get(e.code().name, 0) + 1
+                print(f"send {num} workflows to scheduler controller failed: {e.code()}")
+            elp_time = time.time_ns() - a1
+            record_latency(typ, num, elp_time)
+            factor = sc_time_factor()
+            avg_time = math.ceil(float(elp_time) / float(num) + factor)
+
+            if WRITE_METRICS_TO_FILE:
+                metrics_sink.writerow(
+                    {
+                        "type": typ,
+                        "index": index_from,
+                        "batch_idx": batch_idx,
+                        "elapsed_time": avg_time,
+                        "raw_time": elp_time,
+                        "time_factor": factor,
+                    }
+                )
+                print(f"{typ},{index_from},{batch_idx},{avg_time}")
+            if sleep_secs > 0:
+                await asyncio.sleep(sleep_secs)
+
+    try:
+        await asyncio.gather(*(__sender() for _ in range(max(1, concurrency))))
+    finally:
+        await pool.close()
+        if errors:
+            print(f"concurrent sending errors: {errors}")
+
+
 def send_dags_x_per_y_seconds_to_argo(
     index_from: int, batch_idx: int, num: int, sleep_secs: int
 ) -> int:
     # 仅向Argo传送工作流
-    data_set = choices(workflows_json, k=num)
-    total_time = 0.0
-    for idx, d in enumerate(data_set):
-        total_time += send_to_argo(d)
-        print(f"send workflow {index_from+idx} to argo")
-    avg_time = math.ceil(total_time / float(num) + ARGO_TIME_FACTOR * 1000000000)
+    data_set = choices(argo_manifests, k=num)
+    total_time = 0
+    if ARGO_SUBMIT_MODE == "api":
+        # 本轮的工作流通过连接池并发提交，同时在途的不超过 ARGO_API_CONCURRENCY 个
+        client = get_argo_client()
+        futures = []
+        for d in data_set:
+            futures.append(client.executor.submit(argo_api_submit, d))
+            live_metrics.begin("argo")
+        for f in concurrent.futures.as_completed(futures):
+            live_metrics.end("argo")
+            status, elp_time = f.result()
+            argo_api_result(status)
+            record_latency("argo", 1, elp_time)
+            total_time += elp_time
+        print(f"send workflow {index_from}-{index_from + num - 1} to argo")
+    else:
+        for idx, d in enumerate(data_set):
+            elp_time = send_to_argo(d)
+            record_latency("argo", 1, elp_time)
+            total_time += elp_time
+            print(f"send workflow {index_from+idx} to argo")
+    factor = math.ceil(ARGO_TIME_FACTOR * 1000000000)
+    avg_time = math.ceil(float(total_time) / float(num) + factor)
 
     if WRITE_METRICS_TO_FILE:
-        csv_writer.writerow(
+        metrics_sink.writerow(
             {
                 "type": "argo",
                 "index": index_from,
                 "batch_idx": batch_idx,
                 "elapsed_time": avg_time,
+                "raw_time": total_time,
+                "time_factor": factor,
             }
         )
-        csv_file.flush()
-        os.sync()
         print(f"argo,{index_from},{batch_idx},{avg_time}")
 
     print(f"send to <Argo> and wait {sleep_secs} secs...")
@@ -291,6 +1222,14 @@ def send_dags_x_per_y_seconds_to_argo(
     return index_from + num
 
 
+def send_argo_rounds():
+    # 向 argo 发送 TEST_NUM 轮，每轮 BATCH_SIZE 个后休眠 SLEEP_SECS
+    live_metrics.set_target_rate("argo", open_loop_rate(""))
+    index_from = 0
+    for i in range(TEST_NUM):
+        index_from = send_dags_x_per_y_seconds_to_argo(index_from, i, BATCH_SIZE, SLEEP_SECS)
+
+
 def special_test():
     from make_dag import make_one_dag
     from app import calc_func
@@ -338,33 +1277,147 @@ if __name__ == "__main__":
     if SPECIAL_TEST != "no":
         special_test()
     else:
+        if METRIC_FILE_SOS:
+            # 指标文件边写边上传，每次 fsync 后上传新增的完整分片
+            metrics_uploader = MultipartUploader(
+                METRIC_FILE_SOS_BUCKET,
+                METRIC_FILE_SOS_PREFIX,
+                METRIC_FILE_SOS_PART_MB * 1024 * 1024,
+                METRIC_FILE_SOS_URL,
+                METRIC_FILE_SOS_AK,
+                METRIC_FILE_SOS_SK,
+            )
         if WRITE_METRICS_TO_FILE:
-            print("Save metric file to: /usr/local/dag/metrics.csv")
-            csv_file = open("/usr/local/dag/metrics.csv", "w")
-            csv_writer = csv.DictWriter(
-                csv_file,
-                fieldnames=["type", "index", "batch_idx", "elapsed_time"],
+            metrics_path = f"/usr/local/dag/metrics{METRICS_FORMATS[METRICS_FORMAT]}"
+            print(f"Save metric file to: {metrics_path}")
+            metrics_sink = MetricsSink(
+                metrics_path,
+                fields={
+                    "type": str,
+                    "index": int,
+                    "batch_idx": int,
+                    "elapsed_time": int,
+                    "raw_time": int,
+                    "time_factor": int,
+                    "intended_time": int,
+                    "send_time": int,
+                },
+                flush_secs=METRICS_FLUSH_SECS,
+                rotate_bytes=int(METRICS_ROTATE_MB * 1024 * 1024),
+                rotate_secs=METRICS_ROTATE_SECS,
+                metrics_format=METRICS_FORMAT,
+                listener=metrics_uploader,
             )  # elapsed_time：发送工作流的耗时，单位为 ns 纳秒
-            csv_writer.writeheader()
+            # raw_time：本行请求的实测总耗时（不含时间因子）；time_factor：每个工作流增加的时间因子
+            # intended_time/send_time：开环发送的计划/实际发送时刻，相对开始时刻，单位为 ns
+            # SIGTERM 转为 SystemExit，保证指标文件在退出前完成最后一次写入
+            signal.signal(signal.SIGTERM, lambda signum, frame: exit(128 + signum))
 
-        make_dags()
-        read_dags()
+        latency_recorder = LatencyRecorder(LATENCY_WINDOW_SECS)
+        live_metrics.latency_recorder = latency_recorder
+        if METRICS_PORT > 0:
+            live_metrics.serve(METRICS_PORT)
+            print(f"Serve live metrics on :{METRICS_PORT}/metrics")
+        if INJECT_MODE != "fanin":
+            make_dags()
+            read_dags()
+            if TEST_WITH_ARGO:
+                compile_argo_manifests()
+        if TRACK_COMPLETION and TEST_WITH_SC and INJECT_MODE == "inject":
+            start_completion_tracker()
+        if TRACK_VISIBILITY and TEST_WITH_SC and INJECT_MODE == "inject":
+            start_lag_monitor()
+        if CLEAN_MODE != "off" and TEST_WITH_SC:
+            start_workflow_cleaner()
+        if KEEPALIVE_SCHEDULERS > 0 and INJECT_MODE != "fanin":
+            start_keepalive_fleet()
+        if READ_RATE > 0 and INJECT_MODE != "fanin":
+            start_read_workload()
+        if INJECT_MODE == "capacity":
+            asyncio.run(find_sc_capacity())
+        elif INJECT_MODE == "fanin":
+            asyncio.run(find_fanin_capacity())
+        elif ARRIVAL_MODE != "sleep":
+            asyncio.run(send_dags_open_loop())
+        elif TEST_WITH_SC and SC_CONCURRENCY > 1:
+
+            async def __send_concurrently():
+                # argo 的各轮在线程中与控制器的并发发送同时进行，与串行发送时一样交替注入
+                runs = [
+                    send_dags_concurrently_to_sc(
+                        TEST_NUM, BATCH_SIZE, SLEEP_SECS, SC_CONCURRENCY
+                    )
+                ]
+                if TEST_WITH_ARGO:
+                    runs.append(
+                        asyncio.get_running_loop().run_in_executor(None, send_argo_rounds)
+                    )
+                await asyncio.gather(*runs)
+
+            asyncio.run(__send_concurrently())
+        elif TEST_WITH_SC:
+            get_sc_pool()
 
         sc_index_from = 0
         argo_index_from = 0
 
-        for i in range(TEST_NUM):
-            if TEST_WITH_SC:
+        serial = INJECT_MODE == "inject" and ARRIVAL_MODE == "sleep"
+        # 控制器并发发送时 argo 已与其同时完成
+        argo_serial = TEST_WITH_ARGO and not (TEST_WITH_SC and SC_CONCURRENCY > 1)
+        if serial:
+            # 名义速率：不计发送耗时，每 SLEEP_SECS 秒 BATCH_SIZE 个
+            if TEST_WITH_SC and SC_CONCURRENCY <= 1:
+                live_metrics.set_target_rate("core", open_loop_rate(""))
+            if argo_serial:
+                live_metrics.set_target_rate("argo", open_loop_rate(""))
+        for i in range(TEST_NUM if serial else 0):
+            if TEST_WITH_SC and SC_CONCURRENCY <= 1:
                 sc_index_from = send_dags_x_per_y_seconds_to_sc(
                     sc_index_from, i, BATCH_SIZE, SLEEP_SECS
                 )
-            if TEST_WITH_ARGO:
+            if argo_serial:
                 argo_index_from = send_dags_x_per_y_seconds_to_argo(
                     argo_index_from, i, BATCH_SIZE, SLEEP_SECS
                 )
+            if i + 1 < TEST_NUM:
+                clean_round()
 
-        if METRIC_FILE_SOS:
-            upload_file("/usr/local/dag/metrics.csv")
+        if sc_pool is not None:
+            sc_pool.close()
+        if argo_client is not None:
+            print(f"argo api: {argo_client.connects} connections")
+            argo_client.close()
+        if partially_rejected_batches:
+            print(
+                f"{partially_rejected_batches} partially rejected batches "
+                f"({partially_rejected_workflows} workflows) were not tracked"
+            )
+        save_keepalive()
+        save_reads()
+        save_latency()
+        save_visibility()
+        save_completion()
+        save_cleanup()
+        if metrics_sink is not None:
+            metrics_sink.close()
+
+        if metrics_uploader is not None:
+            metrics_uploader.upload("/usr/local/dag/latency.json")
+            if INJECT_MODE == "capacity":
+                metrics_uploader.upload("/usr/local/dag/capacity.json")
+            if INJECT_MODE == "fanin":
+                metrics_uploader.upload("/usr/local/dag/fanin.json")
+            if keepalive_fleet is not None:
+                metrics_uploader.upload("/usr/local/dag/keepalive.json")
+            if read_workload is not None:
+                metrics_uploader.upload("/usr/local/dag/reads.json")
+            if completion_tracker is not None:
+                metrics_uploader.upload("/usr/local/dag/completion.json")
+            if lag_monitor is not None:
+                metrics_uploader.upload("/usr/local/dag/visibility.json")
+            if workflow_cleaner is not None:
+                metrics_uploader.upload("/usr/local/dag/cleanup.json")
+            metrics_uploader.close()
 
     if ACTION_ON_FINISH == "exit":
         exit(1)
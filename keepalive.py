@@ -0,0 +1,216 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import List, Optional
+
+import grpc
+
+from latency import latency_summary
+from sc_client import AsyncChannelPool
+from sc_pb2 import KeepAliveRequest, RegisterRARequest
+from stats import LogHistogram
+
+
+def _ms(ns: Optional[float]) -> Optional[float]:
+    return None if ns is None else ns / 1e6
+
+
+class VirtualScheduler:
+    """
+    模拟的调度器。压力值按均值回归的随机过程（Ornstein-Uhlenbeck）变化，
+    每个调度器的长期均值不同；承载力随压力升高而降低
+    """
+
+    def __init__(self, index: int, cluster_id: str, max_capacity: int, rng: random.Random):
+        self.sid = f"sim-scheduler-{index}"
+        self.ipv4 = f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}:6061"
+        self.cluster_id = cluster_id
+        self.max_capacity = max_capacity
+        self.serial_number = 0
+        self.mean = rng.uniform(20, 80)
+        self.pressure = self.mean
+        self._rng = rng
+        self._updated_at = time.monotonic()
+
+    def request(self) -> KeepAliveRequest:
+        # 按距上次保活的时间推进压力值：回归速率 0.1/秒，波动 5/√秒
+        now = time.monotonic()
+        dt = now - self._updated_at
+        self._updated_at = now
+        self.pressure += 0.1 * (self.mean - self.pressure) * dt
+        self.pressure += 5 * math.sqrt(dt) * self._rng.gauss(0, 1)
+        self.pressure = min(100.0, max(0.0, self.pressure))
+        self.serial_number += 1
+        return KeepAliveRequest(
+            sid=self.sid,
+            pressure=round(self.pressure),
+            capacity=round(self.max_capacity * (1 - self.pressure / 100)),
+            serial_number=self.serial_number,
+            ipv4=self.ipv4,
+            cluster_id=self.cluster_id,
+        )
+
+
+class KeepAliveFleet:
+    """
+    在一个事件循环中模拟大量调度器和资源分配器
+
+    每个调度器循环发送 KeepAlive，收到回复后按 wait_secs 等待再发送下一次；
+    启动时在 stagger_secs 内随机错开（0 表示同时开始，即保活风暴）。
+    资源分配器通过 RegisterResourceAllocator 注册，各集群的调度器与资源分配器使用相同的集群 id。
+    同时统计事件循环的调度滞后（计划发送时刻到实际发送时刻），滞后过大说明模拟端本身已饱和
+    """
+
+    def __init__(
+        self,
+        address: str,
+        options: list,
+        channels: int = 1,
+        clusters: int = 1,
+        max_capacity: int = 100,
+        stagger_secs: float = 1.0,
+        seed: Optional[str] = None,
+    ):
+        self.address = address
+        self.options = options
+        self.channels = channels
+        self.clusters = max(1, clusters)
+        self.max_capacity = max_capacity
+        self.stagger_secs = stagger_secs
+        self._rng = random.Random(seed)
+        self._pool: Optional[AsyncChannelPool] = None
+        self.schedulers: List[VirtualScheduler] = []
+        self.boot_ids: List[str] = []
+        # 单位：ns
+        self.register_latency = LogHistogram()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self._result: Optional[dict] = None
+
+    def cluster_id(self, i: int) -> str:
+        return f"sim-cluster-{i % self.clusters}"
+
+    async def connect(self):
+        self._pool = await AsyncChannelPool(self.address, self.channels, self.options).connect(
+            warmup_rounds=0
+        )
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def register_allocators(self, count: int):
+        async def __register(i: int):
+            a1 = time.monotonic_ns()
+            request = RegisterRARequest(
+                cluster_id=self.cluster_id(i), ipv4=f"10.255.{(i >> 8) & 255}.{i & 255}:6062"
+            )
+            reply = await self._pool.stub().RegisterResourceAllocator(request, timeout=30)
+            self.register_latency.add(time.monotonic_ns() - a1)
+            self.boot_ids.append(reply.boot_id)
+
+        await asyncio.gather(*(__register(i) for i in range(count)))
+        if count > 0:
+            s = latency_summary(self.register_latency)
+            print(
+                f"registered {count} resource allocators: "
+                f"p50 {s['p50'] / 1e6:.3f}ms, max {s['max'] / 1e6:.3f}ms"
+            )
+
+    async def run(self, count: int, duration: float) -> dict:
+        """
+        以 count 个调度器发送保活 duration 秒（小于等于 0 表示直到 stop）。
+        调度器保持原有的 sid 和保活序号，多次运行时只增加新的调度器
+        @return 保活延迟、发送速率、错误数、wait_secs 均值和事件循环调度滞后
+        """
+        while len(self.schedulers) < count:
+            i = len(self.schedulers)
+            self.schedulers.append(
+                VirtualScheduler(i, self.cluster_id(i), self.max_capacity, self._rng)
+            )
+        latency, lag = LogHistogram(), LogHistogram()
+        result = {"schedulers": count, "sent": 0, "errors": 0, "wait_secs": 0}
+        start = time.monotonic_ns()
+        deadline = start + duration * 1e9 if duration > 0 else None
+
+        def __running(at: int) -> bool:
+            return not self._stop and (deadline is None or at < deadline)
+
+        async def __scheduler(s: VirtualScheduler):
+            due = start + round(self._rng.uniform(0, self.stagger_secs) * 1e9)
+            while deadline is None or due < deadline:
+                delay = due - time.monotonic_ns()
+                if delay > 0:
+                    await asyncio.sleep(delay / 1e9)
+                a1 = time.monotonic_ns()
+                if not __running(a1):
+                    return
+                lag.add(a1 - due)
+                wait_secs = 1
+                try:
+                    reply = await self._pool.stub().KeepAlive(s.request(), timeout=10)
+                    wait_secs = max(1, reply.wait_secs)
+                except grpc.aio.AioRpcError:
+                    # 失败后按最短间隔重试
+                    result["errors"] += 1
+                a2 = time.monotonic_ns()
+                latency.add(a2 - a1)
+                result["sent"] += 1
+                result["wait_secs"] += wait_secs
+                # wait_secs 从收到应答开始计算
+                due = a2 + wait_secs * 1000000000
+
+        await asyncio.gather(*(__scheduler(s) for s in self.schedulers[:count]))
+        elapsed = (time.monotonic_ns() - start) / 1e9
+        result["rate"] = result["sent"] / elapsed if elapsed > 0 else 0.0
+        result["wait_secs"] = result["wait_secs"] / result["sent"] if result["sent"] else 0
+        # 所有调度器都按 wait_secs 保活时控制器应承受的速率
+        result["offered_rate"] = count / result["wait_secs"] if result["wait_secs"] else 0
+        for q in (0.5, 0.9, 0.99):
+            result[f"p{round(q * 100)}_ms"] = _ms(latency.quantile(q))
+        result["loop_lag_p99_ms"] = _ms(lag.quantile(0.99))
+        result["latency"] = {**latency_summary(latency), "histogram": latency.to_dict()}
+        return result
+
+    # ---- 与注入同时运行 ----
+    def start(self, schedulers: int, allocators: int = 0):
+        """
+        在独立线程的事件循环中注册资源分配器并持续发送保活，直到 stop
+        """
+
+        async def __main():
+            await self.connect()
+            try:
+                await self.register_allocators(allocators)
+                self._result = await self.run(schedulers, 0)
+            finally:
+                await self.close()
+
+        self._stop = False
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(__main()), name="keepalive-fleet", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> Optional[dict]:
+        # 各调度器在下一次保活前退出，最多等待一个 wait_secs
+        if self._thread is None:
+            return self._result
+        self._stop = True
+        self._thread.join()
+        self._thread = None
+        return self._result
+
+    def print_result(self, r: dict):
+        def __ms(v: Optional[float]) -> str:
+            return "-" if v is None else f"{v:.3f}ms"
+
+        print(
+            f"{r['schedulers']} schedulers: {r['sent']} keepalives ({r['rate']:.2f}/s, "
+            f"offered {r['offered_rate']:.2f}/s), errors {r['errors']}, "
+            f"p50 {__ms(r['p50_ms'])}, p99 {__ms(r['p99_ms'])}, "
+            f"loop lag p99 {__ms(r['loop_lag_p99_ms'])}"
+        )
@@ -0,0 +1,125 @@
+import json
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from stats import LogHistogram
+
+# 输出的分位数
+LATENCY_QUANTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p99.9", 0.999))
+
+
+def latency_summary(h: LogHistogram) -> dict:
+    """
+    直方图的样本数、分位数和最大值，单位与记录时相同
+    """
+    summary = {"count": h.count}
+    for name, q in LATENCY_QUANTILES:
+        summary[name] = h.quantile(q)
+    summary["max"] = h.max
+    return summary
+
+
+class LatencyRecorder:
+    """
+    按 (目标，每个请求的工作流数，时间窗口) 分组的请求延迟直方图
+
+    每个请求记录一次实测耗时（不含时间因子），单位：ns。
+    时间窗口按墙上时钟对齐，窗口起点为 window_secs 的整数倍（Unix 秒）。
+    快照（to_dict）可以保存为 JSON，多次运行的快照可以合并。
+    不同目标可以在不同线程中记录（同一目标只在一个线程中记录）
+    """
+
+    def __init__(self, window_secs: float = 60, precision: float = 0.01):
+        self.window_secs = window_secs
+        self.precision = precision
+        self.histograms: Dict[Tuple[str, int, float], LogHistogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, target: str, batch_size: int, latency: float, at: Optional[float] = None):
+        at = time.time() if at is None else at
+        window = math.floor(at / self.window_secs) * self.window_secs
+        key = (target, batch_size, window)
+        h = self.histograms.get(key)
+        if h is None:
+            with self._lock:
+                h = self.histograms.get(key)
+                if h is None:
+                    h = self.histograms[key] = LogHistogram(self.precision)
+        h.add(latency)
+
+    def merge(self, other: "LatencyRecorder"):
+        if other.window_secs != self.window_secs:
+            raise Exception("无法合并时间窗口不同的延迟统计")
+        for key, h in other.histograms.items():
+            if key in self.histograms:
+                self.histograms[key].merge(h)
+            else:
+                self.histograms[key] = LogHistogram.from_dict(h.to_dict())
+
+    def totals(self) -> Dict[Tuple[str, int], LogHistogram]:
+        """
+        合并所有时间窗口，按 (目标，每个请求的工作流数) 分组
+        """
+        totals: Dict[Tuple[str, int], LogHistogram] = {}
+        for (target, batch_size, _), h in sorted(self.histograms.items()):
+            if (target, batch_size) not in totals:
+                totals[(target, batch_size)] = LogHistogram(self.precision)
+            totals[(target, batch_size)].merge(h)
+        return totals
+
+    def to_dict(self) -> dict:
+        windows = []
+        for (target, batch_size, window), h in sorted(self.histograms.items()):
+            windows.append(
+                {
+                    "target": target,
+                    "batch_size": batch_size,
+                    "window_start": window,
+                    **latency_summary(h),
+                    "histogram": h.to_dict(),
+                }
+            )
+        totals = [
+            {"target": target, "batch_size": batch_size, **latency_summary(h)}
+            for (target, batch_size), h in self.totals().items()
+        ]
+        return {
+            "unit": "ns",
+            "window_secs": self.window_secs,
+            "precision": self.precision,
+            "totals": totals,
+            "windows": windows,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LatencyRecorder":
+        r = cls(d["window_secs"], d["precision"])
+        for w in d["windows"]:
+            r.histograms[(w["target"], w["batch_size"], w["window_start"])] = (
+                LogHistogram.from_dict(w["histogram"])
+            )
+        return r
+
+    def print_summary(self):
+        names = [name for name, _ in LATENCY_QUANTILES] + ["max"]
+        print("target,batch_size,count," + ",".join(f"{n}_ms" for n in names))
+        for (target, batch_size), h in self.totals().items():
+            s = latency_summary(h)
+            values = ",".join(
+                "" if s[n] is None else f"{s[n] / 1e6:.3f}" for n in names
+            )
+            print(f"{target},{batch_size},{s['count']},{values}")
+
+
+def merge_latency_files(filenames: List[str]) -> LatencyRecorder:
+    merged: Optional[LatencyRecorder] = None
+    for filename in filenames:
+        with open(filename, "r") as f:
+            r = LatencyRecorder.from_dict(json.load(f))
+        if merged is None:
+            merged = r
+        else:
+            merged.merge(r)
+    return merged if merged is not None else LatencyRecorder()
@@ -0,0 +1,303 @@
+import asyncio
+import bisect
+import csv
+import itertools
+import json
+import math
+import random
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+# 开环发送的到达过程：constant 固定间隔；poisson 指数分布间隔（泊松到达）
+ARRIVAL_MODES = ("constant", "poisson")
+
+
+def arrival_offsets(
+    rate: float, count: int, mode: str = "constant", rng: Optional[random.Random] = None
+) -> List[int]:
+    """
+    预先计算开环发送的时间线
+    @param rate 每秒请求数，可以是小数
+    @param count 请求个数
+    @return 第 i 个请求相对开始时刻的计划发送时间，单位：ns
+    """
+    if rate <= 0:
+        raise Exception(f"发送速率必须大于0: {rate}")
+    if mode == "constant":
+        return [round(i * 1e9 / rate) for i in range(count)]
+    if mode == "poisson":
+        rng = rng or random.Random()
+        offsets, t = [], 0.0
+        for _ in range(count):
+            offsets.append(round(t * 1e9))
+            t += rng.expovariate(rate)
+        return offsets
+    raise Exception(f"不支持的到达模式: {mode}")
+
+
+class _Constant:
+    """
+    固定速率的片段（阶梯、流量回放），生成时间线时直接计算发送时刻，不需要积分
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+
+    def __call__(self, t: float) -> float:
+        return self.rate
+
+
+class LoadProfile:
+    """
+    负载曲线：若干首尾相接的片段，每个片段为 (时长，速率函数)。
+    速率函数的参数为片段内的时刻（秒），返回速率（工作流/秒）
+    """
+
+    def __init__(self, segments: List[Tuple[float, Callable[[float], float]]]):
+        self.segments = segments
+        # 各片段的开始时刻，按时刻二分查找片段
+        self._starts = list(itertools.accumulate((d for d, _ in segments), initial=0.0))
+        self.duration = self._starts[-1]
+
+    def rate(self, t: float) -> float:
+        if t < 0 or t >= self.duration:
+            return 0.0
+        i = bisect.bisect_right(self._starts, t) - 1
+        return max(0.0, self.segments[i][1](t - self._starts[i]))
+
+    def offsets(
+        self,
+        unit: float = 1,
+        mode: str = "constant",
+        rng: Optional[random.Random] = None,
+        resolution: float = 0.01,
+    ) -> List[int]:
+        """
+        按负载曲线生成开环发送时间线
+        @param unit 每个请求包含的工作流数
+        @param mode constant：累计工作流数每达到 unit 发送一个请求；poisson：非齐次泊松到达
+        @param resolution 积分步长，单位：秒
+        @return 每个请求相对开始时刻的计划发送时间，单位：ns
+        """
+        if mode not in ARRIVAL_MODES:
+            raise Exception(f"不支持的到达模式: {mode}")
+        rng = rng or random.Random()
+
+        def __next_target(target: float) -> float:
+            return target + (rng.expovariate(1.0) if mode == "poisson" else 1.0)
+
+        # 逐个片段累计请求数，累计值越过目标值时得到发送时刻：固定速率的片段直接计算，
+        # 其他片段对速率（请求/秒）按中点法逐步积分，步内线性插值
+        offsets = []
+        # constant 模式第一个请求在 t=0 发出，与 arrival_offsets 一致
+        target = 0.0 if mode == "constant" else __next_target(0.0)
+        total = 0.0
+        for (duration, fn), begin in zip(self.segments, self._starts):
+            if isinstance(fn, _Constant):
+                rate = max(0.0, fn.rate) / unit
+                while rate > 0 and total + rate * duration >= target:
+                    offsets.append(round((begin + (target - total) / rate) * 1e9))
+                    target = __next_target(target)
+                total += rate * duration
+                continue
+            for k in range(math.ceil(duration / resolution)):
+                t0 = k * resolution
+                dt = min(resolution, duration - t0)
+                step = max(0.0, fn(t0 + dt / 2)) * dt / unit
+                while step > 0 and total + step >= target:
+                    offsets.append(round((begin + t0 + (target - total) / step * dt) * 1e9))
+                    target = __next_target(target)
+                total += step
+        return offsets
+
+
+def _ramp(spec: dict) -> List[Tuple[float, Callable[[float], float]]]:
+    # 线性爬坡：{"type": "ramp", "from": 10, "to": 100, "duration": 60}
+    r0, r1, d = spec["from"], spec["to"], spec["duration"]
+    return [(d, lambda t: r0 + (r1 - r0) * t / d)]
+
+
+def _step(spec: dict) -> List[Tuple[float, Callable[[float], float]]]:
+    # 阶梯：{"type": "step", "steps": [[30, 10], [30, 50], ...]}，每级为 [时长，速率]
+    return [(d, _Constant(r)) for d, r in spec["steps"]]
+
+
+def _spike(spec: dict) -> List[Tuple[float, Callable[[float], float]]]:
+    # 尖峰：{"type": "spike", "base": 10, "peak": 200, "start": 30, "width": 5,
+    #        "duration": 120, "every": 0}，every 大于 0 时每隔 every 秒重复一次尖峰
+    base, peak, start, width = spec["base"], spec["peak"], spec.get("start", 0), spec["width"]
+    every = spec.get("every", 0)
+
+    def __rate(t: float) -> float:
+        if t < start:
+            return base
+        t = (t - start) % every if every > 0 else t - start
+        return peak if t < width else base
+
+    return [(spec["duration"], __rate)]
+
+
+def _diurnal(spec: dict) -> List[Tuple[float, Callable[[float], float]]]:
+    # 正弦（日周期）：{"type": "diurnal", "mean": 50, "amplitude": 40, "period": 86400,
+    #                 "phase": 0, "duration": 86400}，phase 单位为秒
+    mean, amplitude = spec["mean"], spec["amplitude"]
+    period, phase = spec.get("period", 86400), spec.get("phase", 0)
+    return [
+        (
+            spec.get("duration", period),
+            lambda t: mean + amplitude * math.sin(2 * math.pi * (t + phase) / period),
+        )
+    ]
+
+
+def _timestamp(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def _trace(spec: dict) -> List[Tuple[float, Callable[[float], float]]]:
+    # 生产流量回放：{"type": "trace", "file": "trace.csv", "speed": 1}
+    # CSV 每行为 (timestamp, rate)，timestamp 为秒或 ISO 时间，每个速率保持到下一行，
+    # 最后一行保持与上一间隔相同的时长。speed 大于 1 时按倍速回放
+    rows = []
+    with open(spec["file"], "r") as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            try:
+                rows.append((_timestamp(row[0].strip()), float(row[1])))
+            except ValueError:
+                continue  # 表头
+    if not rows:
+        raise Exception(f"负载曲线文件为空: {spec['file']}")
+    speed = spec.get("speed", 1)
+    rows.sort()
+    segments = []
+    for i, (ts, r) in enumerate(rows):
+        if i + 1 < len(rows):
+            d = rows[i + 1][0] - ts
+        else:
+            d = ts - rows[i - 1][0] if i > 0 else 1
+        if d > 0:
+            segments.append((d / speed, _Constant(r)))
+    return segments
+
+
+_PROFILE_TYPES = {
+    "ramp": _ramp,
+    "step": _step,
+    "spike": _spike,
+    "diurnal": _diurnal,
+    "trace": _trace,
+}
+
+
+def parse_profile(profile: str) -> LoadProfile:
+    """
+    解析负载曲线描述。可以是 JSON（单个片段或片段列表，按顺序拼接）、JSON 文件路径，
+    或 CSV 文件路径（等价于 {"type": "trace", "file": ...}）
+    """
+    profile = profile.strip()
+    if profile.endswith(".csv"):
+        specs = [{"type": "trace", "file": profile}]
+    else:
+        if not profile.startswith(("{", "[")):
+            with open(profile, "r") as f:
+                profile = f.read()
+        specs = json.loads(profile)
+        if isinstance(specs, dict):
+            specs = [specs]
+    segments = []
+    for spec in specs:
+        if spec.get("type") not in _PROFILE_TYPES:
+            raise Exception(f"不支持的负载曲线类型: {spec.get('type')}")
+        segments.extend(_PROFILE_TYPES[spec["type"]](spec))
+    return LoadProfile(segments)
+
+
+async def run_open_loop(
+    offsets: List[int],
+    send: Callable[[int, int], Awaitable[None]],
+    start: Optional[int] = None,
+):
+    """
+    开环发送：按时间线在计划时刻发起 send(i, intended)，不等待之前的请求完成，
+    发送速率不受被测服务延迟的影响。intended 为计划发送时刻（time.monotonic_ns），
+    send 内应以此为起点计量延迟，使服务端排队造成的发送滞后计入延迟（避免协调遗漏）
+    @param start 时间线起点（time.monotonic_ns），默认为调用时刻
+    """
+    start = time.monotonic_ns() if start is None else start
+    # 只保留在途的请求，完成后即从集合中移除，长时间运行时内存不随请求总数增长
+    tasks = set()
+    failed: List[BaseException] = []
+
+    def __done(task: asyncio.Task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            failed.append(task.exception())
+
+    for i, offset in enumerate(offsets):
+        delay = start + offset - time.monotonic_ns()
+        # 落后于计划时也让出一次事件循环，使在途请求的回复得到处理
+        await asyncio.sleep(max(0, delay) / 1e9)
+        task = asyncio.create_task(send(i, start + offset))
+        tasks.add(task)
+        task.add_done_callback(__done)
+    # 等待全部请求结束后再抛出其中的异常，一个请求失败不影响其他请求的计量
+    while tasks:
+        await asyncio.wait(set(tasks))
+    if failed:
+        print(f"{len(failed)} open-loop requests raised exceptions")
+        raise failed[0]
+
+
+async def find_capacity(
+    probe: Callable[[float], Awaitable[dict]],
+    start_rate: float,
+    max_rate: float = 0,
+    growth: float = 2.0,
+    precision: float = 0.05,
+    unit: str = "workflows/s",
+    integer: bool = False,
+) -> Tuple[float, List[dict]]:
+    """
+    饱和点搜索：从 start_rate 开始按 growth 倍逐级提高速率，直到某一级不满足要求
+    （或超过 max_rate），再在最后满足要求和首个不满足要求的速率之间二分，
+    直到区间相对宽度不超过 precision
+    @param probe 以给定速率（工作流/秒）施压一段时间，返回该级的测量结果，
+                 其中 ok 表示是否满足要求。也可以用于其他随负载单调变化的指标，
+                 如模拟的调度器个数，unit 为打印时的单位
+    @param integer 只探测整数值（如调度器个数），二分到相邻整数为止
+    @return (可持续的最大速率，每一级的测量结果)。起始速率即不满足要求时最大速率为 0
+    """
+    curve = []
+
+    async def __probe(rate: float) -> bool:
+        result = await probe(rate)
+        curve.append(result)
+        value = f"{rate}" if integer else f"{rate:.2f}"
+        print(f"capacity probe {value} {unit}: {'ok' if result['ok'] else 'saturated'}")
+        return result["ok"]
+
+    def __grow(v: float) -> float:
+        # 整数时至少增加 1，保证搜索前进
+        v = max(math.ceil(v * growth), v + 1) if integer else v * growth
+        return v if max_rate <= 0 else min(v, max_rate)
+
+    lo, hi = (0, math.ceil(start_rate)) if integer else (0.0, start_rate)
+    while await __probe(hi):
+        lo = hi
+        if max_rate > 0 and hi >= max_rate:
+            return lo, curve
+        hi = __grow(hi)
+
+    while lo > 0 and (hi - lo) / lo > precision and (not integer or hi - lo > 1):
+        mid = (lo + hi) // 2 if integer else (lo + hi) / 2
+        if await __probe(mid):
+            lo = mid
+        else:
+            hi = mid
+    return lo, curve
@@ -1,13 +1,12 @@
 import json
-from collections import defaultdict
-from random import choice, choices, randint, shuffle, random
-from typing import List, Optional, Tuple
+from random import choice, choices, getrandbits, randint, shuffle, random
+from typing import Dict, List, Optional, Set, Tuple
 import uuid
 
 import cramjam
-from graphviz import Digraph
 
 import wf_pb2
+from dag_model import CompactDag
 
 
 def guess_filename(fname: str, data_type: str, compress_type: str) -> str:
@@ -24,42 +23,125 @@ def guess_filename(fname: str, data_type: str, compress_type: str) -> str:
     return r
 
 
-def make_one_dag(
-    filename: str,
+def _random_uuid() -> str:
+    # 使用 random 模块生成 uuid4，使 custom_id 也受随机种子控制
+    return str(uuid.UUID(int=getrandbits(128), version=4))
+
+
+def compress_data(d: bytes, compress: str) -> bytes:
+    if compress == "snappy":
+        d = cramjam.snappy.compress(d)
+    elif compress == "gzip":
+        d = cramjam.gzip.compress(d)
+    return bytes(d)
+
+
+def materialize(
+    dag: CompactDag,
+    duration_ranges: Tuple[int, int],
+    custom_wf_rate: float,
+    task_mem: int,
+):
+    """
+    为DAG一次性抽取工作流属性和每个节点的属性
+    """
+    dag.custom_id = _random_uuid()
+
+    # 按比例生成定制和非定制工作流
+    r = random()
+    if r < custom_wf_rate:
+        dag.customization = True
+        seq = {"A": ["C", "D"], "B": ["C", "D"], "C": ["A", "B"], "D": ["A", "B"]}
+        chd = choice(list(seq.keys()))
+        dag.cost_grade = chd
+        dag.time_grade = choice(seq[chd])
+    else:
+        dag.customization = False
+        dag.time_grade = ""
+        dag.cost_grade = ""
+
+    for _ in range(dag.node_count):
+        dag.durations.append(randint(duration_ranges[0], duration_ranges[1]))
+        dag.cpus.append(1)
+        dag.mems.append(randint(task_mem * 1024 * 1024, 2 * task_mem * 1024 * 1024))
+
+
+def dag_to_json(dag: CompactDag, image: str, task_cpu: int, task_mem: int) -> str:
+    json_struct = []
+    env = {
+        "CPU_CONSUME": str(task_cpu),
+        "MEMORY_CONSUME": str(task_mem),
+    }
+    for this_layer in dag.layers:
+        for node in this_layer:
+            json_struct.append(
+                {
+                    "name": f"t{node}",
+                    "dependencies": [f"t{d}" for d in dag.predecessors(node)],
+                    "template": image,
+                    "duration": dag.durations[node],
+                    "phase": "None",
+                    "node_info": "None",
+                    "cpu": dag.cpus[node],
+                    "mem": dag.mems[node],
+                    "env": env,
+                }
+            )
+    return json.dumps(
+        {
+            "workflow_name": "NoName",
+            "style": "Normal",
+            "custom_id": dag.custom_id,
+            "topology": json_struct,
+        }
+    )
+
+
+def dag_to_workflow(
+    dag: CompactDag, image: str, task_cpu: int, task_mem: int
+) -> wf_pb2.Workflow:
+    wf = wf_pb2.Workflow()
+    wf.workflow_name = "NoName"
+    wf.custom_id = dag.custom_id
+    wf.style = "Normal"
+    wf.customization = dag.customization
+    wf.time_grade = dag.time_grade
+    wf.cost_grade = dag.cost_grade
+
+    for this_layer in dag.layers:
+        for node in this_layer:
+            wf_node = wf.topology.add()
+            wf_node.name = f"t{node}"
+            wf_node.dependencies.extend([f"t{d}" for d in dag.predecessors(node)])
+            wf_node.duration = dag.durations[node]
+            wf_node.template = image
+            wf_node.phase = "None"
+            wf_node.node_info = "None"
+            wf_node.cpu = dag.cpus[node]
+            wf_node.mem = dag.mems[node]
+            wf_node.env["CPU_CONSUME"] = str(task_cpu)
+            wf_node.env["MEMORY_CONSUME"] = str(task_mem)
+    return wf
+
+
+def build_dag(
     dag_name: str,
     maxlayer: int,
     skiplayer: int,
     singlein: bool,
     singleout: bool,
     density: bool,
-    image: str,
-    outtypes: List[str],
-    compress: str,
-    duration_ranges: Tuple[int, int],
-    enable_graph: bool,
-    custom_wf_rate: float,
     func,
-    special: str = "no",
-    second_file: Optional[str] = None,
-    task_cpu: int = 100,
-    task_mem: int = 64,
-):
+) -> Tuple[CompactDag, List[int]]:
     """
-    @return 层数，每层节点数
+    生成DAG结构（不含节点属性）
+    @return DAG，每层节点数（不含单出口补充的节点）
     """
-    dot = Digraph(comment=f"DAG {dag_name}")
-    dot.attr(rankdir="TB")
-    dot.attr("node", shape="circle")
+    # 邻接关系保存在紧凑数组中，用于消除不连通子图, 建立密度图
+    # 出度=0 / 入度=0 通过 has_successor / has_predecessor 判断
+    dag = CompactDag(dag_name)
 
     node_num_per_layer = []  # 每层节点数
-    # 邻接矩阵，用于消除不连通子图
-    # 不在邻接矩阵里的点，出度=0
-    connection_map = defaultdict(list)
-    # 逆邻接矩阵，key为节点，value为节点对应的前导节点，用于消除不连通子图, 建立密度图
-    # 不在逆邻接矩阵里的点，入度=0
-    reversed_connection_map = defaultdict(list)
-
-    total_edge_count = 0
 
     # 计算层数
     # 至少3层
@@ -67,41 +149,26 @@ def make_one_dag(
         print(f"警告：maxlayer参数期望设置为{maxlayer}，但允许的最小值为3，已自动调整为3")
     layer_count = randint(3, max(3, maxlayer))
 
-    def __make_edge(src, dst):
-        nonlocal total_edge_count
-
-        dot.edge(f"t{src}", f"t{dst}")
-        connection_map[src].append(dst)
-        reversed_connection_map[dst].append(src)
-        total_edge_count = total_edge_count + 1
+    __make_edge = dag.add_edge
 
     # 生成一个序列
     # [[1,2,3],[4,5],[6,7,8],[9]]
-    layers: List[List[int]] = []
+    layers = dag.layers
     if singlein:
-        layers.append([0])
-        next_node_index = 1
+        dag.new_layer(1)
         start_layer_index = 1
         node_num_per_layer.append(1)
     else:
-        next_node_index = 0
         start_layer_index = 0
     for lyr in range(start_layer_index, layer_count):
         nc = randint(1, func(lyr))
-        this_layer = list(range(next_node_index, next_node_index + nc))
-        next_node_index += nc
+        this_layer = dag.new_layer(nc)
 
         node_num_per_layer.append(nc)
 
         # 随机重排
         shuffle(this_layer)
 
-        # 写入dot文件
-        for n in this_layer:
-            dot.node(f"t{n}")
-
-        layers.append(this_layer)
-
     # 生成边
     # 前一层的每个node都向下层随机连接
     for idx, this_layer in enumerate(layers[:-1]):
@@ -127,7 +194,7 @@ def make_one_dag(
 
     # 处理最后一层，防止出现孤点
     for node in layers[-1]:
-        if node not in reversed_connection_map:
+        if not dag.has_predecessor(node):
             src_node = choice(layers[-2])
             # 建立边
             __make_edge(src_node, node)
@@ -136,7 +203,7 @@ def make_one_dag(
     if density:
         for idx, this_layer in enumerate(layers[1:-1]):
             for node in this_layer:
-                if node not in reversed_connection_map:
+                if not dag.has_predecessor(node):
                     # idx 在 layers 少一层
                     src_node = choice(layers[idx])
                     # 建立边
@@ -144,53 +211,43 @@ def make_one_dag(
     else:
         # 非密度图可能会存在不连通子图，需要纠正
         # 所有终结点必须从起点（第一层所有点）可达，否则终结点就属于不连通子图
-        orphan_point = []  # 孤点
-        terminal_node = []  # 终点
+        # 以下均使用迭代的正向/反向可达性遍历，整体复杂度 O(V+E)，不受递归深度限制
+        def __reach(starts, adjacency) -> Set[int]:
+            seen = set(starts)
+            stack = list(seen)
+            while stack:
+                for nx in adjacency(stack.pop()):
+                    if nx not in seen:
+                        seen.add(nx)
+                        stack.append(nx)
+            return seen
 
         # 首先视所有出度=0的点为孤点
-        for this_layer in layers:
-            for node in this_layer:
-                if node not in connection_map.keys():
-                    orphan_point.append(node)
-
-        # 区分孤点和终点
-        def __check_path(nodes):
-            for n in nodes:
-                if n in orphan_point:
-                    orphan_point.remove(n)
-                    terminal_node.append(n)
-                else:
-                    __check_path(connection_map[n])
-
-        __check_path(layers[0])
-
-        # 去除伪孤点，伪孤点重新视为终点
-        def __get_top_nodes(node):
-            if node not in reversed_connection_map:
-                return [node]
-            else:
-                tops = []
-                for nx in reversed_connection_map[node]:
-                    rts = __get_top_nodes(nx)
-                    tops.extend(rts)
-                return tops
-
-        def __has_path_to_terminal_node(n):
-            if n in terminal_node:
-                return True
-            else:
-                return any(__has_path_to_terminal_node(ny) for ny in connection_map[n])
-
-        for op in orphan_point:
-            top_nodes = __get_top_nodes(op)
-            if any(__has_path_to_terminal_node(tn) for tn in top_nodes):
-                orphan_point.remove(op)
-                terminal_node.append(op)
+        sinks = {
+            node
+            for this_layer in layers
+            for node in this_layer
+            if not dag.has_successor(node)
+        }
+
+        # 区分孤点和终点：从起点可达的出度=0的点为终点
+        terminal_node = sinks & __reach(layers[0], dag.successors)
+
+        # 去除伪孤点，伪孤点重新视为终点：
+        # 若孤点的某个顶点（入度=0）有路径通往终点，则该孤点为伪孤点
+        top_nodes = [
+            n
+            for n in __reach(terminal_node, dag.predecessors)
+            if not dag.has_predecessor(n)
+        ]
+        orphan_point = sinks - terminal_node - __reach(top_nodes, dag.successors)
 
         # 通过消除所有孤点，消除不连通子图
-        orphan_node = []
-        for op in orphan_point:
-            orphan_node.extend(__get_top_nodes(op))
+        orphan_node = {
+            n
+            for n in __reach(orphan_point, dag.predecessors)
+            if not dag.has_predecessor(n)
+        }
         for idx, this_layer in enumerate(layers[1:]):  # 孤点不可能在顶层
             for node in this_layer:
                 if node in orphan_node:
@@ -200,157 +257,169 @@ def make_one_dag(
 
     # 单出口
     if singleout and len(layers[-1]) > 1:
-        last_node_id = sum(node_num_per_layer)
-        dot.node(f"t{last_node_id}")
-        layers.append([last_node_id])
+        (last_node_id,) = dag.new_layer(1)
         for node in layers[-2]:
             __make_edge(node, last_node_id)
 
-    if enable_graph:
-        with open(f"{filename}.dot", "w") as f:
-            f.write(dot.source)
-
-    # 本工作流是否为定制工作流
-    customization = False
-
-    data_file_size = 0
-
-    # 生成输出
-    if "json" in outtypes:
-        # 生成json文件
-        total_duration = 0
-        json_struct = []
-        for this_layer in layers:
-            layer_max_duration = 0
-            for node in this_layer:
-                dependencies = []
-                if node in reversed_connection_map:
-                    dependencies = reversed_connection_map[node]
-                duration = randint(duration_ranges[0], duration_ranges[1])
-                layer_max_duration = max(duration, layer_max_duration)
-                json_struct.append(
-                    {
-                        "name": f"t{node}",
-                        "dependencies": [f"t{d}" for d in dependencies],
-                        "template": image,
-                        "duration": duration,
-                        "phase": "None",
-                        "node_info": "None",
-                        "cpu": randint(1, 4),
-                        "mem": randint(512 * 1024 * 1024, 1024 * 1024 * 1024),
-                        "env": {
-                            "CPU_CONSUME": str(task_cpu),
-                            "MEMORY_CONSUME": str(task_mem),
-                        },
-                    }
-                )
-            total_duration += layer_max_duration
-        with open(guess_filename(filename, "json", compress), "w") as f:
-            j = json.dumps(
-                {
-                    "workflow_name": "NoName",
-                    "style": "Normal",
-                    "custom_id": str(uuid.uuid4()),
-                    "topology": json_struct,
-                }
-            )
-            data_file_size = len(j)
-            f.write(j)
-
-    if "protobuf" in outtypes:
-        wf = wf_pb2.Workflow()
-        wf.workflow_name = "NoName"
-        wf.custom_id = str(uuid.uuid4())
-        wf.style = "Normal"
-
-        # 如果是特殊模式的工作流，第一个一定是非定制
-        if special != "no":
-            print("[特殊类型] 设定 custom_wf_rate 为0")
-            custom_wf_rate = 0
-
-        # 按比例生成定制和非定制工作流
-        r = random()
-        if r < custom_wf_rate:
-            wf.customization = True
-            seq = {"A": ["C", "D"], "B": ["C", "D"], "C": ["A", "B"], "D": ["A", "B"]}
-            chd = choice(list(seq.keys()))
-            wf.cost_grade = chd
-            wf.time_grade = choice(seq[chd])
-            customization = True
-        else:
-            wf.customization = special != "no"
-            wf.time_grade = ""
-            wf.cost_grade = ""
+    return dag, node_num_per_layer
 
-        for this_layer in layers:
-            for node in this_layer:
-                wf_node = wf.topology.add()
-                wf_node.name = f"t{node}"
-                if node in reversed_connection_map:
-                    dependencies = reversed_connection_map[node]
-                    wf_node.dependencies.extend([f"t{d}" for d in dependencies])
-                wf_node.duration = randint(duration_ranges[0], duration_ranges[1])
-                wf_node.template = image
-                wf_node.phase = "None"
-                wf_node.node_info = "None"
-                wf_node.cpu = 1
-                wf_node.mem = randint(task_mem * 1024 * 1024, 2 * task_mem * 1024 * 1024)
-                wf_node.env["CPU_CONSUME"] = str(task_cpu)
-                wf_node.env["MEMORY_CONSUME"] = str(task_mem)
-        with open(guess_filename(filename, "protobuf", compress), "wb") as fpb:
-            d = wf.SerializeToString()
-            if compress == "snappy":
-                d = cramjam.snappy.compress(d)
-            elif compress == "gzip":
-                d = cramjam.gzip.compress(d)
-            data_file_size = len(d)
-            fpb.write(d)
-
-        # 如果是特殊模式的工作流，多生成一个定制工作流
-        if special != "no":
-            if special == "time":
-                wf.customization = True
-                wf.cost_grade = "C"
-                wf.time_grade = "A"
-                customization = True
-            elif special == "cost":
-                wf.customization = True
-                wf.cost_grade = "A"
-                wf.time_grade = "C"
-            with open(guess_filename(second_file, "protobuf", compress), "wb") as fpb:
-                d = wf.SerializeToString()
-                if compress == "snappy":
-                    d = cramjam.snappy.compress(d)
-                elif compress == "gzip":
-                    d = cramjam.gzip.compress(d)
-                fpb.write(d)
-                print(f"[特殊类型] 写入 {compress} 压缩类型的 {special} 定制工作流")
 
+def edge_density(dag: CompactDag, node_num_per_layer: List[int]) -> float:
     # 计算理论上最大边数
     pre_layer_node_count = 0
     max_edge_count = 0
     for nn in node_num_per_layer:
         max_edge_count += pre_layer_node_count * nn
         pre_layer_node_count = nn
+    return dag.edge_count / max_edge_count
+
+
+def encode_dag(
+    dag: CompactDag,
+    image: str,
+    outtypes: List[str],
+    compress: str,
+    task_cpu: int,
+    task_mem: int,
+) -> Dict[str, bytes]:
+    """
+    将已生成属性的DAG编码为各输出类型的数据
+    @return 输出类型 -> 数据
+    """
+    payloads = {}
+    if "json" in outtypes:
+        payloads["json"] = dag_to_json(dag, image, task_cpu, task_mem).encode()
+    if "protobuf" in outtypes:
+        payloads["protobuf"] = compress_data(
+            dag_to_workflow(dag, image, task_cpu, task_mem).SerializeToString(), compress
+        )
+    return payloads
+
 
-    # 计算所有层所包含的节点总数
-    total_node_count = sum(node_num_per_layer)
+def data_file_size_of(payloads: Dict[str, bytes]) -> int:
+    # 同时输出多种类型时，以 protobuf 数据长度为准
+    for data_type in ("protobuf", "json"):
+        if data_type in payloads:
+            return len(payloads[data_type])
+    return 0
+
+
+def write_dag(
+    filename: str,
+    dag: CompactDag,
+    node_num_per_layer: List[int],
+    image: str,
+    outtypes: List[str],
+    compress: str,
+    enable_graph: bool,
+    task_cpu: int,
+    task_mem: int,
+) -> int:
+    """
+    输出已生成属性的DAG：dot（可选）、各类型数据文件及配置文件
+    @return 数据文件长度
+    """
+    # 仅在需要输出时才生成 dot
+    if enable_graph:
+        with open(f"{filename}.dot", "w") as f:
+            f.write(dag.to_dot())
+
+    # 生成输出
+    payloads = encode_dag(dag, image, outtypes, compress, task_cpu, task_mem)
+    for data_type, d in payloads.items():
+        with open(guess_filename(filename, data_type, compress), "wb") as f:
+            f.write(d)
+    data_file_size = data_file_size_of(payloads)
 
     # 输出此DAG的配置信息
     with open(guess_filename(filename, "config", ""), "w") as f:
         j = json.dumps(
             {
-                "layer_count": layer_count,
-                "node_count": total_node_count,
+                "layer_count": len(node_num_per_layer),
+                # 所有层所包含的节点总数
+                "node_count": sum(node_num_per_layer),
                 "data_file_size": data_file_size,
+                "custom_id": dag.custom_id,
+                # 关键路径长度，单位：秒
+                "critical_path": dag.critical_path(),
             }
         )
         f.write(j)
 
+    return data_file_size
+
+
+def make_one_dag(
+    filename: str,
+    dag_name: str,
+    maxlayer: int,
+    skiplayer: int,
+    singlein: bool,
+    singleout: bool,
+    density: bool,
+    image: str,
+    outtypes: List[str],
+    compress: str,
+    duration_ranges: Tuple[int, int],
+    enable_graph: bool,
+    custom_wf_rate: float,
+    func,
+    special: str = "no",
+    second_file: Optional[str] = None,
+    task_cpu: int = 100,
+    task_mem: int = 64,
+):
+    """
+    @return 层数，每层节点数，边密度，数据文件长度，是否为定制工作流
+    """
+    dag, node_num_per_layer = build_dag(
+        dag_name, maxlayer, skiplayer, singlein, singleout, density, func
+    )
+
+    # 生成节点及工作流属性，所有输出类型共享同一份 DAG 实例
+    # 如果是特殊模式的工作流，第一个一定是非定制
+    if special != "no":
+        print("[特殊类型] 设定 custom_wf_rate 为0")
+        custom_wf_rate = 0
+    materialize(dag, duration_ranges, custom_wf_rate, task_mem)
+
+    # 本工作流是否为定制工作流
+    customization = dag.customization
+    if special != "no":
+        dag.customization = True
+
+    data_file_size = write_dag(
+        filename,
+        dag,
+        node_num_per_layer,
+        image,
+        outtypes,
+        compress,
+        enable_graph,
+        task_cpu,
+        task_mem,
+    )
+
+    # 如果是特殊模式的工作流，多生成一个定制工作流
+    if special != "no" and "protobuf" in outtypes:
+        wf = dag_to_workflow(dag, image, task_cpu, task_mem)
+        if special == "time":
+            wf.customization = True
+            wf.cost_grade = "C"
+            wf.time_grade = "A"
+            customization = True
+        elif special == "cost":
+            wf.customization = True
+            wf.cost_grade = "A"
+            wf.time_grade = "C"
+        with open(guess_filename(second_file, "protobuf", compress), "wb") as fpb:
+            fpb.write(compress_data(wf.SerializeToString(), compress))
+            print(f"[特殊类型] 写入 {compress} 压缩类型的 {special} 定制工作流")
+
     return (
-        layer_count,
+        len(node_num_per_layer),
         node_num_per_layer,
-        total_edge_count / max_edge_count,  # 边密度
+        edge_density(dag, node_num_per_layer),  # 边密度
         data_file_size,
         customization,
     )
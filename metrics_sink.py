@@ -0,0 +1,207 @@
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+# 队列中的结束标记
+_CLOSE = object()
+
+# 指标文件格式及扩展名。arrow 为 Arrow IPC 流格式，每批写入一个 record batch；
+# parquet 每批写入一个 row group。列式格式需要安装 pyarrow
+METRICS_FORMATS = {"csv": ".csv", "arrow": ".arrow", "parquet": ".parquet"}
+
+
+class _CsvSegment:
+    def __init__(self, path: str, fields: Dict[str, type]):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=list(fields))
+        self._writer.writeheader()
+
+    def write(self, rows: List[dict]):
+        self._writer.writerows(rows)
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def size(self) -> int:
+        return self._file.tell()
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+
+class _ArrowSegment:
+    def __init__(self, path: str, fields: Dict[str, type], parquet: bool):
+        import pyarrow as pa
+
+        self._pa = pa
+        types = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+        self._schema = pa.schema([(name, types[t]) for name, t in fields.items()])
+        self._file = open(path, "wb")
+        if parquet:
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(self._file, self._schema)
+        else:
+            self._writer = pa.ipc.new_stream(self._file, self._schema)
+
+    def write(self, rows: List[dict]):
+        # 一批行写为一个 record batch / row group，缺失的列为 null
+        self._writer.write_table(
+            self._pa.Table.from_pylist(
+                [{k: (None if v == "" else v) for k, v in r.items()} for r in rows],
+                schema=self._schema,
+            )
+        )
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def size(self) -> int:
+        return self._file.tell()
+
+    def close(self):
+        self._writer.close()
+        self.sync()
+        self._file.close()
+
+
+def _open_segment(path: str, fields: Dict[str, type], metrics_format: str):
+    if metrics_format == "csv":
+        return _CsvSegment(path, fields)
+    if metrics_format in ("arrow", "parquet"):
+        return _ArrowSegment(path, fields, metrics_format == "parquet")
+    raise Exception(f"不支持的指标文件格式: {metrics_format}")
+
+
+class MetricsSink:
+    """
+    后台线程写入的指标文件
+
+    writerow 只把行放入内存队列，不阻塞发送路径；后台线程批量写入，
+    每隔 flush_secs 秒只对本文件执行 fsync（不再调用全局 os.sync）。
+    rotate_bytes/rotate_secs 大于 0 时按大小/时间分段：各段依次命名为
+    <name>.1<ext>、<name>.2<ext> ……，每段都是完整可读的文件；不分段时只写 path。
+    listener 可选，在每次 fsync 后收到 segment_synced(path)，在一段写完后收到
+    segment_closed(path)，可用于边写边上传。
+    进程退出时（包括 SIGTERM 触发的 SystemExit）通过 atexit 保证最后一次写入和 fsync
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fields: Dict[str, type],
+        flush_secs: float = 1.0,
+        rotate_bytes: int = 0,
+        rotate_secs: float = 0,
+        batch_size: int = 1000,
+        metrics_format: str = "csv",
+        listener=None,
+    ):
+        self.path = path
+        self.fields = fields
+        self.flush_secs = flush_secs
+        self.rotate_bytes = rotate_bytes
+        self.rotate_secs = rotate_secs
+        self.batch_size = batch_size
+        self.metrics_format = metrics_format
+        self.listener = listener
+        # 已写完的分段文件
+        self.rotated: List[str] = []
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="metrics-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def _rotating(self) -> bool:
+        return self.rotate_bytes > 0 or self.rotate_secs > 0
+
+    def _open(self):
+        if self._rotating:
+            name, ext = os.path.splitext(self.path)
+            self.current = f"{name}.{len(self.rotated) + 1}{ext}"
+        else:
+            self.current = self.path
+        self._segment = _open_segment(self.current, self.fields, self.metrics_format)
+        self._opened_at = time.monotonic()
+
+    def _close_segment(self):
+        self._segment.close()
+        self.rotated.append(self.current)
+        if self.listener is not None:
+            self.listener.segment_closed(self.current)
+
+    def _sync(self):
+        self._segment.sync()
+        if self.listener is not None:
+            self.listener.segment_synced(self.current)
+
+    def _should_rotate(self) -> bool:
+        if self.rotate_bytes > 0 and self._segment.size() >= self.rotate_bytes:
+            return True
+        return self.rotate_secs > 0 and time.monotonic() - self._opened_at >= self.rotate_secs
+
+    def _run(self):
+        next_sync = time.monotonic() + self.flush_secs
+        closing = False
+        while not closing:
+            rows = []
+            try:
+                rows.append(self._queue.get(timeout=max(0.0, next_sync - time.monotonic())))
+                while len(rows) < self.batch_size:
+                    rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if any(r is _CLOSE for r in rows):
+                rows = [r for r in rows if r is not _CLOSE]
+                closing = True
+            try:
+                if rows:
+                    self._segment.write(rows)
+                if closing:
+                    self._close_segment()
+                elif self._rotating and self._should_rotate():
+                    self._close_segment()
+                    self._open()
+                elif time.monotonic() >= next_sync:
+                    self._sync()
+                    next_sync = time.monotonic() + self.flush_secs
+            except Exception as e:
+                # 记录错误，close 时抛出；继续消费队列，避免阻塞发送路径
+                print(f"metrics sink error: {e}")
+                self._error = e
+
+    def writerow(self, row: dict):
+        if self._closed:
+            raise Exception("指标文件已关闭")
+        self._queue.put(row)
+
+    def files(self) -> List[str]:
+        # 按时间顺序排列的全部指标文件
+        return self.rotated if self._closed else self.rotated + [self.current]
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        atexit.unregister(self.close)
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,447 @@
+import asyncio
+import http.server
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+import cramjam
+import grpc
+
+import sc_pb2_grpc
+from latency import latency_summary
+from sc_pb2 import (
+    DeleteWorkflowReply,
+    GetWorkflowByIdReply,
+    GetWorkflowPhaseByCustomIDReply,
+    InputWorkflowReply,
+    KeepAliveReply,
+    RegisterRAReply,
+    WorkflowIDListReply,
+)
+from stats import LogHistogram
+from wf_pb2 import Workflow
+
+_GZIP_MAGIC = b"\x1f\x8b"
+# snappy 帧格式的流标识块
+_SNAPPY_MAGIC = b"\xff\x06\x00\x00sNaPpY"
+
+
+def _const(args) -> Callable[[random.Random], float]:
+    # const:0.005
+    v = float(args[0])
+    return lambda rng: v
+
+
+def _uniform(args) -> Callable[[random.Random], float]:
+    # uniform:0.001,0.01
+    lo, hi = float(args[0]), float(args[1])
+    return lambda rng: rng.uniform(lo, hi)
+
+
+def _exp(args) -> Callable[[random.Random], float]:
+    # exp:0.005，均值
+    mean = float(args[0])
+    return lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0.0
+
+
+def _lognormal(args) -> Callable[[random.Random], float]:
+    # lognormal:0.005,0.5，中位数和对数标准差，长尾
+    median, sigma = float(args[0]), float(args[1])
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+_DISTRIBUTIONS = {
+    "const": _const,
+    "uniform": _uniform,
+    "exp": _exp,
+    "lognormal": _lognormal,
+}
+
+
+def parse_service_time(spec: str) -> Callable[[random.Random], float]:
+    """
+    解析服务时间分布，格式为 <分布>:<参数,...>，单位：秒。只给出数值时等价于 const
+    """
+    spec = spec.strip()
+    if ":" not in spec:
+        spec = f"const:{spec}"
+    name, args = spec.split(":", 1)
+    if name not in _DISTRIBUTIONS:
+        raise Exception(f"不支持的服务时间分布: {name}")
+    return _DISTRIBUTIONS[name](args.split(","))
+
+
+def decode_workflow(data: bytes) -> Workflow:
+    # 按魔数识别 gzip/snappy 压缩，否则视为未压缩的 protobuf
+    if data.startswith(_GZIP_MAGIC):
+        data = bytes(cramjam.gzip.decompress(data))
+    elif data.startswith(_SNAPPY_MAGIC):
+        data = bytes(cramjam.snappy.decompress(data))
+    return Workflow.FromString(data)
+
+
+def _critical_path(wf: Workflow) -> int:
+    # 节点 duration 之和最大的路径长度，不假设 topology 按拓扑序排列
+    nodes = {node.name: node for node in wf.topology}
+    finish: Dict[str, int] = {}
+
+    def __finish(name: str) -> int:
+        if name not in finish:
+            # 先置 0，存在环时不会无限递归
+            finish[name] = 0
+            node = nodes[name]
+            finish[name] = node.duration + max(
+                (__finish(d) for d in node.dependencies if d in nodes), default=0
+            )
+        return finish[name]
+
+    return max((__finish(name) for name in nodes), default=0)
+
+
+class _Stored:
+    __slots__ = ("workflow_id", "accepted_at", "workflow", "critical_path")
+
+    def __init__(
+        self,
+        workflow_id: str,
+        accepted_at: float,
+        workflow: Optional[Workflow],
+        critical_path: int,
+    ):
+        self.workflow_id = workflow_id
+        self.accepted_at = accepted_at
+        self.workflow = workflow
+        self.critical_path = critical_path
+
+
+class MockSchedulerController(sc_pb2_grpc.SchedulerControllerServicer):
+    """
+    本地模拟的调度器控制器，实现 SchedulerController 的全部 RPC，用于在没有集群时测量注入器本身
+
+    - 服务时间：每个 RPC 按 service_time 分布等待，InputWorkflow 另加每个工作流 per_workflow 秒
+    - 接受率：InputWorkflow 中每个工作流以 accept_ratio 的概率被接受
+    - 背压：同时处理的 InputWorkflow 不超过 workers 个，排队超过 queue_limit 个时
+      返回 RESOURCE_EXHAUSTED（queue_limit 为 0 表示不限制排队）
+    - decode 为真时解压（snappy/gzip）并解析 wf_pb2.Workflow，按工作流的 custom_id 保存；
+      否则为每个工作流分配随机 custom_id
+    - 工作流在接受后 visible_delay 秒出现在 FetchWorkflowIDList 中，
+      再过 start_delay 秒进入 Running，经过关键路径长度 × time_scale 秒后为 Succeeded
+    """
+
+    def __init__(
+        self,
+        service_time: str = "0",
+        per_workflow: float = 0,
+        accept_ratio: float = 1.0,
+        workers: int = 0,
+        queue_limit: int = 0,
+        decode: bool = True,
+        visible_delay: float = 0,
+        start_delay: float = 0,
+        time_scale: float = 0.001,
+        wait_secs: int = 1,
+        seed: Optional[int] = None,
+    ):
+        """
+        @param workers 同时处理的 InputWorkflow 请求数，0 表示不限制
+        @param wait_secs KeepAlive 返回的下一次保活等待时间，单位：秒
+        """
+        self.service_time = parse_service_time(service_time)
+        self.per_workflow = per_workflow
+        self.accept_ratio = accept_ratio
+        self.queue_limit = queue_limit
+        self.decode = decode
+        self.visible_delay = visible_delay
+        self.start_delay = start_delay
+        self.time_scale = time_scale
+        self.wait_secs = max(1, wait_secs)
+        self._rng = random.Random(seed)
+        self.workers = workers
+        # 须在服务的事件循环内创建，首次调用 InputWorkflow 时创建
+        self._workers: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self.boot_id = str(uuid.uuid4())
+
+        # custom_id -> 工作流，按接受先后排列
+        self.workflows: Dict[str, _Stored] = {}
+        self._by_workflow_id: Dict[str, str] = {}
+        self.schedulers: Dict[str, int] = {}
+        self.allocators: Dict[str, str] = {}
+        # 各 RPC 的调用次数和处理耗时（含服务时间），单位：ns
+        self.calls: Dict[str, int] = {}
+        self.latency: Dict[str, LogHistogram] = {}
+        self.received = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    def _count(self, method: str, a1: int):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        h = self.latency.get(method)
+        if h is None:
+            h = self.latency[method] = LogHistogram()
+        h.add(time.monotonic_ns() - a1)
+
+    async def _serve(self, extra: float = 0):
+        await asyncio.sleep(self.service_time(self._rng) + extra)
+
+    def _phase(self, w: _Stored, now: float) -> str:
+        started = w.accepted_at + self.visible_delay + self.start_delay
+        if now < started:
+            return "Pending"
+        if now < started + w.critical_path * self.time_scale:
+            return "Running"
+        return "Succeeded"
+
+    def _find(self, workflow_id: str, custom_id: str) -> Optional[_Stored]:
+        if workflow_id:
+            custom_id = self._by_workflow_id.get(workflow_id, "")
+        return self.workflows.get(custom_id)
+
+    # ---- RPC ----
+    async def KeepAlive(self, request, context):
+        a1 = time.monotonic_ns()
+        await self._serve()
+        self.schedulers[request.sid] = request.serial_number
+        self._count("KeepAlive", a1)
+        return KeepAliveReply(wait_secs=self.wait_secs)
+
+    async def InputWorkflow(self, request, context):
+        a1 = time.monotonic_ns()
+        if self.workers > 0 and self._workers is None:
+            self._workers = asyncio.Semaphore(self.workers)
+        if self._workers is not None and self._workers.locked():
+            if self.queue_limit > 0 and self._waiting >= self.queue_limit:
+                self.rejected += 1
+                self._count("InputWorkflow", a1)
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "queue full")
+        self._waiting += 1
+        try:
+            if self._workers is not None:
+                await self._workers.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            await self._serve(self.per_workflow * len(request.workflow))
+            accept = 0
+            now = time.monotonic()
+            for data in request.workflow:
+                self.received += 1
+                if self._rng.random() >= self.accept_ratio:
+                    continue
+                wf, critical_path = None, 0
+                if self.decode:
+                    wf = decode_workflow(data)
+                    critical_path = _critical_path(wf)
+                    custom_id = wf.custom_id
+                else:
+                    custom_id = str(uuid.uuid4())
+                workflow_id = str(uuid.uuid4())
+                old = self.workflows.pop(custom_id, None)
+                if old is not None:
+                    del self._by_workflow_id[old.workflow_id]
+                self.workflows[custom_id] = _Stored(workflow_id, now, wf, critical_path)
+                self._by_workflow_id[workflow_id] = custom_id
+                accept += 1
+            self.accepted += accept
+        finally:
+            if self._workers is not None:
+                self._workers.release()
+        self._count("InputWorkflow", a1)
+        return InputWorkflowReply(accept=accept)
+
+    async def FetchWorkflowIDList(self, request, context):
+        a1 = time.monotonic_ns()
+        await self._serve()
+        visible_before = time.monotonic() - self.visible_delay
+        # 与真实控制器一样返回控制器内的 workflow_id，而不是 custom_id
+        ids = [w.workflow_id for w in self.workflows.values() if w.accepted_at <= visible_before]
+        self._count("FetchWorkflowIDList", a1)
+        return WorkflowIDListReply(ids=ids)
+
+    async def GetWorkflowByID(self, request, context):
+        a1 = time.monotonic_ns()
+        await self._serve()
+        w = self._find(request.workflow_id, request.custom_id)
+        self._count("GetWorkflowByID", a1)
+        if w is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, "workflow not found")
+        wf = w.workflow or Workflow(custom_id=self._by_workflow_id[w.workflow_id])
+        return GetWorkflowByIdReply(workflow_dag=wf)
+
+    async def RegisterResourceAllocator(self, request, context):
+        a1 = time.monotonic_ns()
+        await self._serve()
+        self.allocators[request.ipv4] = request.cluster_id
+        self._count("RegisterResourceAllocator", a1)
+        return RegisterRAReply(boot_id=self.boot_id)
+
+    async def GetWorkflowPhaseByCustomID(self, request, context):
+        a1 = time.monotonic_ns()
+        await self._serve()
+        w = self.workflows.get(request.custom_id)
+        self._count("GetWorkflowPhaseByCustomID", a1)
+        if w is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, "workflow not found")
+        return GetWorkflowPhaseByCustomIDReply(phase=self._phase(w, time.monotonic()))
+
+    async def DeleteWorkflow(self, request, context):
+        a1 = time.monotonic_ns()
+        await self._serve()
+        w = self._find(request.workflow_id, request.custom_id)
+        self._count("DeleteWorkflow", a1)
+        if w is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, "workflow not found")
+        custom_id = self._by_workflow_id.pop(w.workflow_id)
+        del self.workflows[custom_id]
+        return DeleteWorkflowReply(workflow_id=w.workflow_id)
+
+    # ---- 输出 ----
+    def print_summary(self):
+        print(
+            f"received {self.received} workflows, accepted {self.accepted}, "
+            f"rejected {self.rejected} requests, stored {len(self.workflows)}, "
+            f"{len(self.schedulers)} schedulers, {len(self.allocators)} allocators"
+        )
+        for method, h in sorted(self.latency.items()):
+            s = latency_summary(h)
+            values = ", ".join(
+                f"{k} {s[k] / 1e6:.3f}ms" for k in ("p50", "p99", "max") if s[k] is not None
+            )
+            print(f"{method}: count {self.calls[method]}, {values}")
+
+
+async def serve(
+    servicer: MockSchedulerController,
+    address: str = "0.0.0.0:6060",
+    duration: float = 0,
+    report_secs: float = 0,
+):
+    """
+    启动模拟控制器，duration 秒后停止（0 表示一直运行），report_secs 大于 0 时定期打印统计
+    """
+    server = grpc.aio.server(
+        options=[
+            ("grpc.max_send_message_length", 64 * 1024 * 1024),
+            ("grpc.max_receive_message_length", 64 * 1024 * 1024),
+        ]
+    )
+    sc_pb2_grpc.add_SchedulerControllerServicer_to_server(servicer, server)
+    server.add_insecure_port(address)
+    await server.start()
+    print(f"mock scheduler controller listening on {address}")
+    try:
+        deadline = time.monotonic() + duration if duration > 0 else None
+        while deadline is None or time.monotonic() < deadline:
+            step = report_secs if report_secs > 0 else 1
+            if deadline is not None:
+                step = min(step, max(0.0, deadline - time.monotonic()))
+            await asyncio.sleep(step)
+            if report_secs > 0:
+                servicer.print_summary()
+    finally:
+        await server.stop(1)
+        servicer.print_summary()
+
+
+_WORKFLOWS_PATH = re.compile(r"^/apis/argoproj\.io/v1alpha1/namespaces/([^/]+)/workflows$")
+
+
+class _KubernetesAPIHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 才会保持连接，与真实 API Server 一样复用 keep-alive 连接
+    protocol_version = "HTTP/1.1"
+    server: "MockKubernetesAPI"
+
+    def _reply(self, code: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _status(self, code: int, reason: str, message: str):
+        self._reply(
+            code,
+            {
+                "kind": "Status",
+                "apiVersion": "v1",
+                "status": "Failure",
+                "reason": reason,
+                "message": message,
+                "code": code,
+            },
+        )
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        m = _WORKFLOWS_PATH.match(self.path)
+        if m is None:
+            self._status(404, "NotFound", f"the server could not find {self.path}")
+            return
+        try:
+            wf = json.loads(body)
+        except ValueError as e:
+            self._status(400, "BadRequest", str(e))
+            return
+        if wf.get("kind") != "Workflow":
+            self._status(400, "BadRequest", f"unexpected kind: {wf.get('kind')}")
+            return
+        self.server.create_workflow(wf, m.group(1))
+        self._reply(201, wf)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockKubernetesAPI(http.server.ThreadingHTTPServer):
+    """
+    模拟的 Kubernetes API Server，只接受创建 Argo Workflow 的请求（POST .../workflows），
+    按服务时间分布延迟后返回 201 和补全了 name/uid 的 Workflow 对象。用于测试 argo 的 api 提交方式
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: str, service_time: str = "0", seed: Optional[int] = None):
+        host, port = address.rsplit(":", 1)
+        super().__init__((host, int(port)), _KubernetesAPIHandler)
+        self.service_time = parse_service_time(service_time)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.connections = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+    def create_workflow(self, wf: dict, namespace: str):
+        with self._lock:
+            delay = self.service_time(self._rng)
+            self.created += 1
+        metadata = wf.setdefault("metadata", {})
+        if "name" not in metadata:
+            metadata["name"] = metadata.get("generateName", "") + uuid.uuid4().hex[:5]
+        metadata.update(namespace=namespace, uid=str(uuid.uuid4()))
+        if delay > 0:
+            time.sleep(delay)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        host, port = self.server_address[:2]
+        print(f"mock kubernetes api listening on http://{host}:{port}")
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.print_summary()
+
+    def print_summary(self):
+        print(f"kubernetes api: created {self.created} workflows over {self.connections} connections")
@@ -0,0 +1,157 @@
+import atexit
+import os
+import queue
+import threading
+from typing import Dict, Optional
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+# 队列中的结束标记
+_CLOSE = object()
+# S3 分片上传除最后一片外，每片不小于 5MB
+MIN_PART_BYTES = 5 * 1024 * 1024
+
+
+class _Upload:
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.upload_id: Optional[str] = None
+        self.offset = 0
+        self.parts = []
+
+
+class MultipartUploader:
+    """
+    边写边上传到 S3 兼容存储
+
+    作为 MetricsSink 的 listener 使用：文件每次 fsync 后（segment_synced），把新增的
+    完整分片通过 multipart upload 上传；文件写完后（segment_closed）上传剩余数据并完成
+    上传。写完前不足一个分片的文件直接用 put_object 上传。
+    上传在后台线程中进行，对象名为 prefix + 文件名
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        part_bytes: int = 8 * 1024 * 1024,
+        endpoint_url: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_bytes = max(part_bytes, MIN_PART_BYTES)
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+        )
+        self._uploads: Dict[str, _Upload] = {}
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="metrics-upload", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def key_of(self, path: str) -> str:
+        return self.prefix + os.path.basename(path)
+
+    def segment_synced(self, path: str):
+        self._queue.put((self._synced, path))
+
+    def segment_closed(self, path: str):
+        self._queue.put((self._completed, path))
+
+    def upload(self, path: str):
+        # 上传一个已写完的文件
+        self._queue.put((self._completed, path))
+
+    def _upload_part(self, path: str, up: _Upload, data: bytes):
+        if up.upload_id is None:
+            up.upload_id = self._client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key_of(path)
+            )["UploadId"]
+        number = len(up.parts) + 1
+        r = self._client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key_of(path),
+            UploadId=up.upload_id,
+            PartNumber=number,
+            Body=data,
+        )
+        up.parts.append({"PartNumber": number, "ETag": r["ETag"]})
+        up.offset += len(data)
+
+    def _synced(self, path: str):
+        up = self._uploads.get(path)
+        if up is None:
+            up = self._uploads[path] = _Upload(path)
+        size = os.fstat(up.file.fileno()).st_size
+        while size - up.offset >= self.part_bytes:
+            up.file.seek(up.offset)
+            self._upload_part(path, up, up.file.read(self.part_bytes))
+
+    def _completed(self, path: str):
+        up = self._uploads.pop(path, None) or _Upload(path)
+        try:
+            up.file.seek(up.offset)
+            rest = up.file.read()
+            if up.upload_id is None:
+                self._client.put_object(Bucket=self.bucket, Key=self.key_of(path), Body=rest)
+            else:
+                if rest:
+                    self._upload_part(path, up, rest)
+                self._client.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=self.key_of(path),
+                    UploadId=up.upload_id,
+                    MultipartUpload={"Parts": up.parts},
+                )
+            print(f"uploaded {path} to {self.bucket}/{self.key_of(path)}")
+        except (ClientError, BotoCoreError, OSError):
+            # 已从 _uploads 中移除，_abort 找不到，在这里放弃已上传的分片
+            self._abort_upload(path, up)
+            raise
+        finally:
+            up.file.close()
+
+    def _abort(self, path: str):
+        up = self._uploads.pop(path, None)
+        if up is None:
+            return
+        up.file.close()
+        self._abort_upload(path, up)
+
+    def _abort_upload(self, path: str, up: _Upload):
+        if up.upload_id is not None:
+            try:
+                self._client.abort_multipart_upload(
+                    Bucket=self.bucket, Key=self.key_of(path), UploadId=up.upload_id
+                )
+            except (ClientError, BotoCoreError):
+                pass
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _CLOSE:
+                return
+            handler, path = item
+            try:
+                handler(path)
+            except (ClientError, BotoCoreError, OSError) as e:
+                # 上传失败不影响发送，放弃该文件本次的分片上传
+                print(f"upload {path} failed: {e}")
+                self._abort(path)
+
+    def close(self):
+        # 等待队列中的上传全部完成
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        atexit.unregister(self.close)
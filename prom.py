@@ -0,0 +1,183 @@
+import os
+import resource
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Union
+
+# 延迟直方图的桶上界，单位：秒
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+# 实际速率的统计窗口，单位：秒
+RATE_WINDOW_SECS = 10
+
+_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class InjectorMetrics:
+    """
+    注入器的实时指标，以 OpenMetrics 文本格式提供给 /metrics
+
+    发送路径上只做整数加减（add_sent/add_accepted/begin/end），
+    直方图分位、实际速率、进程 CPU/RSS 等均在抓取或后台采样时计算
+    """
+
+    def __init__(self, latency_recorder=None):
+        self.latency_recorder = latency_recorder
+        self.sent: Dict[str, int] = {}
+        self.accepted: Dict[str, int] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.target_rate: Dict[str, Union[float, Callable[[], float]]] = {}
+        self.corpus_load_seconds: Optional[float] = None
+        self.corpus_size = 0
+        # 返回已被控制器接受但尚不可见的工作流数，启用入库延迟监测时设置
+        self.ingest_backlog: Optional[Callable[[], int]] = None
+        self._samples: deque = deque()
+        self._sampler: Optional[threading.Thread] = None
+
+    # ---- 发送路径 ----
+    def add_sent(self, target: str, count: int):
+        self.sent[target] = self.sent.get(target, 0) + count
+
+    def add_accepted(self, target: str, count: int):
+        self.accepted[target] = self.accepted.get(target, 0) + count
+
+    def begin(self, target: str):
+        self.in_flight[target] = self.in_flight.get(target, 0) + 1
+
+    def end(self, target: str):
+        self.in_flight[target] -= 1
+
+    def set_target_rate(self, target: str, rate: Union[float, Callable[[], float]]):
+        # rate 为工作流/秒，或在抓取时计算当前目标速率的函数
+        self.target_rate[target] = rate
+
+    # ---- 采样与输出 ----
+    def _sample(self):
+        # 每秒记录一次已发送数，用于计算最近 RATE_WINDOW_SECS 秒的实际速率
+        while True:
+            self._samples.append((time.monotonic(), dict(self.sent)))
+            while len(self._samples) > RATE_WINDOW_SECS + 1:
+                self._samples.popleft()
+            time.sleep(1)
+
+    def achieved_rate(self, target: str) -> float:
+        samples = list(self._samples)
+        if len(samples) < 2:
+            return 0.0
+        (t0, s0), (t1, s1) = samples[0], samples[-1]
+        return (s1.get(target, 0) - s0.get(target, 0)) / (t1 - t0)
+
+    def render(self) -> str:
+        lines = []
+
+        def __family(name: str, typ: str, help_text: str):
+            lines.append(f"# TYPE {name} {typ}")
+            lines.append(f"# HELP {name} {help_text}")
+
+        __family("injector_workflows_sent", "counter", "Workflows sent.")
+        for target, v in sorted(self.sent.items()):
+            lines.append(f"injector_workflows_sent_total{_labels(target=target)} {v}")
+        __family("injector_workflows_accepted", "counter", "Workflows accepted by the target.")
+        for target, v in sorted(self.accepted.items()):
+            lines.append(f"injector_workflows_accepted_total{_labels(target=target)} {v}")
+        __family("injector_requests_in_flight", "gauge", "Requests waiting for a reply.")
+        for target, v in sorted(self.in_flight.items()):
+            lines.append(f"injector_requests_in_flight{_labels(target=target)} {v}")
+
+        __family("injector_target_rate", "gauge", "Offered rate in workflows per second.")
+        for target, rate in sorted(self.target_rate.items()):
+            value = rate() if callable(rate) else rate
+            lines.append(f"injector_target_rate{_labels(target=target)} {value}")
+        __family(
+            "injector_achieved_rate",
+            "gauge",
+            f"Workflows per second sent over the last {RATE_WINDOW_SECS} seconds.",
+        )
+        for target in sorted(self.sent):
+            lines.append(
+                f"injector_achieved_rate{_labels(target=target)} {self.achieved_rate(target)}"
+            )
+
+        if self.latency_recorder is not None:
+            __family(
+                "injector_request_latency_seconds",
+                "histogram",
+                "Measured request latency, without time factors.",
+            )
+            for (target, batch_size), h in self.latency_recorder.totals().items():
+                bounds = [b * 1e9 for b in LATENCY_BUCKETS]
+                for le, c in zip(LATENCY_BUCKETS, h.cumulative(bounds)):
+                    labels = _labels(target=target, batch_size=batch_size, le=le)
+                    lines.append(f"injector_request_latency_seconds_bucket{labels} {c}")
+                labels = _labels(target=target, batch_size=batch_size, le="+Inf")
+                lines.append(f"injector_request_latency_seconds_bucket{labels} {h.count}")
+                labels = _labels(target=target, batch_size=batch_size)
+                lines.append(f"injector_request_latency_seconds_count{labels} {h.count}")
+                lines.append(f"injector_request_latency_seconds_sum{labels} {h.sum / 1e9}")
+
+        if self.corpus_load_seconds is not None:
+            __family("injector_corpus_load_seconds", "gauge", "Time spent loading the corpus.")
+            lines.append(f"injector_corpus_load_seconds {self.corpus_load_seconds}")
+            __family("injector_corpus_workflows", "gauge", "Workflows in the loaded corpus.")
+            lines.append(f"injector_corpus_workflows {self.corpus_size}")
+
+        if self.ingest_backlog is not None:
+            __family(
+                "injector_ingest_backlog",
+                "gauge",
+                "Accepted workflows not yet listed by FetchWorkflowIDList.",
+            )
+            lines.append(f"injector_ingest_backlog {self.ingest_backlog()}")
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        __family("process_cpu_seconds", "counter", "User and system CPU time.")
+        lines.append(f"process_cpu_seconds_total {usage.ru_utime + usage.ru_stime}")
+        __family("process_resident_memory_bytes", "gauge", "Resident memory size.")
+        lines.append(f"process_resident_memory_bytes {_resident_bytes(usage)}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """
+        在后台线程中提供 /metrics
+        """
+        metrics = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", _CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample, name="metrics-rate", daemon=True)
+            self._sampler.start()
+        return server
+
+
+def _resident_bytes(usage) -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # 非 Linux 平台退化为峰值 RSS（KB）
+        return usage.ru_maxrss * 1024
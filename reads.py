@@ -0,0 +1,198 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import grpc
+
+from sc_client import AsyncChannelPool
+from sc_pb2 import (
+    GetWorkflowByIdRequest,
+    GetWorkflowPhaseByCustomIDRequest,
+    WorkflowIDListRequest,
+)
+
+
+async def _fetch_ids(pool: AsyncChannelPool, custom_id: Optional[str]):
+    await pool.stub().FetchWorkflowIDList(WorkflowIDListRequest(), timeout=60)
+
+
+async def _get_workflow(pool: AsyncChannelPool, custom_id: Optional[str]):
+    await pool.stub().GetWorkflowByID(GetWorkflowByIdRequest(custom_id=custom_id), timeout=30)
+
+
+async def _get_phase(pool: AsyncChannelPool, custom_id: Optional[str]):
+    await pool.stub().GetWorkflowPhaseByCustomID(
+        GetWorkflowPhaseByCustomIDRequest(custom_id=custom_id), timeout=30
+    )
+
+
+# 读请求类型 -> (发送函数，是否需要已注入的工作流 custom_id)
+READ_RPCS = {
+    "fetch_ids": (_fetch_ids, False),
+    "get_workflow": (_get_workflow, True),
+    "get_phase": (_get_phase, True),
+}
+
+
+def parse_read_mix(mix: str) -> Dict[str, float]:
+    """
+    解析读请求比例，格式为 <类型>:<权重>,...，例如 fetch_ids:1,get_workflow:4,get_phase:5
+    """
+    weights = {}
+    for item in mix.split(","):
+        if not item.strip():
+            continue
+        name, weight = item.split(":")
+        name = name.strip()
+        if name not in READ_RPCS:
+            raise Exception(f"不支持的读请求类型: {name}")
+        weights[name] = float(weight)
+    if sum(weights.values()) <= 0:
+        raise Exception(f"读请求比例无效: {mix}")
+    return weights
+
+
+class ReadWorkload:
+    """
+    与注入同时运行的读请求负载（看板等读流量）
+
+    在独立线程的事件循环中按 rate（请求/秒）开环发出读请求，类型按 mix 的权重随机选取，
+    查询的工作流从已被控制器接受的工作流中随机选取（尚无已注入的工作流时跳过）。
+    每个请求的耗时通过 record(类型，耗时 ns) 记录，与写请求的延迟一起按类型统计。
+    同时在途的请求超过 max_in_flight 时跳过本次请求，避免控制器过载时无限堆积
+    """
+
+    def __init__(
+        self,
+        address: str,
+        options: list,
+        id_of: Callable[[int], str],
+        record: Callable[[str, int], None],
+        rate: float,
+        mix: Dict[str, float],
+        mode: str = "constant",
+        max_in_flight: int = 1000,
+        seed: Optional[str] = None,
+    ):
+        """
+        @param mode constant 固定间隔；poisson 泊松到达
+        """
+        if rate <= 0:
+            raise Exception(f"发送速率必须大于0: {rate}")
+        self.address = address
+        self.options = options
+        self.id_of = id_of
+        self.record = record
+        self.rate = rate
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.mode = mode
+        self.max_in_flight = max_in_flight
+        self._rng = random.Random(seed)
+
+        self._new: List[int] = []
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._known: set = set()
+        self._in_flight = 0
+        self._stop_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+        self.sent: Dict[str, int] = {k: 0 for k in self.kinds}
+        self.errors: Dict[str, Dict[str, int]] = {k: {} for k in self.kinds}
+        # 没有可查询的工作流或在途请求过多而跳过的请求数
+        self.skipped = 0
+
+    # ---- 发送路径 ----
+    def track(self, indices: List[int]):
+        with self._lock:
+            self._new.extend(indices)
+
+    # ---- 后台发送 ----
+    def start(self):
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self._run()), name="read-workload", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, tail_secs: float = 0):
+        """
+        注入结束后继续只发送读请求 tail_secs 秒，然后停止
+        """
+        if self._thread is None:
+            return
+        self._stop_at = time.monotonic() + tail_secs
+        self._thread.join()
+        self._thread = None
+
+    def _admit(self):
+        with self._lock:
+            new, self._new = self._new, []
+        for i in new:
+            custom_id = self.id_of(i)
+            if custom_id not in self._known:
+                self._known.add(custom_id)
+                self._ids.append(custom_id)
+
+    async def _issue(self, pool: AsyncChannelPool, kind: str, custom_id: Optional[str]):
+        # _in_flight 在创建任务时已加一
+        send, _ = READ_RPCS[kind]
+        a1 = time.monotonic_ns()
+        try:
+            await send(pool, custom_id)
+        except grpc.aio.AioRpcError as e:
+            # NOT_FOUND 可能是工作流已被清理，单独计数
+            code = e.code().name
+            self.errors[kind][code] = self.errors[kind].get(code, 0) + 1
+        finally:
+            self._in_flight -= 1
+        self.sent[kind] += 1
+        self.record(kind, time.monotonic_ns() - a1)
+
+    async def _run(self):
+        pool = await AsyncChannelPool(self.address, 1, self.options).connect(warmup_rounds=0)
+        tasks = set()
+        try:
+            due = time.monotonic_ns()
+            while self._stop_at is None or time.monotonic() < self._stop_at:
+                # 落后于时间线时也让出事件循环，已创建的请求才能发出并完成
+                delay = due - time.monotonic_ns()
+                await asyncio.sleep(max(0, delay) / 1e9)
+                self._admit()
+                kind = self._rng.choices(self.kinds, self.weights)[0]
+                needs_id = READ_RPCS[kind][1]
+                if self._in_flight >= self.max_in_flight or (needs_id and not self._ids):
+                    self.skipped += 1
+                else:
+                    custom_id = self._rng.choice(self._ids) if needs_id else None
+                    # 在创建任务时计数，任务尚未开始运行时也计入在途请求
+                    self._in_flight += 1
+                    task = asyncio.create_task(self._issue(pool, kind, custom_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if self.mode == "poisson":
+                    due += round(self._rng.expovariate(self.rate) * 1e9)
+                else:
+                    due += round(1e9 / self.rate)
+            await asyncio.gather(*tasks)
+        finally:
+            await pool.close()
+
+    def to_dict(self) -> dict:
+        return {
+            "rate": self.rate,
+            "mix": dict(zip(self.kinds, self.weights)),
+            "sent": self.sent,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "ids": len(self._ids),
+        }
+
+    def print_summary(self):
+        print(
+            "reads: "
+            + ", ".join(f"{k} {self.sent[k]} (errors {self.errors[k]})" for k in self.kinds)
+            + f", skipped {self.skipped}"
+        )
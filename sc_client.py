@@ -0,0 +1,141 @@
+import asyncio
+import itertools
+import time
+from typing import List, Optional
+
+import grpc
+
+from sc_pb2 import InputWorkflowRequest
+from sc_pb2_grpc import SchedulerControllerStub
+
+
+def channel_options(
+    keepalive_ms: int = 30000,
+    keepalive_timeout_ms: int = 10000,
+    max_message_length: int = 64 * 1024 * 1024,
+    window_bytes: int = 0,
+) -> list:
+    """
+    gRPC 通道参数
+    @param window_bytes HTTP/2 初始流窗口大小，0 表示使用 gRPC 默认值（BDP 自动调整）
+    """
+    options = [
+        # 每个通道使用独立的子通道池，保证池中每个通道都是一条独立的连接
+        ("grpc.use_local_subchannel_pool", 1),
+        ("grpc.keepalive_time_ms", keepalive_ms),
+        ("grpc.keepalive_timeout_ms", keepalive_timeout_ms),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+        ("grpc.max_send_message_length", max_message_length),
+        ("grpc.max_receive_message_length", max_message_length),
+    ]
+    if window_bytes > 0:
+        options.append(("grpc.http2.lookahead_bytes", window_bytes))
+        options.append(("grpc.http2.bdp_probe", 0))
+    return options
+
+
+class ChannelPool:
+    """
+    调度器控制器的长连接 gRPC 通道池
+
+    通道在 connect 时一次建立并保持，stub() 轮询返回各通道上的 stub。
+    建立连接和预热的耗时单独记录，不计入之后的 RPC 耗时
+    """
+
+    def __init__(self, address: str, size: int = 1, options: Optional[list] = None):
+        self.address = address
+        self.size = max(1, size)
+        self.options = options if options is not None else channel_options()
+        self.channels: List[grpc.Channel] = []
+        self.stubs: List[SchedulerControllerStub] = []
+        self._next = itertools.count()
+        # 建立所有连接的耗时，单位：ns
+        self.connect_time = 0
+        # 预热（每个通道发送空请求）的耗时，单位：ns
+        self.warmup_time = 0
+
+    def connect(self, timeout: float = 30, warmup_rounds: int = 0) -> "ChannelPool":
+        """
+        @param warmup_rounds 在每个通道上发送空 InputWorkflow 请求的轮数，默认不发送。
+                             空请求会到达控制器，控制器拒绝时放弃预热，不影响连接
+        """
+        a1 = time.time_ns()
+        for _ in range(self.size):
+            channel = grpc.insecure_channel(self.address, options=self.options)
+            self.channels.append(channel)
+            self.stubs.append(SchedulerControllerStub(channel))
+        for channel in self.channels:
+            grpc.channel_ready_future(channel).result(timeout=timeout)
+        self.connect_time = time.time_ns() - a1
+
+        # 预热：在每个通道上发送不含工作流的请求，完成首次调用的初始化
+        a1 = time.time_ns()
+        try:
+            for _ in range(warmup_rounds):
+                for stub in self.stubs:
+                    stub.InputWorkflow(InputWorkflowRequest(workflow=[]), timeout=timeout)
+        except grpc.RpcError as e:
+            print(f"warm-up skipped: {e.code()}")
+        self.warmup_time = time.time_ns() - a1
+        return self
+
+    def stub(self) -> SchedulerControllerStub:
+        return self.stubs[next(self._next) % len(self.stubs)]
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+        self.channels.clear()
+        self.stubs.clear()
+
+
+class AsyncChannelPool:
+    """
+    基于 grpc.aio 的长连接通道池，用法与 ChannelPool 相同，供 asyncio 并发发送使用。
+    必须在事件循环内调用 connect
+    """
+
+    def __init__(self, address: str, size: int = 1, options: Optional[list] = None):
+        self.address = address
+        self.size = max(1, size)
+        self.options = options if options is not None else channel_options()
+        self.channels: List[grpc.aio.Channel] = []
+        self.stubs: List[SchedulerControllerStub] = []
+        self._next = itertools.count()
+        self.connect_time = 0
+        self.warmup_time = 0
+
+    async def connect(self, timeout: float = 30, warmup_rounds: int = 0) -> "AsyncChannelPool":
+        a1 = time.time_ns()
+        for _ in range(self.size):
+            channel = grpc.aio.insecure_channel(self.address, options=self.options)
+            self.channels.append(channel)
+            self.stubs.append(SchedulerControllerStub(channel))
+        await asyncio.wait_for(
+            asyncio.gather(*(channel.channel_ready() for channel in self.channels)), timeout
+        )
+        self.connect_time = time.time_ns() - a1
+
+        a1 = time.time_ns()
+        try:
+            for _ in range(warmup_rounds):
+                await asyncio.gather(
+                    *(
+                        stub.InputWorkflow(InputWorkflowRequest(workflow=[]), timeout=timeout)
+                        for stub in self.stubs
+                    )
+                )
+        except grpc.RpcError as e:
+            print(f"warm-up skipped: {e.code()}")
+        self.warmup_time = time.time_ns() - a1
+        return self
+
+    def stub(self) -> SchedulerControllerStub:
+        return self.stubs[next(self._next) % len(self.stubs)]
+
+    async def close(self):
+        for channel in self.channels:
+            await channel.close()
+        self.channels.clear()
+        self.stubs.clear()
@@ -0,0 +1,186 @@
+import math
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+class LogHistogram:
+    """
+    对数分桶直方图（HDR/DDSketch 风格）
+
+    非负数值按相对精度 precision 落入对数桶，分位数的相对误差不超过 precision。
+    桶数只与数值的动态范围有关，与样本数量无关；两个相同精度的直方图可以直接合并
+    """
+
+    def __init__(self, precision: float = 0.01):
+        self.precision = precision
+        self._gamma = (1 + precision) / (1 - precision)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        # 精确的最大值和总和（分桶代表值有 precision 的误差）
+        self.max: Optional[float] = None
+        self.sum = 0.0
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        # 桶 (gamma^(i-1), gamma^i] 的代表值，相对误差不超过 precision
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zero_count += count
+        else:
+            i = self._index(value)
+            self.buckets[i] = self.buckets.get(i, 0) + count
+        self.count += count
+        self.max = value if self.max is None else max(self.max, value)
+        self.sum += value * count
+
+    def merge(self, other: "LogHistogram"):
+        if other.precision != self.precision:
+            raise Exception("无法合并精度不同的直方图")
+        # 先复制再遍历：other 可能正在被其他线程更新（例如 /metrics 抓取时）
+        for i, c in list(other.buckets.items()):
+            self.buckets[i] = self.buckets.get(i, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if rank < seen:
+                return min(self._value(i), self.max)
+        return self.max
+
+    def cumulative(self, bounds: List[float]) -> List[int]:
+        """
+        不大于每个上界的样本数（按桶上沿判断，相对误差不超过 precision）
+        @param bounds 递增的上界
+        """
+        buckets = sorted(self.buckets.items())
+        result, seen, k = [], self.zero_count, 0
+        for bound in bounds:
+            while k < len(buckets) and self._gamma ** buckets[k][0] <= bound * (1 + 1e-9):
+                seen += buckets[k][1]
+                k += 1
+            result.append(seen)
+        return result
+
+    def mode(self) -> Optional[float]:
+        # 样本最多的桶的代表值
+        if self.count == 0:
+            return None
+        if not self.buckets or self.zero_count >= max(self.buckets.values()):
+            return 0.0
+        return self._value(max(self.buckets, key=lambda i: (self.buckets[i], -i)))
+
+    def to_dict(self) -> dict:
+        return {
+            "precision": self.precision,
+            "zero_count": self.zero_count,
+            "max": self.max,
+            "sum": self.sum,
+            "buckets": {str(i): c for i, c in sorted(self.buckets.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LogHistogram":
+        h = cls(d["precision"])
+        h.zero_count = d["zero_count"]
+        h.buckets = {int(i): c for i, c in d["buckets"].items()}
+        h.count = h.zero_count + sum(h.buckets.values())
+        h.max = d.get("max")
+        h.sum = d.get("sum", 0.0)
+        return h
+
+
+class StreamingStats:
+    """
+    常数内存的流式统计：样本数、均值/方差（Welford）、最小/最大值，以及用于
+    中位数、分位数和众数的对数分桶直方图。支持合并，可用于多进程分片统计。
+    exact 为真时改为按取值精确计数，分位数和众数与 numpy 的结果一致，
+    内存与不同取值的个数成正比，适用于深度、宽度等取值范围小的整数指标
+    """
+
+    def __init__(self, precision: float = 0.01, exact: bool = False):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.exact = exact
+        self.histogram = LogHistogram(precision)
+        self.values: Counter = Counter()
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if self.exact:
+            self.values[value] += 1
+        else:
+            self.histogram.add(value)
+
+    def merge(self, other: "StreamingStats"):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.mean, self._m2 = other.mean, other._m2
+        else:
+            # Chan 等人的并行方差合并公式
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self._m2 += other._m2 + delta * delta * self.count * other.count / count
+            self.mean += delta * other.count / count
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.histogram.merge(other.histogram)
+        self.values.update(other.values)
+
+    @property
+    def std(self) -> float:
+        # 总体标准差，与 np.std 一致
+        return math.sqrt(self._m2 / self.count) if self.count else 0.0
+
+    def _value_at(self, rank: int) -> float:
+        # 从小到大第 rank 个（从 0 开始）样本
+        for value in sorted(self.values):
+            rank -= self.values[value]
+            if rank < 0:
+                return value
+        return self.max
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.exact:
+            if self.count == 0:
+                return None
+            # 与 np.quantile 的默认（linear）插值一致，q=0.5 时即 np.median
+            pos = q * (self.count - 1)
+            lo, hi = self._value_at(math.floor(pos)), self._value_at(math.ceil(pos))
+            return lo + (hi - lo) * (pos - math.floor(pos))
+        v = self.histogram.quantile(q)
+        return None if v is None else min(max(v, self.min), self.max)
+
+    def mode(self) -> Optional[float]:
+        if self.exact:
+            if not self.values:
+                return None
+            # 出现次数相同时取较小的值，与 np.argmax(np.bincount(...)) 一致
+            return min(self.values, key=lambda v: (-self.values[v], v))
+        return self.histogram.mode()
@@ -0,0 +1,437 @@
+import abc
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import grpc
+
+from latency import latency_summary
+from sc_client import AsyncChannelPool
+from sc_pb2 import (
+    GetWorkflowByIdRequest,
+    GetWorkflowPhaseByCustomIDRequest,
+    WorkflowIDListRequest,
+)
+from stats import LogHistogram
+
+
+class _Tracked:
+    __slots__ = ("sent_at", "critical_path", "running_at")
+
+    def __init__(self, sent_at: int, critical_path: int):
+        self.sent_at = sent_at
+        self.critical_path = critical_path
+        self.running_at: Optional[int] = None
+
+
+class BackgroundPoller(abc.ABC):
+    """
+    在独立线程的事件循环中每隔 poll_interval 秒执行一轮轮询。
+    子类实现 _admit（接收发送路径新登记的工作流）、_idle（没有待观测的工作流）和 _round（一轮轮询）
+    """
+
+    def __init__(self, address: str, options: list, poll_interval: float, name: str):
+        self.address = address
+        self.options = options
+        self.poll_interval = poll_interval
+        self._name = name
+        self._stop_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self._run()), name=self._name, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, drain_secs: float = 0):
+        """
+        等待最多 drain_secs 秒，直到没有待观测的工作流，然后停止轮询
+        """
+        if self._thread is None:
+            return
+        self._stop_at = time.monotonic() + drain_secs
+        self._thread.join()
+        self._thread = None
+
+    @abc.abstractmethod
+    def _admit(self):
+        pass
+
+    @abc.abstractmethod
+    def _idle(self) -> bool:
+        pass
+
+    @abc.abstractmethod
+    async def _round(self, pool: AsyncChannelPool):
+        pass
+
+    async def _run(self):
+        pool = await AsyncChannelPool(self.address, 1, self.options).connect(warmup_rounds=0)
+        try:
+            while True:
+                round_start = time.monotonic()
+                self._admit()
+                if self._stop_at is not None and (self._idle() or round_start >= self._stop_at):
+                    return
+                await self._round(pool)
+                await asyncio.sleep(max(0.0, round_start + self.poll_interval - time.monotonic()))
+        finally:
+            await pool.close()
+
+
+class CompletionTracker(BackgroundPoller):
+    """
+    端到端完成时间跟踪
+
+    发送路径调用 track 记录已注入工作流在语料中的下标和发送时刻（只追加到列表）；
+    后台线程中的事件循环通过 GetWorkflowPhaseByCustomID 轮询各工作流的状态：
+    每隔 poll_interval 秒轮询一轮，每轮最多 poll_budget 个工作流（按上次轮询的先后轮转），
+    同时在途的请求不超过 concurrency 个。
+    记录发送到开始运行、发送到完成的耗时，以及完成耗时与关键路径长度之比和差值。
+    观测到的时刻精度受轮询间隔限制
+    """
+
+    def __init__(
+        self,
+        address: str,
+        options: list,
+        meta_of: Callable[[int], Tuple[str, int]],
+        poll_interval: float = 1.0,
+        poll_budget: int = 1000,
+        concurrency: int = 32,
+        timeout_secs: float = 3600,
+        running_phases: Iterable[str] = ("Running",),
+        done_phases: Iterable[str] = ("Succeeded", "Failed", "Error"),
+    ):
+        """
+        @param meta_of 由语料下标返回 (custom_id，关键路径长度（秒）)
+        @param timeout_secs 发送后超过此时间仍未完成的工作流不再轮询，计为超时
+        """
+        super().__init__(address, options, poll_interval, "completion-tracker")
+        self.meta_of = meta_of
+        self.poll_budget = poll_budget
+        self.concurrency = concurrency
+        self.timeout_secs = timeout_secs
+        self.running_phases = set(running_phases)
+        self.done_phases = set(done_phases)
+
+        self._new: List[Tuple[int, int]] = []
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Tracked] = {}
+        # 已跟踪过的 custom_id，包括已结束跟踪的
+        self._seen: set = set()
+        self._order: deque = deque()
+        self._sem: Optional[asyncio.Semaphore] = None
+
+        # 单位：ns
+        self.time_to_running = LogHistogram()
+        self.time_to_completion = LogHistogram()
+        # 完成耗时减去关键路径长度，小于 0 的记为 0
+        self.completion_overhead = LogHistogram()
+        # 完成耗时 / 关键路径长度
+        self.stretch = LogHistogram()
+        self.phases: Dict[str, int] = {}
+        self.tracked = 0
+        # 再次发送的工作流，不重复计量
+        self.duplicates = 0
+        self.timed_out = 0
+        self.errors = 0
+        self.polls = 0
+
+    # ---- 发送路径 ----
+    def track(self, indices: List[int], sent_at: int):
+        """
+        @param sent_at 发送时刻，time.monotonic_ns()
+        """
+        with self._lock:
+            self._new.extend((i, sent_at) for i in indices)
+
+    # ---- 后台轮询 ----
+    def _admit(self):
+        with self._lock:
+            new, self._new = self._new, []
+        for i, sent_at in new:
+            custom_id, critical_path = self.meta_of(i)
+            if custom_id in self._seen:
+                # 同一工作流被重复发送时只跟踪第一次：按 custom_id 查询的状态
+                # 无法区分各次发送，可能是之前那次已完成的状态
+                self.duplicates += 1
+                continue
+            self._seen.add(custom_id)
+            self._pending[custom_id] = _Tracked(sent_at, critical_path)
+            self._order.append(custom_id)
+            self.tracked += 1
+
+    def _observe(self, custom_id: str, phase: Optional[str], at: int) -> bool:
+        """
+        @param phase 查询失败时为 None
+        @return 是否结束跟踪
+        """
+        t = self._pending[custom_id]
+        if phase is not None:
+            self.phases[phase] = self.phases.get(phase, 0) + 1
+        if t.running_at is None and (phase in self.running_phases or phase in self.done_phases):
+            # 在两次轮询之间开始并完成的工作流，开始运行时刻记为完成时刻
+            t.running_at = at
+            self.time_to_running.add(at - t.sent_at)
+        if phase in self.done_phases:
+            elapsed = at - t.sent_at
+            self.time_to_completion.add(elapsed)
+            critical_path = t.critical_path * 1000000000
+            self.completion_overhead.add(max(0, elapsed - critical_path))
+            if critical_path > 0:
+                self.stretch.add(elapsed / critical_path)
+            return True
+        if at - t.sent_at > self.timeout_secs * 1e9:
+            self.timed_out += 1
+            return True
+        return False
+
+    def _idle(self) -> bool:
+        return not self._pending
+
+    async def _poll(self, pool: AsyncChannelPool, custom_id: str):
+        async with self._sem:
+            try:
+                reply = await pool.stub().GetWorkflowPhaseByCustomID(
+                    GetWorkflowPhaseByCustomIDRequest(custom_id=custom_id), timeout=10
+                )
+                phase = reply.phase
+            except grpc.aio.AioRpcError:
+                # 工作流可能尚未进入控制器，下一轮继续轮询
+                self.errors += 1
+                phase = None
+            self.polls += 1
+        if self._observe(custom_id, phase, time.monotonic_ns()):
+            del self._pending[custom_id]
+        else:
+            self._order.append(custom_id)
+
+    async def _round(self, pool: AsyncChannelPool):
+        if self._sem is None:
+            # 信号量须在轮询线程的事件循环内创建
+            self._sem = asyncio.Semaphore(self.concurrency)
+        batch = [self._order.popleft() for _ in range(min(self.poll_budget, len(self._order)))]
+        await asyncio.gather(*(self._poll(pool, c) for c in batch))
+
+    # ---- 输出 ----
+    def to_dict(self) -> dict:
+        return {
+            "unit": "ns",
+            "tracked": self.tracked,
+            "duplicates": self.duplicates,
+            "completed": self.time_to_completion.count,
+            "pending": len(self._pending),
+            "timed_out": self.timed_out,
+            "polls": self.polls,
+            "errors": self.errors,
+            "phases": self.phases,
+            "time_to_running": {
+                **latency_summary(self.time_to_running),
+                "histogram": self.time_to_running.to_dict(),
+            },
+            "time_to_completion": {
+                **latency_summary(self.time_to_completion),
+                "histogram": self.time_to_completion.to_dict(),
+            },
+            "completion_overhead": {
+                **latency_summary(self.completion_overhead),
+                "histogram": self.completion_overhead.to_dict(),
+            },
+            "stretch": {**latency_summary(self.stretch), "histogram": self.stretch.to_dict()},
+        }
+
+    def print_summary(self):
+        print(
+            f"tracked {self.tracked} workflows: {self.time_to_completion.count} completed, "
+            f"{len(self._pending)} pending, {self.timed_out} timed out, "
+            f"{self.duplicates} duplicates"
+        )
+        for name, h, scale, unit in (
+            ("time_to_running", self.time_to_running, 1e9, "s"),
+            ("time_to_completion", self.time_to_completion, 1e9, "s"),
+            ("completion_overhead", self.completion_overhead, 1e9, "s"),
+            ("stretch", self.stretch, 1, "x"),
+        ):
+            s = latency_summary(h)
+            values = ", ".join(
+                f"{k} {s[k] / scale:.3f}{unit}" for k in ("p50", "p90", "p99", "max") if s[k] is not None
+            )
+            print(f"{name}: count {s['count']}, {values}")
+
+
+class LagMonitor(BackgroundPoller):
+    """
+    入库可见延迟监测
+
+    发送路径调用 track 登记控制器已接受（InputWorkflow 返回）的工作流及接受时刻；
+    后台每隔 poll_interval 秒调用一次 FetchWorkflowIDList，与尚未可见的工作流集合求交集，
+    记录从接受到出现在列表中的延迟，以及每轮的积压（已接受但尚不可见的工作流数）。
+    列表中的 id 为控制器内的 workflow_id，首次出现时通过 GetWorkflowByID 查询对应的 custom_id 并缓存，
+    同时在途的查询不超过 concurrency 个；之后每轮的开销只与列表长度成正比，与已登记的工作流总数无关。
+    可见时刻取 FetchWorkflowIDList 发出与收到回复的中点，精度受轮询间隔限制
+    """
+
+    def __init__(
+        self,
+        address: str,
+        options: list,
+        id_of: Callable[[int], str],
+        poll_interval: float = 1.0,
+        timeout_secs: float = 600,
+        concurrency: int = 32,
+    ):
+        """
+        @param id_of 由语料下标返回 custom_id
+        @param timeout_secs 接受后超过此时间仍不可见的工作流不再等待，计为丢失
+        """
+        super().__init__(address, options, poll_interval, "lag-monitor")
+        self.id_of = id_of
+        self.timeout_secs = timeout_secs
+        self.concurrency = concurrency
+        self._sem: Optional[asyncio.Semaphore] = None
+        # workflow_id -> custom_id，查询时已不存在的工作流为 None
+        self._custom_ids: Dict[str, Optional[str]] = {}
+
+        self._new: List[Tuple[int, int]] = []
+        self._lock = threading.Lock()
+        # 已接受尚不可见的工作流 -> 接受时刻，按接受先后排列
+        self._pending: Dict[str, int] = {}
+        # 已观测到可见的工作流
+        self._visible: set = set()
+        self._started_at = time.monotonic_ns()
+
+        # 单位：ns
+        self.lag = LogHistogram()
+        self.fetch_latency = LogHistogram()
+        # 每轮：(相对开始时刻的秒数，积压，列表长度，本轮新可见数)
+        self.samples: List[Tuple[float, int, int, int]] = []
+        self.tracked = 0
+        # 已在积压中或已可见时再次发送的工作流，不重复计量
+        self.duplicates = 0
+        self.missing = 0
+        self.errors = 0
+        self.resolve_errors = 0
+
+    # ---- 发送路径 ----
+    def track(self, indices: List[int], accepted_at: int):
+        """
+        @param accepted_at InputWorkflow 返回的时刻，time.monotonic_ns()
+        """
+        with self._lock:
+            self._new.extend((i, accepted_at) for i in indices)
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    # ---- 后台轮询 ----
+    def _admit(self):
+        with self._lock:
+            new, self._new = self._new, []
+        for i, accepted_at in new:
+            custom_id = self.id_of(i)
+            if custom_id in self._pending or custom_id in self._visible:
+                self.duplicates += 1
+                continue
+            self._pending[custom_id] = accepted_at
+            self.tracked += 1
+
+    def _idle(self) -> bool:
+        return not self._pending
+
+    async def _resolve(self, pool: AsyncChannelPool, workflow_id: str):
+        async with self._sem:
+            try:
+                reply = await pool.stub().GetWorkflowByID(
+                    GetWorkflowByIdRequest(workflow_id=workflow_id), timeout=30
+                )
+                self._custom_ids[workflow_id] = reply.workflow_dag.custom_id
+            except grpc.aio.AioRpcError as e:
+                if e.code() == grpc.StatusCode.NOT_FOUND:
+                    # 已被删除的工作流不再查询
+                    self._custom_ids[workflow_id] = None
+                else:
+                    # 下一轮重新查询
+                    self.resolve_errors += 1
+
+    async def _round(self, pool: AsyncChannelPool):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        a1 = time.monotonic_ns()
+        try:
+            reply = await pool.stub().FetchWorkflowIDList(WorkflowIDListRequest(), timeout=60)
+        except grpc.aio.AioRpcError as e:
+            self.errors += 1
+            print(f"FetchWorkflowIDList failed: {e.code()}")
+            return
+        a2 = time.monotonic_ns()
+        self.fetch_latency.add(a2 - a1)
+        at = (a1 + a2) // 2
+
+        unknown = [w for w in reply.ids if w not in self._custom_ids]
+        await asyncio.gather(*(self._resolve(pool, w) for w in unknown))
+        # 发送方登记可能晚于工作流出现在列表中，每轮都对整个列表做判断
+        custom_ids = self._custom_ids
+        visible = self._pending.keys() & {custom_ids.get(w) for w in reply.ids}
+        for custom_id in visible:
+            self.lag.add(max(0, at - self._pending.pop(custom_id)))
+        self._visible |= visible
+
+        # 积压按接受先后排列，只需从头检查超时
+        expired = []
+        for custom_id, accepted_at in self._pending.items():
+            if at - accepted_at <= self.timeout_secs * 1e9:
+                break
+            expired.append(custom_id)
+        for custom_id in expired:
+            del self._pending[custom_id]
+        self.missing += len(expired)
+
+        self.samples.append(
+            ((at - self._started_at) / 1e9, len(self._pending), len(reply.ids), len(visible))
+        )
+
+    # ---- 输出 ----
+    def to_dict(self) -> dict:
+        return {
+            "unit": "ns",
+            "tracked": self.tracked,
+            "visible": self.lag.count,
+            "pending": len(self._pending),
+            "missing": self.missing,
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+            "resolve_errors": self.resolve_errors,
+            "lag": {**latency_summary(self.lag), "histogram": self.lag.to_dict()},
+            "fetch_latency": {
+                **latency_summary(self.fetch_latency),
+                "histogram": self.fetch_latency.to_dict(),
+            },
+            "backlog": [
+                {"time": t, "backlog": b, "listed": n, "visible": v}
+                for t, b, n, v in self.samples
+            ],
+        }
+
+    def print_summary(self):
+        print(
+            f"tracked {self.tracked} workflows: {self.lag.count} visible, "
+            f"{len(self._pending)} pending, {self.missing} missing, {self.duplicates} duplicates"
+        )
+        for name, h in (("visibility_lag", self.lag), ("fetch_latency", self.fetch_latency)):
+            s = latency_summary(h)
+            values = ", ".join(
+                f"{k} {s[k] / 1e9:.3f}s" for k in ("p50", "p90", "p99", "max") if s[k] is not None
+            )
+            print(f"{name}: count {s['count']}, {values}")
+        if self.samples:
+            print(f"max backlog: {max(b for _, b, _, _ in self.samples)}")
+        if self.errors or self.resolve_errors:
+            print(
+                f"FetchWorkflowIDList failed {self.errors} times, "
+                f"GetWorkflowByID failed {self.resolve_errors} times"
+            )